@@ -1,23 +1,20 @@
 from fastapi import APIRouter, HTTPException
 from backend.utils.usb_manager import USBManager
-from backend.utils.adb_manager import ADBManager
 from backend.config.settings import get_settings
 from backend.services.flash_service import flash_service
+from backend.services.device_inventory import device_inventory
+from backend.services.flash_scheduler import flash_scheduler, JobConflictError
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
 
 @router.get("")
-async def get_devices():
-    devices = await USBManager.get_connected_tablets()
-    return {"devices": devices}
-
-@router.get("/{bus}/{device}")
-async def get_device_details(bus: str, device: str):
-    details = await USBManager.get_device_details(bus, device)
-    return {"details": details}
+async def get_devices(refresh: bool = False):
+    snapshot = await device_inventory.get_snapshot(force=refresh)
+    return snapshot.to_dict()
 
 @router.get("/os/check")
-async def check_os_availability():
+async def check_os_availability(remote: bool = True, refresh: bool = False):
+    """Local availability; with remote=true also a cached conditional HEAD against the mirror"""
     settings = get_settings()
     os_url = settings.LINEAGE_OS_URL
 
@@ -27,11 +24,23 @@ async def check_os_availability():
             detail="Lineage OS URL not configured"
         )
 
-    availability = flash_service.check_os_availability(os_url)
-    return availability
+    if remote:
+        return await flash_service.check_os_freshness(os_url, force=refresh)
+    return flash_service.check_os_availability(os_url)
+
+@router.get("/sideload/metrics")
+async def list_sideload_metrics():
+    """Block-level metrics of every native sideload session since startup"""
+    return {"sessions": flash_service.get_sideload_metrics()}
+
+# Registered after the fixed two-segment paths above, which it would otherwise shadow
+@router.get("/{bus}/{device}")
+async def get_device_details(bus: str, device: str):
+    details = await USBManager.get_device_details(bus, device)
+    return {"details": details}
 
 @router.post("/{device_id}/flash/prepare")
-async def prepare_flash(device_id: str):
+async def prepare_flash(device_id: str, priority: int = 0):
     settings = get_settings()
     os_url = settings.LINEAGE_OS_URL
 
@@ -41,8 +50,7 @@ async def prepare_flash(device_id: str):
             detail="Lineage OS URL not configured"
         )
 
-    usb_devices = await USBManager.get_connected_tablets()
-    usb_device = next((d for d in usb_devices if d['id'] == device_id), None)
+    usb_device = await device_inventory.find_device(device_id)
 
     if not usb_device:
         raise HTTPException(
@@ -57,28 +65,32 @@ async def prepare_flash(device_id: str):
             detail=f"Device {device_id} has no serial number. Make sure USB debugging is enabled."
         )
 
-    adb_devices = await ADBManager.get_connected_devices()
-    adb_device_exists = any(d['id'] == serial for d in adb_devices)
+    if not usb_device.get('adb_ready'):
+        # The device may have been authorized since the last snapshot
+        snapshot = await device_inventory.refresh()
+        usb_device = snapshot.by_id.get(device_id, usb_device)
 
-    if not adb_device_exists:
+    if not usb_device.get('adb_ready'):
         raise HTTPException(
             status_code=400,
             detail=f"Device {serial} not connected via ADB. Please enable USB debugging and authorize this computer."
         )
 
-    import asyncio
-    asyncio.create_task(flash_service.flash_device_complete(serial, os_url, skip_download=False))
+    try:
+        job = flash_scheduler.submit(serial, os_url, skip_download=False, bus=usb_device.get('bus'), priority=priority)
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
     return {
         "success": True,
         "message": f"Preparing flash for device {serial}",
-        "serial": serial
+        "serial": serial,
+        "job_id": job.id
     }
 
 @router.post("/{device_id}/flash/confirm")
-async def confirm_flash(device_id: str):
-    usb_devices = await USBManager.get_connected_tablets()
-    usb_device = next((d for d in usb_devices if d['id'] == device_id), None)
+async def confirm_flash(device_id: str, priority: int = 0):
+    usb_device = await device_inventory.find_device(device_id)
 
     if not usb_device:
         raise HTTPException(
@@ -96,18 +108,20 @@ async def confirm_flash(device_id: str):
     settings = get_settings()
     os_url = settings.LINEAGE_OS_URL
 
-    import asyncio
-    asyncio.create_task(flash_service.flash_device_complete(serial, os_url, skip_download=True))
+    try:
+        job = flash_scheduler.submit(serial, os_url, skip_download=True, bus=usb_device.get('bus'), priority=priority)
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
     return {
         "success": True,
-        "message": f"Flash confirmed for device {serial}"
+        "message": f"Flash confirmed for device {serial}",
+        "job_id": job.id
     }
 
 @router.get("/{device_id}/flash/status")
 async def get_flash_status(device_id: str):
-    usb_devices = await USBManager.get_connected_tablets()
-    usb_device = next((d for d in usb_devices if d['id'] == device_id), None)
+    usb_device = device_inventory.get_by_id(device_id)
 
     if usb_device:
         serial = usb_device.get('serial')
@@ -122,3 +136,23 @@ async def get_flash_status(device_id: str):
 async def get_flash_status_by_serial(serial: str):
     status = flash_service.get_flash_status(serial)
     return status
+
+@router.get("/{serial}/flash/transitions")
+async def get_flash_transitions(serial: str):
+    """Recent status changes of a device's flashes, oldest first"""
+    return {"transitions": flash_service.get_flash_transitions(serial)}
+
+@router.get("/{serial}/flash/trace")
+async def get_flash_trace(serial: str):
+    """Spans of the device's latest download and flash, each with offsets from its start"""
+    trace = flash_service.get_flash_trace(serial)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="No flash trace for this device")
+    return trace
+
+@router.get("/{serial}/sideload/metrics")
+async def get_sideload_metrics(serial: str):
+    metrics = flash_service.get_sideload_metrics(serial)
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="No native sideload session for this device")
+    return metrics
@@ -0,0 +1,55 @@
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from backend.services.event_bus import event_bus
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+KEEPALIVE_SECONDS = 15
+
+def parse_topics(topics: Optional[str]):
+    return [t.strip() for t in topics.split(',') if t.strip()] if topics else None
+
+@router.get("")
+async def stream_events(topics: Optional[str] = None):
+    """Server-Sent Events stream of flash/download/devices changes"""
+    subscription = event_bus.subscribe(parse_topics(topics))
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    batch = await asyncio.wait_for(subscription.next_batch(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                for event in batch:
+                    data = json.dumps({'key': event['key'], 'data': event['data']})
+                    yield f"event: {event['topic']}\ndata: {data}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def websocket_events(websocket: WebSocket, topics: Optional[str] = None):
+    """WebSocket stream; each message is a JSON list of coalesced changes"""
+    await websocket.accept()
+    subscription = event_bus.subscribe(parse_topics(topics))
+    try:
+        while True:
+            try:
+                batch = await asyncio.wait_for(subscription.next_batch(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                batch = []
+            await websocket.send_json(batch)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_bus.unsubscribe(subscription)
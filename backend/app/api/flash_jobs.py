@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException
+from backend.services.flash_scheduler import flash_scheduler
+
+router = APIRouter(prefix="/api/flash/jobs", tags=["flash"])
+
+@router.get("")
+async def list_jobs():
+    return {
+        "jobs": flash_scheduler.list_jobs(),
+        "queue_depth": flash_scheduler.queue_depth()
+    }
+
+@router.get("/journal")
+async def get_journal():
+    """Unfinished jobs as recorded in the write-ahead journal"""
+    return {"jobs": flash_scheduler.journal.active()}
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    job = flash_scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    job = flash_scheduler.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {"success": True, "message": f"Cancelling job {job_id}", "job": job.to_dict()}
+
+@router.post("/{job_id}/priority")
+async def set_job_priority(job_id: str, priority: int):
+    job = flash_scheduler.set_priority(job_id, priority)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {"success": True, "job": job.to_dict()}
@@ -0,0 +1,34 @@
+import asyncio
+import time
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from backend.services.status_store import job_history
+
+router = APIRouter(prefix="/api/history", tags=["history"])
+
+@router.get("/throughput")
+async def get_throughput(hours: float = 24, bucket_minutes: int = 60, kind: Optional[str] = None):
+    """Finished flashes/downloads per time bucket"""
+    if bucket_minutes <= 0:
+        raise HTTPException(status_code=400, detail="bucket_minutes must be positive")
+    await job_history.flush_async()
+    buckets = await asyncio.to_thread(
+        job_history.throughput, time.time() - hours * 3600, bucket_minutes * 60, kind
+    )
+    return {"buckets": buckets, "bucket_seconds": bucket_minutes * 60}
+
+@router.get("/failure-rate")
+async def get_failure_rate(hours: float = 24, group_by: str = 'kind', kind: Optional[str] = None):
+    """Share of finished jobs that did not complete, grouped by kind, model or status"""
+    if group_by not in job_history.GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(job_history.GROUPS)}")
+    await job_history.flush_async()
+    groups = await asyncio.to_thread(job_history.failure_rate, time.time() - hours * 3600, group_by, kind)
+    return {"groups": groups}
+
+@router.get("/recent")
+async def get_recent(limit: int = 50, kind: Optional[str] = None):
+    """Most recently finished flashes/downloads, newest first"""
+    await job_history.flush_async()
+    jobs = await asyncio.to_thread(job_history.recent, max(1, min(limit, 1000)), kind)
+    return {"jobs": jobs}
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from backend.utils.metrics import Registry, registry
+
+router = APIRouter(prefix="/api", tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Process metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(registry.render(), media_type=Registry.CONTENT_TYPE)
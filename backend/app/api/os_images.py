@@ -1,15 +1,13 @@
 from fastapi import APIRouter, HTTPException
-from pathlib import Path
 import os
-import aiohttp
-import asyncio
 from backend.config.settings import settings
+from backend.services.download_manager import download_manager
+from backend.services.image_cache import image_cache
+from backend.services.image_inspector import image_inspector
 
 router = APIRouter()
 
-DOWNLOAD_DIR = Path("/tmp/lineage_downloads")
-
-download_progress = {}
+DOWNLOAD_DIR = download_manager.download_dir
 
 @router.get("/api/os/list")
 async def list_os_images():
@@ -17,18 +15,14 @@ async def list_os_images():
         if not DOWNLOAD_DIR.exists():
             return {"images": []}
 
-        images = []
-        for file_path in DOWNLOAD_DIR.iterdir():
-            if file_path.is_file() and file_path.suffix in ['.zip', '.img']:
-                stat = file_path.stat()
-                images.append({
-                    "filename": file_path.name,
-                    "size": stat.st_size,
-                    "modified": stat.st_mtime
-                })
+        images = image_cache.list_images()
+        for image in images:
+            del image['inode']
+            # Cached per image hash, so only new images touch the disk
+            image['inspection'] = await image_inspector.inspect(image['filename'])
 
         images.sort(key=lambda x: x['modified'], reverse=True)
-        return {"images": images}
+        return {"images": images, "cache": image_cache.to_dict()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -49,55 +43,21 @@ async def delete_os_image(filename: str):
         if not str(file_path.resolve()).startswith(str(DOWNLOAD_DIR.resolve())):
             raise HTTPException(status_code=400, detail="Invalid file path")
 
+        if download_manager.is_file_in_use(filename):
+            raise HTTPException(status_code=409, detail="File is being downloaded")
+
+        if image_cache.is_pinned(filename):
+            raise HTTPException(status_code=409, detail="File is in use by a flash")
+
         os.remove(file_path)
+        image_cache.remove(filename)
+        download_manager.discard_partial(filename)
         return {"success": True, "message": f"Deleted {filename}"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def download_file_background(url: str, filename: str):
-    """Background task to download file with progress tracking"""
-    try:
-        DOWNLOAD_DIR.mkdir(exist_ok=True)
-        file_path = DOWNLOAD_DIR / filename
-
-        download_progress[filename] = {
-            'status': 'downloading',
-            'progress': 0,
-            'downloaded': 0,
-            'total': 0,
-            'error': None
-        }
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to download: HTTP {response.status}")
-
-                total_size = int(response.headers.get('content-length', 0))
-                download_progress[filename]['total'] = total_size
-
-                downloaded = 0
-                with open(file_path, 'wb') as f:
-                    async for chunk in response.content.iter_chunked(8192):
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        download_progress[filename]['downloaded'] = downloaded
-
-                        if total_size > 0:
-                            progress = int((downloaded / total_size) * 100)
-                            download_progress[filename]['progress'] = progress
-
-        download_progress[filename]['status'] = 'completed'
-        download_progress[filename]['progress'] = 100
-
-    except Exception as e:
-        download_progress[filename]['status'] = 'error'
-        download_progress[filename]['error'] = str(e)
-        if file_path.exists():
-            os.remove(file_path)
-
 @router.post("/api/os/download")
 async def start_download():
     """Start downloading the OS image from LINEAGE_OS_URL"""
@@ -106,16 +66,13 @@ async def start_download():
         if not os_url:
             raise HTTPException(status_code=400, detail="LINEAGE_OS_URL not configured")
 
-        filename = os_url.split('/')[-1]
-        if not filename.endswith(('.zip', '.img')):
-            filename = f"lineageos_{filename}.zip"
-
-        file_path = DOWNLOAD_DIR / filename
+        filename = download_manager.get_filename(os_url)
 
-        if filename in download_progress and download_progress[filename]['status'] == 'downloading':
+        if download_manager.is_downloading(os_url):
             raise HTTPException(status_code=400, detail="Download already in progress")
 
-        if file_path.exists():
+        is_cached, _ = download_manager.check_cached(os_url)
+        if is_cached:
             return {
                 "success": True,
                 "message": "File already exists",
@@ -123,7 +80,7 @@ async def start_download():
                 "already_exists": True
             }
 
-        asyncio.create_task(download_file_background(os_url, filename))
+        download_manager.start(os_url)
 
         return {
             "success": True,
@@ -138,4 +95,4 @@ async def start_download():
 @router.get("/api/os/download/progress")
 async def get_download_progress():
     """Get download progress for all active downloads"""
-    return {"downloads": download_progress}
+    return {"downloads": download_manager.progress.to_dict()}
@@ -1,14 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pathlib import Path
 from backend.app.api.devices import router as devices_router
 from backend.app.api.os_images import router as os_images_router
+from backend.app.api.flash_jobs import router as flash_jobs_router
+from backend.app.api.events import router as events_router
+from backend.app.api.history import router as history_router
+from backend.app.api.metrics import router as metrics_router
+from backend.services.device_inventory import device_inventory
+from backend.services.flash_scheduler import flash_scheduler
+from backend.services.http_client import http_client
+from backend.services.status_store import job_history
+from backend.utils.adb_manager import ADBManager
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_client.start()
+    await job_history.start()
+    ADBManager.start_tracking()
+    device_inventory.start()
+    await flash_scheduler.start_recovery()
+    yield
+    await flash_scheduler.stop()
+    await device_inventory.stop()
+    await ADBManager.stop_tracking()
+    await job_history.stop()
+    await http_client.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(devices_router)
 app.include_router(os_images_router)
+app.include_router(flash_jobs_router)
+app.include_router(events_router)
+app.include_router(history_router)
+app.include_router(metrics_router)
 
 frontend_dist = Path(__file__).parent.parent.parent / "frontend" / "dist"
 
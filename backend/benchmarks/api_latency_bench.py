@@ -0,0 +1,143 @@
+"""API latency while an OS image downloads in the same process.
+
+    python -m backend.benchmarks.api_latency_bench --size-mb 512 --write-buffer-kb 4096
+
+Serves the real FastAPI app with uvicorn, starts a download through
+POST /api/os/download from a local mirror, and polls
+GET /api/os/download/progress from a separate thread, reporting latency
+percentiles while idle and while the download runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import aiohttp
+import uvicorn
+from backend.benchmarks.throttled_server import ThrottledImageServer
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+    return {
+        'count': len(ordered),
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'max_ms': round(ordered[-1] * 1000, 2),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 2)
+    }
+
+
+def run_in_thread(coro_factory):
+    """Run a coroutine on its own loop in a daemon thread; returns (thread, result holder)"""
+    result = {}
+
+    def target():
+        result['value'] = asyncio.run(coro_factory())
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, result
+
+
+async def poll_latency(base_url: str, stop: threading.Event, phase: dict):
+    """Sequential GETs; samples are bucketed by the phase active when each request started"""
+    samples = {'idle': [], 'downloading': []}
+    async with aiohttp.ClientSession() as session:
+        while not stop.is_set():
+            name = phase['name']
+            started = time.perf_counter()
+            async with session.get(f"{base_url}/api/os/download/progress") as response:
+                await response.read()
+            samples[name].append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=512)
+    parser.add_argument('--rate-mbps', type=float, default=0, help='per-connection limit in MB/s (0 = unthrottled)')
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--write-buffer-kb', type=int, default=4096)
+    parser.add_argument('--idle-seconds', type=float, default=3)
+    parser.add_argument('--port', type=int, default=18765)
+    args = parser.parse_args()
+
+    # The mirror gets its own loop so serving it does not count against the API
+    server = ThrottledImageServer(size=int(args.size_mb * 1024 * 1024), rate=args.rate_mbps * 1e6)
+    mirror_ready = threading.Event()
+    mirror_stop = threading.Event()
+
+    async def serve_mirror():
+        await server.start()
+        mirror_ready.set()
+        while not mirror_stop.is_set():
+            await asyncio.sleep(0.1)
+        await server.stop()
+
+    mirror_thread, _ = run_in_thread(serve_mirror)
+    mirror_ready.wait()
+
+    download_dir = tempfile.mkdtemp(prefix='latency_bench_')
+    # Settings are read at import time
+    os.environ.update({
+        'LINEAGE_OS_URL': server.url,
+        'DOWNLOAD_DIR': download_dir,
+        'DOWNLOAD_CONNECTIONS': str(args.connections),
+        'DOWNLOAD_MIN_SEGMENT_SIZE': str(1024 * 1024),
+        'DOWNLOAD_WRITE_BUFFER_SIZE': str(args.write_buffer_kb * 1024),
+        'IMAGE_CACHE_MAX_GB': '0'
+    })
+    from backend.app.main import app
+    from backend.services.download_manager import download_manager
+
+    api = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=args.port, lifespan='off', log_level='warning'))
+    api_task = asyncio.create_task(api.serve())
+    while not api.started:
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    phase = {'name': 'idle'}
+    poll_stop = threading.Event()
+    poll_thread, polled = run_in_thread(lambda: poll_latency(base_url, poll_stop, phase))
+
+    await asyncio.sleep(args.idle_seconds)
+    phase['name'] = 'downloading'
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{base_url}/api/os/download") as response:
+            response.raise_for_status()
+    await download_manager.fetch(server.url)
+    elapsed = time.perf_counter() - started
+
+    poll_stop.set()
+    poll_thread.join()
+    mirror_stop.set()
+    mirror_thread.join()
+    api.should_exit = True
+    await api_task
+
+    print(json.dumps({
+        'size_bytes': server.size,
+        'connections': args.connections,
+        'write_buffer_bytes': args.write_buffer_kb * 1024,
+        'download_seconds': round(elapsed, 3),
+        'download_mb_per_sec': round(server.size / elapsed / 1e6, 2),
+        'idle': percentiles(polled['value']['idle']),
+        'downloading': percentiles(polled['value']['downloading'])
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Download throughput against a per-connection throttled mirror.
+
+    python -m backend.benchmarks.download_bench --size-mb 64 --rate-mbps 8 --connections 1 4 8
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from backend.benchmarks.throttled_server import ThrottledImageServer, synthetic_bytes
+from backend.services.download_manager import DownloadManager
+from backend.utils.metrics import DOWNLOAD_THROUGHPUT
+
+
+def verify(path: Path, size: int) -> bool:
+    if path.stat().st_size != size:
+        return False
+    with open(path, 'rb') as f:
+        offset = 0
+        while True:
+            block = f.read(4 * 1024 * 1024)
+            if not block:
+                return True
+            if block != synthetic_bytes(offset, len(block)):
+                return False
+            offset += len(block)
+
+
+async def run_once(server: ThrottledImageServer, connections: int, min_segment_size: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DownloadManager(Path(tmp), connections=connections, min_segment_size=min_segment_size)
+        server.requests = 0
+        samples = DOWNLOAD_THROUGHPUT.labels().count
+
+        started = time.perf_counter()
+        path = await manager.fetch(server.url)
+        elapsed = time.perf_counter() - started
+
+        progress = manager.progress.get(manager.get_filename(server.url))
+        return {
+            'connections': connections,
+            'segments_used': progress.get('connections'),
+            'requests': server.requests,
+            'seconds': round(elapsed, 3),
+            'mb_per_sec': round(server.size / elapsed / 1e6, 2),
+            'verified': verify(Path(path), server.size),
+            # A completed download records exactly one throughput sample
+            'throughput_observed': DOWNLOAD_THROUGHPUT.labels().count - samples == 1
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=64)
+    parser.add_argument('--rate-mbps', type=float, default=8, help='per-connection limit in MB/s')
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--min-segment-mb', type=float, default=1)
+    parser.add_argument('--no-ranges', action='store_true', help='server ignores Range headers')
+    args = parser.parse_args()
+
+    server = ThrottledImageServer(
+        size=int(args.size_mb * 1024 * 1024),
+        rate=args.rate_mbps * 1e6,
+        support_ranges=not args.no_ranges
+    )
+    await server.start()
+    try:
+        results = [
+            await run_once(server, connections, int(args.min_segment_mb * 1024 * 1024))
+            for connections in args.connections
+        ]
+    finally:
+        await server.stop()
+
+    print(json.dumps({
+        'size_bytes': server.size,
+        'rate_bytes_per_conn': server.rate,
+        'ranges': server.support_ranges,
+        'results': results
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
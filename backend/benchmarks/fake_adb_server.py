@@ -0,0 +1,139 @@
+import asyncio
+import random
+from typing import Optional
+from backend.benchmarks.fake_devices import FakeFleet
+from backend.benchmarks.fake_recovery import FakeRecoveryServer
+
+
+class FakeAdbServer:
+    """Stand-in for the ADB server in front of a FakeFleet.
+
+    Answers the host services AdbClient uses (version, devices-l,
+    track-devices-l, get-state) and, after host:transport, getprop,
+    reboot and sideload-host. Sideload sessions are played by
+    ``recovery``, so block requests follow the real read order. Every
+    request except the track stream waits ``adb_latency`` (jittered) and
+    fails with probability ``failure_rate``, both taken from the fleet.
+    """
+
+    TRACK_POLL_INTERVAL = 0.05
+
+    def __init__(self, fleet: FakeFleet, recovery: Optional[FakeRecoveryServer] = None, seed: int = 0):
+        self.fleet = fleet
+        self.recovery = recovery
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self._trackers = {}
+        self._server = None
+        self.port = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> str:
+        length = int(await reader.readexactly(4), 16)
+        return (await reader.readexactly(length)).decode()
+
+    @staticmethod
+    def _string(text: str) -> bytes:
+        payload = text.encode()
+        return f"{len(payload):04x}".encode() + payload
+
+    def _fail(self, writer: asyncio.StreamWriter, message: str):
+        writer.write(b'FAIL' + self._string(message))
+
+    async def _simulate(self, fleet) -> bool:
+        """Wait the configured latency; False when the request should fail"""
+        self.requests += 1
+        await asyncio.sleep(fleet['adb_latency'] * self.rng.uniform(0.5, 1.5))
+        if self.rng.random() < fleet['failure_rate']:
+            self.failures += 1
+            return False
+        return True
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            service = await self._read_request(reader)
+            if service == 'host:track-devices-l':
+                await self._track(writer)
+                return
+
+            fleet = self.fleet.load()
+            if not await self._simulate(fleet):
+                self._fail(writer, 'protocol fault (fake server)')
+            elif service == 'host:version':
+                writer.write(b'OKAY' + self._string('0029'))
+            elif service == 'host:devices-l':
+                writer.write(b'OKAY' + self._string(self.fleet.devices_text(fleet)))
+            elif service.startswith('host-serial:') and service.endswith(':get-state'):
+                serial = service[len('host-serial:'):-len(':get-state')]
+                device = fleet['devices'].get(serial)
+                state = self.fleet.state_of(device) if device else None
+                if state is None:
+                    self._fail(writer, f"device '{serial}' not found")
+                else:
+                    writer.write(b'OKAY' + self._string(state))
+            elif service.startswith('host:transport:'):
+                await self._transport(service.split(':', 2)[2], fleet, reader, writer)
+            else:
+                self._fail(writer, f"unsupported in fake server: {service}")
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _transport(self, serial: str, fleet, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        device = fleet['devices'].get(serial)
+        state = self.fleet.state_of(device) if device else None
+        if state is None:
+            self._fail(writer, f"device '{serial}' not found")
+            return
+        writer.write(b'OKAY')
+
+        service = await self._read_request(reader)
+        if service.startswith('shell:getprop '):
+            writer.write(b'OKAY' + (self.fleet.getprop(device, service.split(' ', 1)[1]) + '\n').encode())
+        elif service.startswith('reboot:'):
+            writer.write(b'OKAY')
+            await asyncio.to_thread(self.fleet.reboot, serial, service[len('reboot:'):])
+        elif service.startswith('sideload-host:') and self.recovery is not None:
+            if state != 'sideload':
+                self._fail(writer, 'closed')
+                return
+            _, size, block_size = service.split(':')
+            writer.write(b'OKAY')
+            await self.recovery.play_recovery(serial, reader, writer, int(size), int(block_size))
+            if self.recovery.devices[serial]['result'] == 'completed':
+                await asyncio.to_thread(self.fleet.sideload_finished, serial)
+        else:
+            self._fail(writer, f"unsupported in fake server: {service}")
+
+    async def _track(self, writer: asyncio.StreamWriter):
+        writer.write(b'OKAY')
+        self._trackers[writer] = asyncio.current_task()
+        last = None
+        try:
+            while not writer.is_closing():
+                text = self.fleet.devices_text()
+                if text != last:
+                    writer.write(self._string(text))
+                    await writer.drain()
+                    last = text
+                await asyncio.sleep(self.TRACK_POLL_INTERVAL)
+        finally:
+            self._trackers.pop(writer, None)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        self._server = await asyncio.start_server(self.handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            # Track streams never end on their own; closing them lets their handlers return
+            trackers = list(self._trackers.items())
+            for writer, _ in trackers:
+                writer.close()
+            await asyncio.gather(*(task for _, task in trackers), return_exceptions=True)
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
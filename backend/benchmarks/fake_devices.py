@@ -0,0 +1,302 @@
+"""Scriptable stand-ins for tablets, the adb/lsusb binaries and sysfs.
+
+A ``FakeFleet`` is a JSON file describing N devices and the latencies
+and failure rates to simulate. The fake ``adb`` and ``lsusb``
+executables written by ``write_fake_tools`` and the in-process
+``FakeAdbServer`` (fake_adb_server.py) all read and update that file, so
+a reboot issued through one is seen by the others. Device states are
+kept as a schedule of (time, state) steps, e.g. rebooting to recovery
+drops the device, brings it back in recovery and then in sideload mode,
+so no background process is needed to move them along.
+
+Each fake adb/lsusb call starts a Python interpreter, which adds tens of
+milliseconds on top of the configured latency, about what forking the
+real adb costs.
+"""
+import fcntl
+import json
+import os
+import random
+import stat
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+FLEET_ENV = 'XAM_FAKE_FLEET'
+REPO_ROOT = Path(__file__).resolve().parents[2]
+# Tablets spread over buses the way a powered hub chain would
+DEVICES_PER_BUS = 4
+
+
+class FakeFleet:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @classmethod
+    def create(cls, path: Path, devices: int, adb_latency: float = 0.01, usb_latency: float = 0.005,
+               failure_rate: float = 0.0, reboot_seconds: float = 1.0, menu_seconds: float = 0.5,
+               sideload_rate: float = 50e6, seed: int = 0) -> 'FakeFleet':
+        rng = random.Random(seed)
+        fleet = {
+            'adb_latency': adb_latency,
+            'usb_latency': usb_latency,
+            'failure_rate': failure_rate,
+            'reboot_seconds': reboot_seconds,
+            # Time a person takes to pick 'Apply from ADB' in recovery
+            'menu_seconds': menu_seconds,
+            'sideload_rate': sideload_rate,
+            'devices': {}
+        }
+        for index in range(devices):
+            serial = f"FAKE{rng.getrandbits(32):08X}"
+            fleet['devices'][serial] = {
+                'bus': 1 + index // DEVICES_PER_BUS,
+                'port': 1 + index % DEVICES_PER_BUS,
+                'devnum': 2 + index % DEVICES_PER_BUS,
+                'vendor_id': '04e8',
+                'product_id': '6860',
+                'manufacturer': 'Samsung',
+                'product': 'Galaxy Tab A7',
+                'model': 'SM_T500',
+                'codename': 'gta4l',
+                'fingerprint': 'samsung/gta4lxx/gta4l:12/SP1A.210812.016/T500XXU3CVG1:user/release-keys',
+                'schedule': [[0, 'device']]
+            }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(fleet, indent=1))
+        return cls(path)
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with open(self.path, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield f
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load(self) -> Dict:
+        with self._locked(exclusive=False) as f:
+            return json.load(f)
+
+    @contextmanager
+    def update(self):
+        with self._locked(exclusive=True) as f:
+            fleet = json.load(f)
+            yield fleet
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(fleet, indent=1))
+            # Readers must not see it before the lock is released
+            f.flush()
+
+    @staticmethod
+    def state_of(device: Dict, now: Optional[float] = None) -> Optional[str]:
+        """State at time now; None while the device is off the bus"""
+        now = time.time() if now is None else now
+        state = None
+        for at, step in device['schedule']:
+            if at > now:
+                break
+            state = step
+        return state
+
+    @staticmethod
+    def _schedule(device: Dict, steps: List):
+        now = time.time()
+        # Keep the current state as the first step so old steps can be dropped
+        device['schedule'] = [[now, FakeFleet.state_of(device, now)]] + [[now + delay, state] for delay, state in steps]
+
+    def reboot(self, serial: str, target: str) -> bool:
+        with self.update() as fleet:
+            device = fleet['devices'].get(serial)
+            if device is None or self.state_of(device) is None:
+                return False
+            reboot = fleet['reboot_seconds']
+            if target == 'recovery':
+                steps = [(0, None), (reboot, 'recovery'), (reboot + fleet['menu_seconds'], 'sideload')]
+            elif target == 'sideload':
+                steps = [(0, None), (reboot, 'sideload')]
+            else:
+                steps = [(0, None), (reboot, 'device')]
+            self._schedule(device, steps)
+        return True
+
+    def sideload_finished(self, serial: str):
+        """Recovery installed the package and reboots into the new system"""
+        with self.update() as fleet:
+            device = fleet['devices'].get(serial)
+            if device is not None:
+                reboot = fleet['reboot_seconds']
+                self._schedule(device, [(0, 'recovery'), (0.2, None), (0.2 + reboot, 'device')])
+
+    def devices_text(self, fleet: Optional[Dict] = None) -> str:
+        """host:devices-l / adb devices -l lines for devices on the bus"""
+        fleet = fleet or self.load()
+        lines = []
+        for transport_id, (serial, device) in enumerate(fleet['devices'].items(), 1):
+            state = self.state_of(device)
+            if state is None:
+                continue
+            lines.append(
+                f"{serial} {state} usb:{device['bus']}-{device['port']} product:{device['codename']} "
+                f"model:{device['model']} device:{device['codename']} transport_id:{transport_id}"
+            )
+        return ''.join(line + '\n' for line in lines)
+
+    @staticmethod
+    def getprop(device: Dict, name: str) -> str:
+        props = {
+            'ro.product.device': device['codename'],
+            'ro.build.product': device['codename'],
+            'ro.product.model': device['model'].replace('_', '-'),
+            'ro.build.fingerprint': device['fingerprint']
+        }
+        return props.get(name, '')
+
+
+def write_fake_sysfs(root: Path, fleet: FakeFleet) -> Path:
+    """A /sys/bus/usb/devices lookalike: root hubs, one directory per tablet, and interfaces"""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    def write(name: str, attrs: Dict[str, str]):
+        device_dir = root / name
+        device_dir.mkdir(exist_ok=True)
+        for attr, value in attrs.items():
+            (device_dir / attr).write_text(f"{value}\n")
+
+    for serial, device in fleet.load()['devices'].items():
+        bus = device['bus']
+        write(f"usb{bus}", {'idVendor': '1d6b', 'idProduct': '0002', 'busnum': bus, 'devnum': 1,
+                            'manufacturer': 'Linux 6.1 xhci-hcd', 'product': 'xHCI Host Controller'})
+        write(f"{bus}-{device['port']}", {
+            'idVendor': device['vendor_id'],
+            'idProduct': device['product_id'],
+            'busnum': bus,
+            'devnum': device['devnum'],
+            'manufacturer': device['manufacturer'],
+            'product': device['product'],
+            'serial': serial
+        })
+        (root / f"{bus}-{device['port']}:1.0").mkdir(exist_ok=True)
+    return root
+
+
+def write_fake_tools(bin_dir: Path, fleet: FakeFleet) -> Path:
+    """Executable adb and lsusb scripts bound to fleet; put bin_dir first on PATH"""
+    bin_dir = Path(bin_dir)
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for tool in ('adb', 'lsusb'):
+        script = bin_dir / tool
+        script.write_text(
+            f"#!{sys.executable}\n"
+            f"import os, sys\n"
+            f"sys.path.insert(0, {str(REPO_ROOT)!r})\n"
+            f"os.environ.setdefault({FLEET_ENV!r}, {str(fleet.path)!r})\n"
+            f"from backend.benchmarks.fake_devices import {tool}_main\n"
+            f"sys.exit({tool}_main(sys.argv[1:]))\n"
+        )
+        script.chmod(script.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+
+def _simulate_call(fleet: Dict, latency_key: str) -> bool:
+    """Sleep the configured latency; False when this call should fail"""
+    rng = random.Random()
+    time.sleep(fleet[latency_key] * rng.uniform(0.5, 1.5))
+    return rng.random() >= fleet['failure_rate']
+
+
+def adb_main(argv: List[str]) -> int:
+    fleet_file = FakeFleet(os.environ[FLEET_ENV])
+    fleet = fleet_file.load()
+    serial = None
+    if len(argv) >= 2 and argv[0] == '-s':
+        serial, argv = argv[1], argv[2:]
+    command = argv[0] if argv else ''
+
+    if command in ('start-server', 'version'):
+        print("Android Debug Bridge version 1.0.41")
+        return 0
+    if not _simulate_call(fleet, 'adb_latency'):
+        print("error: protocol fault (couldn't read status): Connection reset by peer", file=sys.stderr)
+        return 1
+    if command == 'devices':
+        print("List of devices attached")
+        print(fleet_file.devices_text(fleet), end='')
+        return 0
+
+    device = fleet['devices'].get(serial)
+    state = fleet_file.state_of(device) if device else None
+    if state is None:
+        print(f"adb: device '{serial}' not found", file=sys.stderr)
+        return 1
+
+    if command == 'shell' and argv[1:2] == ['getprop']:
+        print(fleet_file.getprop(device, argv[2] if len(argv) > 2 else ''))
+        return 0
+    if command == 'reboot':
+        fleet_file.reboot(serial, argv[1] if len(argv) > 1 else '')
+        return 0
+    if command == 'sideload':
+        if state != 'sideload':
+            print("adb: sideload connection failed: closed", file=sys.stderr)
+            print("adb: trying pre-KitKat sideload method...", file=sys.stderr)
+            print("adb: pre-KitKat sideload connection failed: closed", file=sys.stderr)
+            return 1
+        size = os.path.getsize(argv[1])
+        # Progress redraws like the real client, about ten per second
+        seconds = size / fleet['sideload_rate']
+        steps = max(1, int(seconds * 10))
+        for step in range(1, steps + 1):
+            time.sleep(seconds / steps)
+            sys.stdout.write(f"\rserving: '{os.path.basename(argv[1])}'  (~{step * 100 // steps}%)    ")
+            sys.stdout.flush()
+        print("\nTotal xfer: 1.00x")
+        fleet_file.sideload_finished(serial)
+        return 0
+
+    print(f"fake adb: unsupported command {' '.join(argv)}", file=sys.stderr)
+    return 1
+
+
+def _lsusb_lines(fleet: Dict) -> List[tuple]:
+    lines = []
+    for bus in sorted({device['bus'] for device in fleet['devices'].values()}):
+        lines.append((bus, 1, f"Bus {bus:03d} Device 001: ID 1d6b:0002 Linux Foundation 2.0 root hub", None))
+    for serial, device in fleet['devices'].items():
+        lines.append((device['bus'], device['devnum'],
+                      f"Bus {device['bus']:03d} Device {device['devnum']:03d}: ID "
+                      f"{device['vendor_id']}:{device['product_id']} Samsung Electronics Co., Ltd {device['product']}",
+                      (serial, device)))
+    return lines
+
+
+def lsusb_main(argv: List[str]) -> int:
+    fleet = FakeFleet(os.environ[FLEET_ENV]).load()
+    if not _simulate_call(fleet, 'usb_latency'):
+        print("lsusb: cannot open /dev/bus/usb", file=sys.stderr)
+        return 1
+
+    selector = argv[argv.index('-s') + 1] if '-s' in argv else None
+    lines = _lsusb_lines(fleet)
+    if selector:
+        bus, _, devnum = selector.partition(':')
+        lines = [line for line in lines if line[0] == int(bus) and line[1] == int(devnum)]
+        if not lines:
+            return 1
+
+    for bus, devnum, text, owner in lines:
+        print(text)
+        if '-v' in argv and owner:
+            serial, device = owner
+            print(f"  idVendor           0x{device['vendor_id']} Samsung Electronics Co., Ltd")
+            print(f"  idProduct          0x{device['product_id']} {device['product']}")
+            print(f"  iManufacturer           1 {device['manufacturer']}")
+            print(f"  iProduct                2 {device['product']}")
+            print(f"  iSerial                 3 {serial}")
+    return 0
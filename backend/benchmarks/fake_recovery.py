@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import random
+from typing import Dict, List, Optional
+
+
+def recovery_read_order(block_count: int, rng: random.Random, reread_fraction: float = 0.02) -> List[int]:
+    """Block numbers in roughly the order recovery asks for them.
+
+    The zip end-of-central-directory and central directory first, then
+    the signature check reading the whole package front to back, then
+    the install pass streaming the payload again with a few blocks
+    re-read (the fuse block cache on the device is small).
+    """
+    tail = list(range(max(0, block_count - 3), block_count))
+    order = [block_count - 1] + tail + [0]
+    order += range(block_count)
+
+    install = list(range(block_count))
+    for _ in range(int(block_count * reread_fraction)):
+        position = rng.randrange(1, len(install))
+        install.insert(position, install[position - 1 - rng.randrange(min(position, 16))])
+    return order + install
+
+
+class FakeRecoveryServer:
+    """Stand-in for the ADB server with devices sitting in recovery sideload mode.
+
+    Speaks just enough of the host protocol for ``host:transport:<serial>``
+    followed by ``sideload-host:<size>:<block>``, then plays recovery:
+    requests blocks in ``recovery_read_order``, checks each answer against
+    the image, and optionally pauses now and then (``stall_every`` blocks
+    for ``stall_seconds``) the way a device does while writing partitions.
+    """
+
+    def __init__(self, image_path: str, block_delay: float = 0.0, stall_every: int = 0,
+                 stall_seconds: float = 0.0, fail_after: Optional[int] = None, seed: int = 0):
+        self.image_path = image_path
+        self.block_delay = block_delay
+        self.stall_every = stall_every
+        self.stall_seconds = stall_seconds
+        self.fail_after = fail_after
+        self.seed = seed
+        # serial -> {'blocks', 'mismatches', 'result'}
+        self.devices: Dict[str, Dict] = {}
+        self._server = None
+        self.port = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> str:
+        length = int(await reader.readexactly(4), 16)
+        return (await reader.readexactly(length)).decode()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            service = await self._read_request(reader)
+            if not service.startswith('host:transport:'):
+                message = b'unsupported in fake server'
+                writer.write(b'FAIL' + f"{len(message):04x}".encode() + message)
+                return
+            serial = service.split(':', 2)[2]
+            writer.write(b'OKAY')
+
+            service = await self._read_request(reader)
+            _, size, block_size = service.split(':')
+            size, block_size = int(size), int(block_size)
+            writer.write(b'OKAY')
+            await self.play_recovery(serial, reader, writer, size, block_size)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def play_recovery(self, serial, reader, writer, size, block_size):
+        """Drive one sideload-host session after its OKAY; also used by FakeAdbServer"""
+        state = {'blocks': 0, 'mismatches': 0, 'result': 'running'}
+        self.devices[serial] = state
+        rng = random.Random(f"{self.seed}:{serial}")
+        block_count = -(-size // block_size)
+
+        with open(self.image_path, 'rb') as image:
+            for block in recovery_read_order(block_count, rng):
+                if self.fail_after is not None and state['blocks'] >= self.fail_after:
+                    writer.write(b'FAILFAIL')
+                    await writer.drain()
+                    state['result'] = 'failed'
+                    return
+
+                writer.write(b'%08d' % block)
+                await writer.drain()
+                length = min(block_size, size - block * block_size)
+                data = await reader.readexactly(length)
+                image.seek(block * block_size)
+                if hashlib.sha256(data).digest() != hashlib.sha256(image.read(length)).digest():
+                    state['mismatches'] += 1
+                state['blocks'] += 1
+
+                if self.stall_every and state['blocks'] % self.stall_every == 0:
+                    await asyncio.sleep(self.stall_seconds)
+                elif self.block_delay:
+                    await asyncio.sleep(self.block_delay)
+
+        writer.write(b'DONEDONE')
+        await writer.drain()
+        state['result'] = 'completed'
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        self._server = await asyncio.start_server(self.handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,352 @@
+"""Load test of the API against a simulated fleet of tablets.
+
+    python -m backend.benchmarks.load_bench --devices 16 --output results.json
+    python -m backend.benchmarks.load_bench --adb cli --usb lsusb --baseline results.json
+
+Creates a FakeFleet of N tablets behind fake adb/lsusb executables, a fake
+sysfs tree and a FakeAdbServer (sideloads played by FakeRecoveryServer),
+starts a ThrottledImageServer mirror, and serves the real FastAPI app
+with its lifespan under uvicorn. Scenarios, run in the order given:
+
+    poll          concurrent clients polling GET /api/devices (inventory snapshot)
+    poll_refresh  the same with refresh=true, so every request enumerates USB and ADB
+    download      parallel downloads of distinct URLs from the mirror
+    flash         every tablet through flash/prepare and flash/confirm, sharing one download
+
+Results, with per-call ADB/USB latency and flash stage durations read
+from /api/metrics, are printed and written as JSON; --baseline reports
+numbers that moved by more than --threshold against an earlier run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+import aiohttp
+import uvicorn
+from backend.benchmarks.api_latency_bench import percentiles, run_in_thread
+from backend.benchmarks.fake_adb_server import FakeAdbServer
+from backend.benchmarks.fake_devices import FLEET_ENV, FakeFleet, write_fake_sysfs, write_fake_tools
+from backend.benchmarks.fake_recovery import FakeRecoveryServer
+from backend.benchmarks.throttled_server import ThrottledImageServer
+
+SCENARIOS = ('poll', 'poll_refresh', 'download', 'flash')
+HISTOGRAM_SUMMARY_RE = re.compile(r'^(xam_\w+?)_(sum|count)(\{[^}]*\})? (\S+)$')
+
+
+async def poll_devices(base_url: str, clients: int, seconds: float, refresh: bool) -> Dict:
+    """clients sequential pollers on one loop; runs in its own thread so it does not load the API's"""
+    url = f"{base_url}/api/devices" + ('?refresh=true' if refresh else '')
+    samples: List[float] = []
+    errors = 0
+    seen = 0
+    deadline = time.perf_counter() + seconds
+
+    async with aiohttp.ClientSession() as session:
+        async def client():
+            nonlocal errors, seen
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    async with session.get(url) as response:
+                        body = await response.json()
+                    if response.status != 200:
+                        raise aiohttp.ClientError(f"HTTP {response.status}")
+                except aiohttp.ClientError:
+                    errors += 1
+                    continue
+                samples.append(time.perf_counter() - started)
+                seen = max(seen, len(body['devices']))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        **percentiles(samples),
+        'clients': clients,
+        'requests_per_sec': round(len(samples) / elapsed, 1),
+        'errors': errors,
+        'devices_seen': seen
+    }
+
+
+async def run_poll(ctx: Dict, refresh: bool) -> Dict:
+    args = ctx['args']
+    thread, result = run_in_thread(lambda: poll_devices(ctx['base_url'], args.pollers, args.poll_seconds, refresh))
+    await asyncio.to_thread(thread.join)
+    return result['value']
+
+
+async def run_downloads(ctx: Dict) -> Dict:
+    from backend.services.download_manager import download_manager
+
+    mirror = ctx['mirror']
+    urls = [mirror.url.replace('lineage-bench.zip', f"load-{i}.zip") for i in range(ctx['args'].downloads)]
+    timings = {}
+
+    async def fetch(url: str):
+        started = time.perf_counter()
+        try:
+            await download_manager.fetch(url)
+            timings[url] = time.perf_counter() - started
+        except Exception as e:
+            print(f"Download of {url} failed: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(url) for url in urls))
+    elapsed = time.perf_counter() - started
+    # Through the API, so the image cache index forgets them too
+    async with aiohttp.ClientSession() as session:
+        for url in urls:
+            async with session.delete(f"{ctx['base_url']}/api/os/delete/{download_manager.get_filename(url)}"):
+                pass
+
+    return {
+        'downloads': len(urls),
+        'completed': len(timings),
+        'image_bytes': mirror.size,
+        'wall_seconds': round(elapsed, 3),
+        'aggregate_mb_per_sec': round(mirror.size * len(timings) / elapsed / 1e6, 2),
+        'per_download_seconds': {k: round(v, 3) for k, v in percentiles(list(timings.values())).items()}
+    }
+
+
+async def wait_for_jobs(session: aiohttp.ClientSession, base_url: str, job_ids: List[str], timeout: float) -> List[Dict]:
+    deadline = time.perf_counter() + timeout
+    while True:
+        async with session.get(f"{base_url}/api/flash/jobs") as response:
+            jobs = {job['id']: job for job in (await response.json())['jobs']}
+        wanted = [jobs[job_id] for job_id in job_ids if job_id in jobs]
+        if all(job['finished_at'] is not None for job in wanted) or time.perf_counter() > deadline:
+            return wanted
+        await asyncio.sleep(0.2)
+
+
+def job_summary(jobs: List[Dict], wall: float) -> Dict:
+    finished = [job for job in jobs if job['finished_at'] is not None]
+    states: Dict[str, int] = {}
+    for job in jobs:
+        states[job['state']] = states.get(job['state'], 0) + 1
+    return {
+        'jobs': len(jobs),
+        'states': states,
+        'wall_seconds': round(wall, 3),
+        'queue_wait': percentiles([job['started_at'] - job['created_at'] for job in finished if job['started_at']]),
+        'duration': percentiles([job['finished_at'] - job['started_at'] for job in finished if job['started_at']])
+    }
+
+
+async def run_flashes(ctx: Dict) -> Dict:
+    base_url, args = ctx['base_url'], ctx['args']
+    async with aiohttp.ClientSession() as session:
+        # The inventory needs a refresh or two before every tablet is ADB ready
+        deadline = time.perf_counter() + 30
+        while True:
+            async with session.get(f"{base_url}/api/devices?refresh=true") as response:
+                devices = [d for d in (await response.json())['devices'] if d['adb_ready']]
+            if len(devices) >= args.devices or time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(0.5)
+
+        result = {'devices_ready': len(devices)}
+        for step in ('prepare', 'confirm'):
+            started = time.perf_counter()
+            job_ids = []
+            for device in devices:
+                async with session.post(f"{base_url}/api/devices/{device['id']}/flash/{step}") as response:
+                    body = await response.json()
+                if response.status == 200:
+                    job_ids.append(body['job_id'])
+                else:
+                    print(f"flash/{step} for {device['id']} failed: {body}")
+            jobs = await wait_for_jobs(session, base_url, job_ids, args.flash_timeout)
+            result[step] = job_summary(jobs, time.perf_counter() - started)
+
+        # Where the time went, from each device's traces of its download and flash
+        stages: Dict[str, List[float]] = {}
+        for device in devices:
+            async with session.get(f"{base_url}/api/devices/{device['serial']}/flash/trace") as response:
+                if response.status != 200:
+                    continue
+                traces = await response.json()
+            for trace in traces.values():
+                for span in (trace or {}).get('spans', []):
+                    if span['depth'] == 1 and span['duration_ms'] is not None:
+                        stages.setdefault(span['name'], []).append(span['duration_ms'] / 1000)
+        result['stages'] = {name: percentiles(samples) for name, samples in stages.items()}
+    return result
+
+
+def summarize_metrics(text: str) -> Dict[str, Dict]:
+    """Count and mean of every histogram in a /api/metrics scrape; ms for *_seconds, else its own unit"""
+    summary: Dict[str, Dict] = {}
+    for line in text.splitlines():
+        match = HISTOGRAM_SUMMARY_RE.match(line)
+        if not match:
+            continue
+        name, field, labels, value = match.groups()
+        summary.setdefault(name + (labels or ''), {})[field] = float(value)
+    summarized = {}
+    for key, v in summary.items():
+        if not v.get('count'):
+            continue
+        mean = v['sum'] / v['count']
+        if key.split('{')[0].endswith('_seconds'):
+            summarized[key] = {'count': int(v['count']), 'mean_ms': round(mean * 1000, 3)}
+        else:
+            summarized[key] = {'count': int(v['count']), 'mean': round(mean, 3)}
+    return summarized
+
+
+def flatten(data, prefix: str = '') -> Dict[str, float]:
+    if isinstance(data, dict):
+        flat = {}
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(data, (int, float)) and not isinstance(data, bool):
+        return {prefix: data}
+    return {}
+
+
+def compare(baseline: Dict, results: Dict, threshold: float) -> List[Dict]:
+    """Numbers under 'scenarios' that changed by more than threshold (a fraction)"""
+    old, new = flatten(baseline.get('scenarios', {})), flatten(results['scenarios'])
+    changes = []
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] and abs(new[key] - old[key]) / abs(old[key]) > threshold:
+            changes.append({'metric': key, 'baseline': old[key], 'current': new[key],
+                            'change': round((new[key] - old[key]) / abs(old[key]), 3)})
+    return changes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=8)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument('--adb', choices=('native', 'cli'), default='native', help='ADB_BACKEND of the app')
+    parser.add_argument('--usb', choices=('sysfs', 'lsusb'), default='sysfs', help='USB_BACKEND of the app')
+    parser.add_argument('--sideload', choices=('native', 'cli'), default=None, help='defaults to --adb')
+    parser.add_argument('--adb-latency-ms', type=float, default=10)
+    parser.add_argument('--usb-latency-ms', type=float, default=5)
+    parser.add_argument('--failure-rate', type=float, default=0, help='share of fake adb/lsusb calls that fail')
+    parser.add_argument('--reboot-seconds', type=float, default=1)
+    parser.add_argument('--menu-seconds', type=float, default=0.5)
+    parser.add_argument('--sideload-rate-mbps', type=float, default=50, help='fake adb sideload speed in MB/s')
+    parser.add_argument('--image-mb', type=float, default=64)
+    parser.add_argument('--rate-mbps', type=float, default=0, help='mirror per-connection limit in MB/s (0 = unthrottled)')
+    parser.add_argument('--pollers', type=int, default=16)
+    parser.add_argument('--poll-seconds', type=float, default=5)
+    parser.add_argument('--downloads', type=int, default=4)
+    parser.add_argument('--flash-timeout', type=float, default=600)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=18766)
+    parser.add_argument('--output', help='write the results JSON here')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = Path(tempfile.mkdtemp(prefix='load_bench_'))
+    fleet = FakeFleet.create(
+        workdir / 'fleet.json',
+        devices=args.devices,
+        adb_latency=args.adb_latency_ms / 1000,
+        usb_latency=args.usb_latency_ms / 1000,
+        failure_rate=args.failure_rate,
+        reboot_seconds=args.reboot_seconds,
+        menu_seconds=args.menu_seconds,
+        sideload_rate=args.sideload_rate_mbps * 1e6,
+        seed=args.seed
+    )
+    bin_dir = write_fake_tools(workdir / 'bin', fleet)
+    sysfs_root = write_fake_sysfs(workdir / 'sysfs', fleet)
+
+    # Mirror and fake ADB server get their own loop so serving them does not count against the API
+    mirror = ThrottledImageServer(size=int(args.image_mb * 1024 * 1024), rate=args.rate_mbps * 1e6)
+    recovery = FakeRecoveryServer(image_path=None, seed=args.seed)
+    adb_server = FakeAdbServer(fleet, recovery, seed=args.seed)
+    fixtures_ready = threading.Event()
+    fixtures_stop = threading.Event()
+
+    async def serve_fixtures():
+        await mirror.start()
+        await adb_server.start()
+        fixtures_ready.set()
+        while not fixtures_stop.is_set():
+            await asyncio.sleep(0.1)
+        await adb_server.stop()
+        await mirror.stop()
+
+    fixtures_thread, _ = run_in_thread(serve_fixtures)
+    fixtures_ready.wait()
+
+    # Settings are read at import time
+    os.environ.update({
+        FLEET_ENV: str(fleet.path),
+        'PATH': f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        'LINEAGE_OS_URL': mirror.url,
+        'DOWNLOAD_DIR': str(workdir / 'downloads'),
+        'IMAGE_CACHE_MAX_GB': '0',
+        'STATUS_DB_PATH': str(workdir / 'history.db'),
+        'FLASH_JOURNAL_PATH': str(workdir / 'flash_journal.jsonl'),
+        'ADB_BACKEND': args.adb,
+        'ADB_SERVER_PORT': str(adb_server.port),
+        'SIDELOAD_BACKEND': args.sideload or args.adb,
+        'USB_BACKEND': args.usb,
+        'USB_SYSFS_ROOT': str(sysfs_root),
+        'HOTPLUG_BACKEND': 'off'
+    })
+    from backend.app.main import app
+    from backend.services.download_manager import download_manager
+    recovery.image_path = str(download_manager.download_dir / download_manager.get_filename(mirror.url))
+
+    api = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=args.port, log_level='warning'))
+    api_task = asyncio.create_task(api.serve())
+    while not api.started:
+        await asyncio.sleep(0.05)
+
+    ctx = {'args': args, 'base_url': f"http://127.0.0.1:{args.port}", 'mirror': mirror}
+    runners = {
+        'poll': lambda: run_poll(ctx, refresh=False),
+        'poll_refresh': lambda: run_poll(ctx, refresh=True),
+        'download': lambda: run_downloads(ctx),
+        'flash': lambda: run_flashes(ctx)
+    }
+    results = {'started_at': time.time(), 'config': vars(args), 'scenarios': {}}
+    for name in scenarios:
+        print(f"Running {name}...")
+        results['scenarios'][name] = await runners[name]()
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{ctx['base_url']}/api/metrics") as response:
+            results['metrics'] = summarize_metrics(await response.text())
+    results['fake_adb_server'] = {'requests': adb_server.requests, 'failures': adb_server.failures}
+
+    api.should_exit = True
+    await api_task
+    fixtures_stop.set()
+    fixtures_thread.join()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results['changes'] = compare(json.load(f), results, args.threshold)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
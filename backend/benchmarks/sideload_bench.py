@@ -0,0 +1,71 @@
+"""Native sideload throughput for N devices sharing one image.
+
+    python -m backend.benchmarks.sideload_bench --size-mb 256 --devices 4
+
+Writes a synthetic image, points SideloadServer at a FakeRecoveryServer
+playing recovery for every serial, and prints each session's block
+metrics plus what the fake devices saw as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from backend.benchmarks.fake_recovery import FakeRecoveryServer
+from backend.benchmarks.throttled_server import synthetic_bytes
+from backend.utils.adb_client import AdbClient
+from backend.utils.sideload_host import SideloadServer
+
+
+def write_image(path: str, size: int):
+    with open(path, 'wb') as f:
+        for offset in range(0, size, 4 * 1024 * 1024):
+            f.write(synthetic_bytes(offset, min(4 * 1024 * 1024, size - offset)))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=256)
+    parser.add_argument('--devices', type=int, default=4)
+    parser.add_argument('--readahead-kb', type=int, default=8192)
+    parser.add_argument('--block-delay-ms', type=float, default=0)
+    parser.add_argument('--stall-every', type=int, default=0, help='pause every N blocks (0 = never)')
+    parser.add_argument('--stall-ms', type=float, default=1500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='sideload_bench_')
+    image_path = os.path.join(workdir, 'lineage-bench.zip')
+    write_image(image_path, int(args.size_mb * 1024 * 1024))
+
+    recovery = FakeRecoveryServer(
+        image_path,
+        block_delay=args.block_delay_ms / 1000,
+        stall_every=args.stall_every,
+        stall_seconds=args.stall_ms / 1000
+    )
+    port = await recovery.start()
+    server = SideloadServer(AdbClient('127.0.0.1', port), args.readahead_kb * 1024)
+
+    serials = [f"bench{i:02d}" for i in range(args.devices)]
+    started = time.perf_counter()
+    await asyncio.gather(*(server.sideload(serial, image_path) for serial in serials))
+    elapsed = time.perf_counter() - started
+    await recovery.stop()
+
+    sessions = server.list_metrics()
+    print(json.dumps({
+        'image_bytes': os.path.getsize(image_path),
+        'devices': args.devices,
+        'readahead_bytes': args.readahead_kb * 1024,
+        'wall_seconds': round(elapsed, 3),
+        'aggregate_bytes_per_sec': int(sum(s['bytes_served'] for s in sessions) / elapsed),
+        'sessions': sessions,
+        'device_view': recovery.devices
+    }, indent=2))
+    os.remove(image_path)
+    os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from aiohttp import web
+
+CHUNK_SIZE = 64 * 1024
+
+
+def synthetic_byte(offset: int) -> int:
+    return (offset * 31 + 7) & 0xFF
+
+
+def synthetic_bytes(start: int, length: int) -> bytes:
+    """Deterministic image content, so downloads can be checked without storing them"""
+    pattern = bytes(synthetic_byte(i) for i in range(256))
+    head = start % 256
+    repeats = (head + length) // 256 + 1
+    return (pattern * repeats)[head:head + length]
+
+
+class ThrottledImageServer:
+    """Local stand-in for the image mirror.
+
+    Serves a synthetic image of ``size`` bytes with ``Range`` support and
+    limits every connection to ``rate`` bytes/s, like per-flow throttling
+    on the real mirror.
+    """
+
+    def __init__(self, size: int, rate: float, support_ranges: bool = True, etag: str = '"bench-1"',
+                 publish_checksum: bool = False):
+        self.size = size
+        # Fault injection: answer the next N requests with 503, and drop the
+        # next M connections after reset_after bytes of body
+        self.fail_next = 0
+        self.reset_next = 0
+        self.reset_after = 1024 * 1024
+        self.publish_checksum = publish_checksum
+        self._sha256 = None
+        self.rate = rate
+        self.support_ranges = support_ranges
+        self.etag = etag
+        self.last_modified = formatdate(1700000000, usegmt=True)
+        self.requests = 0
+        self._runner = None
+        self.url = None
+
+    def _parse_range(self, header: str):
+        # Only the single "bytes=start-end" form is needed here
+        if not header.startswith('bytes='):
+            return None
+        first, _, last = header[6:].partition('-')
+        start = int(first) if first else self.size - int(last)
+        end = int(last) if first and last else self.size - 1
+        return start, min(end, self.size - 1)
+
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            for offset in range(0, self.size, 4 * 1024 * 1024):
+                digest.update(synthetic_bytes(offset, min(4 * 1024 * 1024, self.size - offset)))
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    def _not_modified(self, request: web.Request) -> bool:
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match == self.etag
+        if_modified_since = request.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            return parsedate_to_datetime(self.last_modified) <= parsedate_to_datetime(if_modified_since)
+        return False
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        if request.match_info['name'].endswith('.sha256'):
+            if not self.publish_checksum:
+                raise web.HTTPNotFound()
+            return web.Response(text=f"{self.sha256()}  {request.match_info['name'][:-7]}\n")
+
+        self.requests += 1
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise web.HTTPServiceUnavailable()
+
+        if self._not_modified(request):
+            return web.Response(status=304, headers={'ETag': self.etag, 'Last-Modified': self.last_modified})
+
+        start, end = 0, self.size - 1
+        status = 200
+
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if self.support_ranges and range_header and (if_range is None or if_range == self.etag):
+            start, end = self._parse_range(range_header)
+            status = 206
+
+        headers = {
+            'Content-Length': str(end - start + 1),
+            'ETag': self.etag,
+            'Last-Modified': self.last_modified
+        }
+        if self.support_ranges:
+            headers['Accept-Ranges'] = 'bytes'
+        if status == 206:
+            headers['Content-Range'] = f"bytes {start}-{end}/{self.size}"
+
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+        if request.method == 'HEAD':
+            return response
+
+        reset_at = None
+        if self.reset_next > 0:
+            self.reset_next -= 1
+            reset_at = start + self.reset_after
+
+        offset = start
+        try:
+            while offset <= end:
+                if reset_at is not None and offset >= reset_at:
+                    request.transport.close()
+                    return response
+                length = min(CHUNK_SIZE, end - offset + 1)
+                await response.write(synthetic_bytes(offset, length))
+                offset += length
+                if self.rate > 0:
+                    await asyncio.sleep(length / self.rate)
+            await response.write_eof()
+        except ConnectionResetError:
+            # Client went away (cancelled or interrupted download)
+            pass
+        return response
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_route('GET', '/{name}', self.handle)
+        app.router.add_route('HEAD', '/{name}', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}/lineage-bench.zip"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -10,6 +10,73 @@ load_dotenv(dotenv_path=env_path)
 class Settings:
     def __init__(self):
         self.LINEAGE_OS_URL = os.getenv('LINEAGE_OS_URL', '')
+        # Expected SHA-256 of LINEAGE_OS_URL; otherwise <url>.sha256 is used when published
+        self.LINEAGE_OS_SHA256 = os.getenv('LINEAGE_OS_SHA256', '')
+        self.DOWNLOAD_DIR = os.getenv('DOWNLOAD_DIR', '/tmp/lineage_downloads')
+        # Parallel HTTP range requests per image, and the smallest segment worth its own connection
+        self.DOWNLOAD_CONNECTIONS = int(os.getenv('DOWNLOAD_CONNECTIONS', '4'))
+        self.DOWNLOAD_MIN_SEGMENT_SIZE = int(os.getenv('DOWNLOAD_MIN_SEGMENT_SIZE', str(8 * 1024 * 1024)))
+        # Received data is written to disk in blocks of this size from a worker thread
+        self.DOWNLOAD_WRITE_BUFFER_SIZE = int(os.getenv('DOWNLOAD_WRITE_BUFFER_SIZE', str(4 * 1024 * 1024)))
+        # Shared outbound HTTP client: connection pool, DNS cache (seconds), timeouts
+        # (seconds; no overall limit) and retries with jittered exponential backoff
+        self.HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+        self.HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', '16'))
+        self.HTTP_DNS_CACHE_TTL = float(os.getenv('HTTP_DNS_CACHE_TTL', '300'))
+        self.HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+        self.HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+        self.HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '4'))
+        self.HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.5'))
+        # How long a remote freshness check of LINEAGE_OS_URL is reused (seconds)
+        self.OS_FRESHNESS_TTL = float(os.getenv('OS_FRESHNESS_TTL', '300'))
+        # Image cache size budget; least recently used images beyond it are evicted (0 = unlimited)
+        self.IMAGE_CACHE_MAX_GB = float(os.getenv('IMAGE_CACHE_MAX_GB', '20'))
+        # USB enumeration backend: 'sysfs', 'lsusb' or 'auto' (sysfs when available)
+        self.USB_BACKEND = os.getenv('USB_BACKEND', 'auto')
+        self.USB_SYSFS_ROOT = os.getenv('USB_SYSFS_ROOT', '/sys/bus/usb/devices')
+        # Device inventory: background refresh period and max snapshot age (seconds)
+        self.DEVICE_REFRESH_INTERVAL = float(os.getenv('DEVICE_REFRESH_INTERVAL', '2'))
+        self.DEVICE_SNAPSHOT_MAX_AGE = float(os.getenv('DEVICE_SNAPSHOT_MAX_AGE', '10'))
+        # Hotplug: 'auto', 'pyudev', 'netlink' or 'off'; with a watcher running the
+        # inventory only does a full rescan every HOTPLUG_RESYNC_INTERVAL seconds
+        self.HOTPLUG_BACKEND = os.getenv('HOTPLUG_BACKEND', 'auto')
+        self.HOTPLUG_RESYNC_INTERVAL = float(os.getenv('HOTPLUG_RESYNC_INTERVAL', '30'))
+        # ADB: 'native' talks the host protocol to the server, 'cli' forks the adb binary
+        self.ADB_BACKEND = os.getenv('ADB_BACKEND', 'native')
+        self.ADB_SERVER_HOST = os.getenv('ADB_SERVER_HOST', '127.0.0.1')
+        self.ADB_SERVER_PORT = int(os.getenv('ADB_SERVER_PORT', os.getenv('ANDROID_ADB_SERVER_PORT', '5037')))
+        # Flash readiness waits (seconds); adapted per model from observed waits
+        self.RECOVERY_WAIT_TIMEOUT = float(os.getenv('RECOVERY_WAIT_TIMEOUT', '120'))
+        self.SIDELOAD_WAIT_TIMEOUT = float(os.getenv('SIDELOAD_WAIT_TIMEOUT', '300'))
+        self.REBOOT_WAIT_TIMEOUT = float(os.getenv('REBOOT_WAIT_TIMEOUT', '60'))
+        # Sideload: 'cli' runs adb sideload, 'native' serves the sideload-host block
+        # protocol from a shared mmap of the image (read-ahead window in bytes)
+        self.SIDELOAD_BACKEND = os.getenv('SIDELOAD_BACKEND', 'cli')
+        self.SIDELOAD_READAHEAD = int(os.getenv('SIDELOAD_READAHEAD', str(8 * 1024 * 1024)))
+        # Flash scheduler: concurrent jobs overall and flash jobs per USB bus
+        self.FLASH_MAX_CONCURRENT = int(os.getenv('FLASH_MAX_CONCURRENT', '8'))
+        self.FLASH_MAX_PER_BUS = int(os.getenv('FLASH_MAX_PER_BUS', '2'))
+        # Write-ahead journal of flash stages ('' disables it), and how long startup
+        # recovery waits for a journaled device to show up in ADB (seconds)
+        self.FLASH_JOURNAL_PATH = os.getenv('FLASH_JOURNAL_PATH', str(Path(self.DOWNLOAD_DIR) / 'flash_journal.jsonl'))
+        self.FLASH_RECOVERY_WAIT = float(os.getenv('FLASH_RECOVERY_WAIT', '60'))
+        # Push updates (SSE/WebSocket): max batches per second per client
+        self.EVENTS_MAX_RATE_HZ = float(os.getenv('EVENTS_MAX_RATE_HZ', '4'))
+        # Flash/download status: transitions kept per device, seconds a finished
+        # status stays visible, and a cap on how many are held in memory
+        self.STATUS_TRANSITIONS = int(os.getenv('STATUS_TRANSITIONS', '20'))
+        self.STATUS_TTL = float(os.getenv('STATUS_TTL', '3600'))
+        self.STATUS_MAX_RECORDS = int(os.getenv('STATUS_MAX_RECORDS', '1000'))
+        # SQLite history of finished jobs ('' disables it), written in batches
+        self.STATUS_DB_PATH = os.getenv('STATUS_DB_PATH', str(Path(self.DOWNLOAD_DIR) / 'history.db'))
+        self.STATUS_DB_BATCH_SIZE = int(os.getenv('STATUS_DB_BATCH_SIZE', '100'))
+        self.STATUS_DB_FLUSH_INTERVAL = float(os.getenv('STATUS_DB_FLUSH_INTERVAL', '5'))
+        # Flash tracing: traces kept (a device's latest download and flash count
+        # separately), spans per trace, and an optional JSONL file finished
+        # traces are appended to ('' disables it)
+        self.TRACE_MAX_TRACES = int(os.getenv('TRACE_MAX_TRACES', '400'))
+        self.TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '2000'))
+        self.TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
 
 @lru_cache()
 def get_settings():
@@ -0,0 +1,192 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+from backend.utils.usb_manager import USBManager
+from backend.utils.adb_manager import ADBManager
+from backend.utils.hotplug import HotplugWatcher
+from backend.services.event_bus import event_bus
+from backend.config.settings import get_settings
+
+
+class DeviceSnapshot:
+    """View of the connected tablets, indexed by USB id and serial.
+
+    The device list and indexes are never changed once built; only
+    refreshed_at moves forward when a scan finds the same devices.
+    """
+
+    def __init__(self, generation: int, devices: List[Dict], updated_at: float, refreshed_at: float):
+        self.generation = generation
+        self.devices = devices
+        self.updated_at = updated_at
+        self.refreshed_at = refreshed_at
+        self.by_id = {d['id']: d for d in devices}
+        self.by_serial = {
+            d['serial']: d for d in devices
+            if d.get('serial') and d['serial'] != 'N/A'
+        }
+
+    def age(self) -> float:
+        return time.monotonic() - self.refreshed_at
+
+    def to_dict(self) -> Dict:
+        return {
+            'devices': self.devices,
+            'generation': self.generation,
+            'updated_at': self.updated_at,
+            'age': round(self.age(), 3)
+        }
+
+
+class DeviceInventory:
+    """Long-lived USB/ADB enumeration shared by all device endpoints.
+
+    A background task refreshes the snapshot every ``refresh_interval``
+    seconds; endpoints read it from memory. When a hotplug watcher is
+    running, add/remove uevents are applied as deltas and the full rescan
+    only runs every ``resync_interval`` seconds. The generation number
+    only increases when the device list actually changes.
+    """
+
+    def __init__(self, refresh_interval: float, max_age: float,
+                 hotplug_backend: str = 'off', resync_interval: float = 30.0):
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.hotplug_backend = hotplug_backend
+        self.resync_interval = resync_interval
+        self.snapshot = DeviceSnapshot(0, [], 0.0, float('-inf'))
+        self.watcher: Optional[HotplugWatcher] = None
+        self._refreshing: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def hotplug_active(self) -> bool:
+        return self.watcher is not None and self.watcher.backend not in (None, 'poll')
+
+    def _publish(self, devices: List[Dict]) -> DeviceSnapshot:
+        current = self.snapshot
+        now = time.monotonic()
+
+        if devices == current.devices and current.generation > 0:
+            current.refreshed_at = now
+            return current
+
+        self.snapshot = DeviceSnapshot(current.generation + 1, devices, time.time(), now)
+        event_bus.publish('devices', 'snapshot', {
+            'devices': devices,
+            'generation': self.snapshot.generation,
+            'updated_at': self.snapshot.updated_at
+        })
+        return self.snapshot
+
+    async def _do_refresh(self) -> DeviceSnapshot:
+        devices = await USBManager.get_connected_tablets()
+        return self._publish(devices)
+
+    async def apply_uevent(self, event: Dict[str, str]):
+        """Apply a hotplug add/remove delta, re-querying only the changed device"""
+        if self._refreshing is not None:
+            await asyncio.shield(self._refreshing)
+
+        busnum, devnum = event.get('BUSNUM', ''), event.get('DEVNUM', '')
+        if event.get('ACTION') == 'resync' or not (busnum.isdigit() and devnum.isdigit()):
+            await self.refresh()
+            return
+
+        device_id = f"{int(busnum):03d}-{int(devnum):03d}"
+        device = None
+        if event['ACTION'] == 'add':
+            device = await USBManager.get_tablet(busnum, devnum, event.get('DEVPATH'))
+            if device is None:
+                return
+
+        # Read the snapshot after the query so concurrent deltas are kept
+        devices = [d for d in self.snapshot.devices if d['id'] != device_id]
+        if device is not None:
+            devices.append(device)
+        self._publish(devices)
+
+    def apply_adb_changes(self, serials):
+        """Update ADB fields of the affected devices without touching USB"""
+        current = self.snapshot
+        if not any(serial in current.by_serial for serial in serials):
+            return
+
+        devices = [
+            {**d, **USBManager.adb_fields(d['serial'], ADBManager.get_state(d['serial']))}
+            if d['serial'] in serials else d
+            for d in current.devices
+        ]
+        self._publish(devices)
+
+    async def refresh(self) -> DeviceSnapshot:
+        """Re-enumerate now; concurrent callers share the same enumeration"""
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._do_refresh())
+            self._refreshing.add_done_callback(self._clear_refreshing)
+        return await asyncio.shield(self._refreshing)
+
+    def _clear_refreshing(self, future: asyncio.Future):
+        if self._refreshing is future:
+            self._refreshing = None
+
+    async def get_snapshot(self, force: bool = False, max_age: Optional[float] = None) -> DeviceSnapshot:
+        """Return the cached snapshot, refreshing it when forced or stale"""
+        if max_age is None:
+            # Deltas keep the snapshot current between resyncs
+            max_age = self.max_age + (self.resync_interval if self.hotplug_active else 0)
+        if force or self.snapshot.age() > max_age:
+            return await self.refresh()
+        return self.snapshot
+
+    async def find_device(self, device_id: str) -> Optional[Dict]:
+        """Look up a device by USB id, re-enumerating once on a miss"""
+        snapshot = await self.get_snapshot()
+        device = snapshot.by_id.get(device_id)
+        if device is None:
+            snapshot = await self.refresh()
+            device = snapshot.by_id.get(device_id)
+        return device
+
+    def get_by_id(self, device_id: str) -> Optional[Dict]:
+        return self.snapshot.by_id.get(device_id)
+
+    def get_by_serial(self, serial: str) -> Optional[Dict]:
+        return self.snapshot.by_serial.get(serial)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Device inventory refresh failed: {e}")
+            await asyncio.sleep(self.resync_interval if self.hotplug_active else self.refresh_interval)
+
+    def start(self):
+        if self.watcher is None and self.hotplug_backend != 'off':
+            self.watcher = HotplugWatcher(self.apply_uevent, self.hotplug_backend)
+            self.watcher.start()
+        ADBManager.add_listener(self.apply_adb_changes)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        ADBManager.remove_listener(self.apply_adb_changes)
+        if self.watcher is not None:
+            await self.watcher.stop()
+            self.watcher = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+device_inventory = DeviceInventory(
+    refresh_interval=get_settings().DEVICE_REFRESH_INTERVAL,
+    max_age=get_settings().DEVICE_SNAPSHOT_MAX_AGE,
+    hotplug_backend=get_settings().HOTPLUG_BACKEND,
+    resync_interval=get_settings().HOTPLUG_RESYNC_INTERVAL
+)
@@ -0,0 +1,744 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import aiohttp
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from backend.config.settings import get_settings
+from backend.services.http_client import RETRYABLE_ERRORS, http_client
+from backend.services.image_cache import ImageCache, image_cache
+from backend.services.status_store import StatusRecord, StatusStore, job_history
+from backend.utils.metrics import DOWNLOAD_BYTES, DOWNLOAD_SECONDS, DOWNLOAD_THROUGHPUT, DOWNLOADS_ACTIVE
+
+ProgressListener = Callable[[StatusRecord], None]
+
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    """Timestamp of an HTTP date header, or None if absent or malformed"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class DownloadManager:
+    """Single download path for OS images.
+
+    Each URL maps to one canonical file in ``download_dir``. Concurrent
+    requests for the same URL share one transfer; its progress is kept in
+    the ``progress`` status store (keyed by filename, published on the
+    'download' topic) and fanned out to per-caller listeners. Servers
+    that support byte ranges are fetched over up to ``connections``
+    parallel range requests into a resumable ``.part`` file that is
+    renamed into place once complete.
+    Every image is hashed while it streams in and checked against the
+    expected SHA-256 before it is added to the image cache. Received data
+    is buffered and written (and hashed) in large blocks from a worker
+    thread, so the event loop serving the API only moves bytes.
+    """
+
+    CHECKPOINT_INTERVAL = 1.0
+    PROGRESS_INTERVAL = 0.25
+    FRESHNESS_TIMEOUT = 5.0
+    # Failed checks are remembered briefly so an unreachable mirror is not re-asked on every call
+    FRESHNESS_ERROR_TTL = 30.0
+
+    def __init__(self, download_dir: Path, connections: int = 1, min_segment_size: int = 8 * 1024 * 1024,
+                 write_buffer_size: int = 4 * 1024 * 1024, cache: Optional[ImageCache] = None,
+                 freshness_ttl: float = 300.0, progress: Optional[StatusStore] = None):
+        self.download_dir = download_dir
+        self.freshness_ttl = freshness_ttl
+        # Unbounded index of its own unless it shares the application cache
+        self.cache = cache or ImageCache(download_dir, max_bytes=0)
+        self.write_buffer_size = write_buffer_size
+        self.connections = connections
+        self.min_segment_size = min_segment_size
+        self.download_dir.mkdir(parents=True, exist_ok=True)
+        self.progress = progress or StatusStore('download')
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._listeners: Dict[str, Set[ProgressListener]] = {}
+        self._last_report: Dict[str, float] = {}
+        # url -> (monotonic time checked, result) for check_freshness
+        self._freshness: Dict[str, Tuple[float, Dict]] = {}
+        self._freshness_checks: Dict[str, asyncio.Task] = {}
+
+    def get_filename(self, url: str) -> str:
+        """Get consistent filename for OS image"""
+        url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
+        filename = url.split('/')[-1]
+
+        # Keep original extension if it's a supported format
+        if not filename.endswith(('.zip', '.img')):
+            # Default to .zip for LineageOS (most common format)
+            filename = f"lineage_{url_hash}.zip"
+
+        return filename
+
+    def get_path(self, url: str) -> Path:
+        return self.download_dir / self.get_filename(url)
+
+    def check_cached(self, url: str) -> Tuple[bool, Optional[str]]:
+        """Check if the image for url is already downloaded"""
+        file_path = self.get_path(url)
+        if not self.is_downloading(url) and file_path.exists() and file_path.stat().st_size > 0:
+            return True, str(file_path)
+        return False, None
+
+    async def check_freshness(self, url: str, force: bool = False) -> Dict:
+        """Compare the cached image for url with the server's copy without downloading it.
+
+        Sends a conditional HEAD (If-None-Match / If-Modified-Since from the
+        cached image) and caches the answer for ``freshness_ttl`` seconds, or
+        ``FRESHNESS_ERROR_TTL`` if it failed; concurrent callers share one
+        request.
+        """
+        cached = self._freshness.get(url)
+        if cached and not force:
+            ttl = self.FRESHNESS_ERROR_TTL if cached[1]['error'] else self.freshness_ttl
+            if time.monotonic() - cached[0] < ttl:
+                return cached[1]
+
+        task = self._freshness_checks.get(url)
+        if task is None:
+            task = asyncio.create_task(self._check_freshness(url))
+            self._freshness_checks[url] = task
+            task.add_done_callback(lambda t: self._freshness_checks.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def _check_freshness(self, url: str) -> Dict:
+        is_cached, cached_path = self.check_cached(url)
+        entry = self.cache.get(self.get_filename(url)) or {}
+        local = None
+        headers = {}
+
+        if is_cached:
+            stat = Path(cached_path).stat()
+            local = {
+                'size': stat.st_size,
+                'etag': entry.get('etag'),
+                'last_modified': entry.get('last_modified'),
+                'sha256': entry.get('sha256')
+            }
+            if local['etag']:
+                headers['If-None-Match'] = local['etag']
+            # Without a server date, "changed since we downloaded it" is the next best question
+            headers['If-Modified-Since'] = local['last_modified'] or formatdate(stat.st_mtime, usegmt=True)
+
+        result = {
+            'url': url,
+            'cached': is_cached,
+            'local': local,
+            'remote': None,
+            'stale': None,
+            'error': None,
+            'checked_at': time.time()
+        }
+        try:
+            async with http_client.request(
+                'HEAD', url,
+                retries=0,
+                headers=headers,
+                allow_redirects=True,
+                timeout=aiohttp.ClientTimeout(total=self.FRESHNESS_TIMEOUT)
+            ) as response:
+                remote = {
+                    'status': response.status,
+                    'size': response.content_length,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result['error'] = str(e) or type(e).__name__
+            self._freshness[url] = (time.monotonic(), result)
+            return result
+
+        result['remote'] = remote
+        if remote['status'] == 304:
+            result['stale'] = False
+        elif remote['status'] >= 400:
+            result['error'] = f"HTTP {remote['status']}"
+        elif local is not None:
+            result['stale'] = self._compare_validators(local, remote, Path(cached_path).stat().st_mtime)
+
+        self._freshness[url] = (time.monotonic(), result)
+        return result
+
+    @staticmethod
+    def _compare_validators(local: Dict, remote: Dict, mtime: float) -> Optional[bool]:
+        """Whether a 200 answer describes a different file; None when nothing can be compared.
+
+        Many mirrors ignore conditional headers on HEAD, so the 200 alone
+        does not mean the image changed.
+        """
+        if local['etag'] and remote['etag']:
+            return local['etag'] != remote['etag']
+        if remote['size'] is not None and remote['size'] != local['size']:
+            return True
+
+        remote_modified = parse_http_date(remote['last_modified'])
+        if remote_modified is None:
+            return None
+        local_modified = parse_http_date(local['last_modified'])
+        if local_modified is not None:
+            return remote_modified != local_modified
+        # A server copy changed after ours was written is a newer build
+        return remote_modified > mtime
+
+    def is_downloading(self, url: str) -> bool:
+        return url in self._inflight
+
+    def is_file_in_use(self, filename: str) -> bool:
+        return any(self.get_filename(url) == filename for url in self._inflight)
+
+    def start(self, url: str) -> bool:
+        """Start a background download; False if it is already running"""
+        if url in self._inflight:
+            return False
+        self._ensure_task(url)
+        return True
+
+    async def fetch(self, url: str, on_progress: Optional[ProgressListener] = None) -> str:
+        """Return the local path for url, downloading it once for all callers"""
+        is_cached, cached_path = self.check_cached(url)
+        if is_cached:
+            return cached_path
+
+        task = self._ensure_task(url)
+        if on_progress is not None:
+            self._listeners.setdefault(url, set()).add(on_progress)
+            progress = self.progress.get(self.get_filename(url))
+            if progress is not None:
+                on_progress(progress)
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if on_progress is not None:
+                self._listeners.get(url, set()).discard(on_progress)
+
+    def _ensure_task(self, url: str) -> asyncio.Task:
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._download(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda t: self._finish(url, t))
+        return task
+
+    def _finish(self, url: str, task: asyncio.Task):
+        self._inflight.pop(url, None)
+        self._last_report.pop(url, None)
+        self._listeners.pop(url, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Download of {url} failed: {task.exception()}")
+
+    def _report_progress(self, url: str, downloaded: int, total_size: int):
+        """Byte counters from the download loops, published at most every PROGRESS_INTERVAL"""
+        now = time.monotonic()
+        # Without a Content-Length total_size is 0, and every chunk would be published
+        if now - self._last_report.get(url, 0.0) < self.PROGRESS_INTERVAL \
+                and (total_size <= 0 or downloaded < total_size):
+            return
+        self._last_report[url] = now
+
+        fields = {'downloaded': downloaded}
+        if total_size > 0:
+            fields['progress'] = int((downloaded / total_size) * 100)
+        self._update(url, fields)
+
+    def _update(self, url: str, fields: Dict, new: bool = False):
+        filename = self.get_filename(url)
+        if new:
+            progress = self.progress.start(filename, fields)
+        else:
+            progress = self.progress.update(filename, fields)
+        for listener in list(self._listeners.get(url, ())):
+            try:
+                listener(progress)
+            except Exception as e:
+                print(f"Download progress listener failed: {e}")
+
+    def get_partial(self, url: str) -> 'PartialDownload':
+        return PartialDownload(self.download_dir / f"{self.get_filename(url)}.part", url)
+
+    def discard_partial(self, filename: str):
+        """Drop resumable state for filename (no-op if there is none)"""
+        PartialDownload(self.download_dir / f"{filename}.part", '').discard()
+
+    def plan_segments(self, gaps: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Split the missing [start, end) ranges into segments of at least min_segment_size"""
+        remaining = sum(end - start for start, end in gaps)
+        step = max(self.min_segment_size, -(-remaining // self.connections))
+        return [
+            (offset, min(offset + step, end))
+            for start, end in gaps
+            for offset in range(start, end, step)
+        ]
+
+    async def _download(self, url: str) -> str:
+        filename = self.get_filename(url)
+        file_path = self.download_dir / filename
+        partial = self.get_partial(url)
+
+        self._update(url, {
+            'url': url,
+            'status': 'downloading',
+            'progress': 0,
+            'downloaded': 0,
+            'total': 0,
+            'error': None
+        }, new=True)
+        started = time.monotonic()
+
+        try:
+            expected_sha256 = await self._expected_sha256(url)
+            hasher = FrontierHasher(partial.path)
+
+            # A one-byte range probe tells us the size, the validators and whether
+            # ranges work; servers that ignore Range answer 200 and we stream that body
+            async with http_client.request('GET', url, headers={'Range': 'bytes=0-0'}) as probe:
+                etag = probe.headers.get('ETag')
+                last_modified = probe.headers.get('Last-Modified')
+                if probe.status == 200:
+                    partial.discard()
+                    await self._download_single(url, probe, partial.path, hasher)
+                elif probe.status != 206:
+                    raise Exception(f"Failed to download: HTTP {probe.status}")
+                else:
+                    total_size = self._parse_total_size(probe.headers.get('Content-Range', ''))
+                    if total_size is None:
+                        raise Exception("Server did not report the image size")
+                    partial.prepare(total_size, etag, last_modified)
+
+            if probe.status == 206:
+                self.cache.evict(reserve=partial.size)
+                await self._download_segments(url, partial, hasher)
+
+            sha256 = hasher.hexdigest()
+            if expected_sha256 and sha256 != expected_sha256:
+                partial.resumable = False
+                raise Exception(f"Checksum mismatch: expected {expected_sha256}, got {sha256}")
+
+            # Only a complete image ever appears under its final name
+            os.replace(partial.path, file_path)
+            partial.discard()
+            self.cache.add(filename, url, sha256, verified=expected_sha256 is not None,
+                           etag=etag, last_modified=last_modified)
+            self._freshness.pop(url, None)
+            self.cache.evict(keep=filename)
+            self._update(url, {
+                'status': 'completed',
+                'progress': 100,
+                'sha256': sha256,
+                'verified': expected_sha256 is not None
+            })
+            self._observe(url, 'completed', started)
+            return str(file_path)
+
+        except BaseException as e:
+            self._update(url, {'status': 'error', 'error': str(e) or type(e).__name__})
+            self._observe(url, 'cancelled' if isinstance(e, asyncio.CancelledError) else 'error', started)
+            # Ranged downloads keep .part and its sidecar so a retry resumes
+            if not partial.resumable:
+                partial.discard()
+            raise
+
+    def _observe(self, url: str, result: str, started: float):
+        elapsed = time.monotonic() - started
+        DOWNLOAD_SECONDS.labels(result).observe(elapsed)
+        record = self.progress.get(self.get_filename(url))
+        if result == 'completed' and record is not None and elapsed > 0:
+            # Bytes fetched by this attempt, not those a resume started from
+            fetched = (record.get('downloaded') or 0) - (record.get('resumed_from') or 0)
+            DOWNLOAD_THROUGHPUT.observe(fetched / elapsed)
+
+    async def _expected_sha256(self, url: str) -> Optional[str]:
+        """Configured checksum for the LineageOS URL, else the .sha256 published next to url"""
+        settings = get_settings()
+        if url == settings.LINEAGE_OS_URL and settings.LINEAGE_OS_SHA256:
+            return settings.LINEAGE_OS_SHA256.lower()
+
+        try:
+            async with http_client.request('GET', f"{url}.sha256") as response:
+                if response.status != 200 or (response.content_length or 0) > 4096:
+                    return None
+                # "<hex digest>  <filename>"
+                words = (await response.content.read(4096)).decode(errors='replace').split()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Could not fetch checksum for {url}: {e}")
+            return None
+
+        digest = words[0].lower() if words else ''
+        if len(digest) == 64 and all(c in '0123456789abcdef' for c in digest):
+            return digest
+        return None
+
+    @staticmethod
+    def _parse_total_size(content_range: str) -> Optional[int]:
+        # "bytes 0-0/1234"
+        total = content_range.rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+
+    async def _download_single(self, url: str, response: aiohttp.ClientResponse, file_path: Path,
+                               hasher: 'FrontierHasher'):
+        total_size = int(response.headers.get('content-length', 0))
+        self._update(url, {'total': total_size, 'connections': 1})
+
+        downloaded = 0
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            writer = RangeWriter(fd, 0, hasher, self.write_buffer_size)
+            async for chunk in response.content.iter_any():
+                await writer.write(chunk)
+                downloaded += len(chunk)
+                self._report_progress(url, downloaded, total_size)
+            await writer.flush()
+        finally:
+            os.close(fd)
+
+    async def _download_segments(self, url: str, partial: 'PartialDownload', hasher: 'FrontierHasher'):
+        """Fetch the missing byte ranges in parallel, each written at its own offset"""
+        total_size = partial.size
+        segments = self.plan_segments(partial.missing())
+        downloaded = total_size - sum(end - start for start, end in segments)
+        # segment start -> first byte not yet written
+        positions = {start: start for start, _ in segments}
+
+        self._update(url, {
+            'total': total_size,
+            'downloaded': downloaded,
+            'resumed_from': downloaded,
+            'connections': min(len(segments), self.connections),
+            'progress': int((downloaded / total_size) * 100) if total_size else 0
+        })
+
+        def written_until(offset: int) -> int:
+            for start, end in merge_ranges(partial.completed + [(s, positions[s]) for s, _ in segments]):
+                if start <= offset < end:
+                    return end
+            return offset
+
+        if not segments:
+            await hasher.advance(written_until)
+            return
+
+        fd = os.open(partial.path, os.O_WRONLY | os.O_CREAT, 0o644)
+        fd_open = True
+        slots = asyncio.Semaphore(self.connections)
+        checkpoint_lock = threading.Lock()
+
+        def written() -> List[Tuple[int, int]]:
+            # Taken on the event loop: every byte it claims was written before the sync that follows
+            return [(start, positions[start]) for start, _ in segments]
+
+        def checkpoint(ranges: List[Tuple[int, int]]):
+            # Flush data before the sidecar claims it
+            with checkpoint_lock:
+                if fd_open:
+                    os.fdatasync(fd)
+                    partial.save(ranges)
+
+        def close(ranges: Optional[List[Tuple[int, int]]]):
+            nonlocal fd_open
+            with checkpoint_lock:
+                try:
+                    if ranges is not None:
+                        os.fdatasync(fd)
+                        partial.save(ranges)
+                finally:
+                    fd_open = False
+                    os.close(fd)
+
+        async def checkpoint_periodically():
+            while True:
+                await asyncio.sleep(self.CHECKPOINT_INTERVAL)
+                await asyncio.to_thread(checkpoint, written())
+
+        async def fetch_segment(start: int, end: int):
+            nonlocal downloaded
+            async with slots:
+                writer = RangeWriter(fd, start, hasher, self.write_buffer_size)
+                attempt = 0
+
+                # A dropped connection resumes the segment where its data ends
+                while writer.offset < end:
+                    headers = {'Range': f"bytes={writer.offset}-{end - 1}"}
+                    if partial.validator:
+                        # The server answers 200 instead of 206 if the file changed
+                        headers['If-Range'] = partial.validator
+
+                    try:
+                        async with http_client.request('GET', url, headers=headers) as response:
+                            if response.status != 206:
+                                partial.resumable = False
+                                raise Exception(f"Range request failed: HTTP {response.status}")
+
+                            async for chunk in response.content.iter_any():
+                                if await writer.write(chunk):
+                                    positions[start] = writer.offset
+                                downloaded += len(chunk)
+                                self._report_progress(url, downloaded, total_size)
+                            await writer.flush()
+                            positions[start] = writer.offset
+
+                            if writer.offset < end:
+                                raise aiohttp.ClientPayloadError(f"Segment {start}-{end - 1} ended early at {writer.offset}")
+                    except RETRYABLE_ERRORS as e:
+                        await writer.flush()
+                        positions[start] = writer.offset
+                        if attempt >= http_client.retries:
+                            raise
+                        print(f"Segment {start}-{end - 1} of {url} interrupted ({e or type(e).__name__}), "
+                              f"resuming at {writer.offset}")
+                        await asyncio.sleep(http_client.retry_delay(attempt))
+                        attempt += 1
+
+                # The hash frontier may now be able to move into later segments
+                await hasher.advance(written_until)
+
+        saver = None
+        try:
+            if os.fstat(fd).st_size != total_size:
+                # fallocate may fall back to writing zeros on some filesystems
+                await asyncio.to_thread(preallocate, fd, total_size)
+
+            saver = asyncio.create_task(checkpoint_periodically()) if partial.resumable else None
+            # Resumed bytes are already on disk; hash them before new data arrives
+            await hasher.advance(written_until)
+            tasks = [asyncio.create_task(fetch_segment(start, end)) for start, end in segments]
+            try:
+                await asyncio.gather(*tasks)
+                await hasher.advance(written_until)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        finally:
+            if saver is not None:
+                saver.cancel()
+            # The last sync of a multi-GB file runs off the event loop; shielded so that
+            # a second cancellation cannot leave fd closed under a checkpoint
+            await asyncio.shield(asyncio.to_thread(close, written() if partial.resumable else None))
+
+
+class RangeWriter:
+    """Buffers one contiguous byte range and writes it in large blocks off the event loop"""
+
+    # Stay under IOV_MAX for one pwritev call
+    MAX_IOV = 512
+
+    def __init__(self, fd: int, offset: int, hasher: 'FrontierHasher', buffer_size: int):
+        self.fd = fd
+        # First byte not yet on disk
+        self.offset = offset
+        self.hasher = hasher
+        self.buffer_size = buffer_size
+        self._chunks: List[bytes] = []
+        self._buffered = 0
+
+    async def write(self, chunk: bytes) -> bool:
+        """Queue chunk; returns True when the buffer was flushed to disk"""
+        self._chunks.append(chunk)
+        self._buffered += len(chunk)
+        if self._buffered < self.buffer_size and len(self._chunks) < self.MAX_IOV:
+            return False
+        await self.flush()
+        return True
+
+    async def flush(self):
+        if not self._chunks:
+            return
+        chunks, size = self._chunks, self._buffered
+        self._chunks, self._buffered = [], 0
+        await asyncio.to_thread(self._write_chunks, chunks, self.offset)
+        self.offset += size
+        DOWNLOAD_BYTES.inc(size)
+
+    def _write_chunks(self, chunks: List[bytes], offset: int):
+        position = offset
+        pending = [memoryview(chunk) for chunk in chunks]
+        while pending:
+            written = os.pwritev(self.fd, pending, position)
+            position += written
+            # Drop what a short write already covered
+            while pending and written >= len(pending[0]):
+                written -= len(pending[0])
+                pending.pop(0)
+            if pending and written:
+                pending[0] = pending[0][written:]
+
+        for chunk in chunks:
+            self.hasher.feed(offset, chunk)
+            offset += len(chunk)
+
+
+def preallocate(fd: int, size: int):
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.ftruncate(fd, size)
+
+
+class FrontierHasher:
+    """SHA-256 of a file whose byte ranges are written out of order.
+
+    Blocks that land exactly at the hashed frontier are hashed from memory
+    as they are written. When the frontier's segment ends, ``advance``
+    reads the bytes later segments already wrote (still in the page cache)
+    until it catches up with a live segment again. Safe to feed from
+    writer threads.
+    """
+
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.frontier = 0
+        self._sha256 = hashlib.sha256()
+        self._lock = threading.Lock()
+
+    def feed(self, offset: int, data: bytes):
+        with self._lock:
+            if offset == self.frontier:
+                self._sha256.update(data)
+                self.frontier += len(data)
+
+    async def advance(self, written_until: Callable[[int], int]):
+        """Hash bytes on disk from the frontier up to written_until(frontier)"""
+        while True:
+            end = written_until(self.frontier)
+            if end <= self.frontier:
+                return
+            await asyncio.to_thread(self._read_into_hash, end)
+
+    def _read_into_hash(self, end: int):
+        with open(self.path, 'rb') as f:
+            while True:
+                with self._lock:
+                    start = self.frontier
+                    if start >= end:
+                        return
+                    f.seek(start)
+                    block = f.read(min(self.READ_SIZE, end - start))
+                    if not block:
+                        raise Exception(f"{self.path.name} is shorter than expected")
+                    self._sha256.update(block)
+                    self.frontier += len(block)
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+
+class PartialDownload:
+    """A ``.part`` file plus a JSON sidecar recording what is already on disk.
+
+    The sidecar holds the image size, the server's ETag/Last-Modified and
+    the completed byte ranges as half-open [start, end) pairs. A download
+    resumes only if the server still reports the same size and validators.
+    """
+
+    def __init__(self, path: Path, url: str):
+        self.path = path
+        self.sidecar = path.with_name(path.name + '.json')
+        self.url = url
+        self.size = 0
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.completed: List[Tuple[int, int]] = []
+        self.resumable = False
+
+    @property
+    def validator(self) -> Optional[str]:
+        # Weak ETags are not allowed in If-Range
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+        return self.last_modified
+
+    def prepare(self, size: int, etag: Optional[str], last_modified: Optional[str]):
+        """Load matching resumable state, or start over for a new/changed image"""
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.completed = []
+
+        try:
+            with open(self.sidecar) as f:
+                state = json.load(f)
+            if (self.path.exists() and self.validator and state.get('url') == self.url
+                    and state.get('size') == size and state.get('etag') == etag
+                    and state.get('last_modified') == last_modified):
+                self.completed = merge_ranges(state.get('completed', []))
+            if self.completed:
+                print(f"Resuming {self.path.name}: {sum(e - s for s, e in self.completed)} of {size} bytes on disk")
+        except (OSError, ValueError):
+            pass
+
+        if not self.completed:
+            self.discard()
+        # Without a validator a resumed file could mix two versions
+        self.resumable = self.validator is not None
+
+    def missing(self) -> List[Tuple[int, int]]:
+        gaps = []
+        offset = 0
+        for start, end in self.completed:
+            if start > offset:
+                gaps.append((offset, start))
+            offset = max(offset, end)
+        if offset < self.size:
+            gaps.append((offset, self.size))
+        return gaps
+
+    def save(self, written: List[Tuple[int, int]]):
+        self.completed = merge_ranges(self.completed + written)
+        state = {
+            'url': self.url,
+            'size': self.size,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'completed': self.completed
+        }
+        tmp = self.sidecar.with_name(self.sidecar.name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.sidecar)
+
+    def discard(self):
+        for path in (self.path, self.sidecar):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def merge_ranges(ranges) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted((int(s), int(e)) for s, e in ranges if e > s):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+download_manager = DownloadManager(
+    Path(get_settings().DOWNLOAD_DIR),
+    connections=get_settings().DOWNLOAD_CONNECTIONS,
+    min_segment_size=get_settings().DOWNLOAD_MIN_SEGMENT_SIZE,
+    write_buffer_size=get_settings().DOWNLOAD_WRITE_BUFFER_SIZE,
+    cache=image_cache,
+    freshness_ttl=get_settings().OS_FRESHNESS_TTL,
+    progress=StatusStore(
+        'download',
+        history=job_history,
+        transitions=get_settings().STATUS_TRANSITIONS,
+        ttl=get_settings().STATUS_TTL,
+        max_records=get_settings().STATUS_MAX_RECORDS
+    )
+)
+DOWNLOADS_ACTIVE.set_function(lambda: len(download_manager._inflight))
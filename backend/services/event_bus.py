@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from backend.config.settings import get_settings
+from backend.utils.metrics import EVENT_SUBSCRIBERS
+
+
+class Subscription:
+    """Latest-value mailbox for one client.
+
+    Only the newest payload per (topic, key) is kept, so a client that
+    falls behind gets the current state instead of a growing backlog.
+    Batches are released at most ``max_rate_hz`` times per second.
+    """
+
+    def __init__(self, topics: Optional[Set[str]], max_rate_hz: float):
+        self.topics = topics
+        self.min_interval = 1.0 / max_rate_hz if max_rate_hz > 0 else 0.0
+        self._pending: Dict[Tuple[str, str], Any] = {}
+        self._ready = asyncio.Event()
+        self._last_sent = 0.0
+
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic in self.topics
+
+    def offer(self, topic: str, key: str, data: Any):
+        # Re-insert so the newest change is delivered last
+        self._pending.pop((topic, key), None)
+        self._pending[(topic, key)] = data
+        self._ready.set()
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        """Wait for changes and return them coalesced, honouring the rate limit"""
+        await self._ready.wait()
+
+        delay = self._last_sent + self.min_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        pending, self._pending = self._pending, {}
+        self._ready.clear()
+        self._last_sent = time.monotonic()
+        # Status records are published as objects and serialised only when sent
+        return [
+            {'topic': topic, 'key': key, 'data': data.to_dict() if hasattr(data, 'to_dict') else data}
+            for (topic, key), data in pending.items()
+        ]
+
+
+class EventBus:
+    """In-process pub/sub for flash, download and device inventory updates.
+
+    The latest payload per (topic, key) is retained so new subscribers
+    start from the current state.
+    """
+
+    def __init__(self, max_rate_hz: float):
+        self.max_rate_hz = max_rate_hz
+        self.latest: Dict[Tuple[str, str], Any] = {}
+        self._subscribers: Set[Subscription] = set()
+
+    def publish(self, topic: str, key: str, data: Any):
+        self.latest[(topic, key)] = data
+        for subscription in self._subscribers:
+            if subscription.wants(topic):
+                subscription.offer(topic, key, data)
+
+    def forget(self, topic: str, key: str):
+        self.latest.pop((topic, key), None)
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> Subscription:
+        subscription = Subscription(set(topics) if topics else None, self.max_rate_hz)
+        for (topic, key), data in self.latest.items():
+            if subscription.wants(topic):
+                subscription.offer(topic, key, data)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+event_bus = EventBus(max_rate_hz=get_settings().EVENTS_MAX_RATE_HZ)
+EVENT_SUBSCRIBERS.set_function(event_bus.subscriber_count)
@@ -0,0 +1,323 @@
+import asyncio
+import itertools
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+from backend.config.settings import get_settings
+from backend.services.flash_service import flash_service
+from backend.services.image_inspector import image_inspector
+from backend.services.job_journal import JobJournal, flash_journal
+from backend.utils.adb_manager import ADBManager
+from backend.utils.metrics import FLASH_JOB_SECONDS, FLASH_JOBS_RUNNING, FLASH_QUEUE_DEPTH
+
+
+class JobConflictError(Exception):
+    """The serial already has a queued or running job"""
+
+
+class FlashJob:
+    def __init__(self, serial: str, os_url: str, skip_download: bool,
+                 bus: Optional[str], priority: int, seq: int, resume_from: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.serial = serial
+        self.os_url = os_url
+        self.skip_download = skip_download
+        # Set for jobs picked up from the journal after a restart
+        self.resume_from = resume_from
+        self.bus = bus
+        self.priority = priority
+        self.seq = seq
+        self.state = 'queued'
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def kind(self) -> str:
+        # Download-only jobs do not use the USB bus
+        return 'flash' if self.skip_download else 'download'
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'serial': self.serial,
+            'bus': self.bus,
+            'kind': self.kind,
+            'priority': self.priority,
+            'state': self.state,
+            'resume_from': self.resume_from,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result
+        }
+
+
+class FlashScheduler:
+    """Queue of flash jobs with per-serial exclusivity and concurrency limits.
+
+    At most ``max_concurrent`` jobs run at once and at most ``max_per_bus``
+    flash jobs per USB bus (root hub), so sideloads do not fight over the
+    same controller. Queued jobs start by priority (higher first), then in
+    submission order.
+    """
+
+    # ADB states in which a journaled device counts as present after a restart
+    PRESENT_STATES = ('device', 'recovery', 'sideload', 'rescue', 'bootloader', 'unauthorized')
+
+    def __init__(self, runner: Callable[[FlashJob], Awaitable[Dict]],
+                 max_concurrent: int, max_per_bus: int, history: int = 200,
+                 journal: Optional[JobJournal] = None, recovery_wait: float = 60.0):
+        self.runner = runner
+        self.journal = journal or JobJournal(None)
+        self.recovery_wait = recovery_wait
+        self._recovery: Optional[asyncio.Task] = None
+        self.max_concurrent = max_concurrent
+        self.max_per_bus = max_per_bus
+        self.history = history
+        self.jobs: Dict[str, FlashJob] = OrderedDict()
+        self._queue: List[FlashJob] = []
+        self._by_serial: Dict[str, FlashJob] = {}
+        self._running = 0
+        self._running_per_bus: Dict[str, int] = {}
+        self._seq = itertools.count()
+
+    def submit(self, serial: str, os_url: str, skip_download: bool,
+               bus: Optional[str] = None, priority: int = 0, resume_from: Optional[str] = None) -> FlashJob:
+        if serial in self._by_serial:
+            raise JobConflictError(f"Device {serial} already has a {self._by_serial[serial].state} job")
+
+        job = FlashJob(serial, os_url, skip_download, bus, priority, next(self._seq), resume_from)
+        self.journal.queued(serial, job.id, os_url, skip_download, bus, priority, resume_from)
+        self.jobs[job.id] = job
+        self._by_serial[serial] = job
+        self._queue.append(job)
+        self._prune()
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[FlashJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict]:
+        queued = sorted(self._queue, key=self._order)
+        others = [job for job in self.jobs.values() if job.state != 'queued']
+        return [job.to_dict() for job in queued + others]
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def cancel(self, job_id: str) -> Optional[FlashJob]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        if job.state == 'queued':
+            self._queue.remove(job)
+            self._finish(job, 'cancelled')
+            self._dispatch()
+        elif job.state == 'running' and job.task is not None:
+            job.task.cancel()
+        return job
+
+    def set_priority(self, job_id: str, priority: int) -> Optional[FlashJob]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.priority = priority
+        self._dispatch()
+        return job
+
+    @staticmethod
+    def _order(job: FlashJob):
+        return (-job.priority, job.seq)
+
+    def _can_start(self, job: FlashJob) -> bool:
+        if job.kind != 'flash' or job.bus is None:
+            return True
+        return self._running_per_bus.get(job.bus, 0) < self.max_per_bus
+
+    def _dispatch(self):
+        for job in sorted(self._queue, key=self._order):
+            if self._running >= self.max_concurrent:
+                return
+            if not self._can_start(job):
+                continue
+
+            self._queue.remove(job)
+            job.state = 'running'
+            job.started_at = time.time()
+            self._running += 1
+            if job.kind == 'flash' and job.bus is not None:
+                self._running_per_bus[job.bus] = self._running_per_bus.get(job.bus, 0) + 1
+            job.task = asyncio.create_task(self._run(job))
+            # Also runs for a task cancelled before its first step, which never enters _run
+            job.task.add_done_callback(lambda task, job=job: self._done(job, task))
+
+    async def _run(self, job: FlashJob) -> str:
+        try:
+            job.result = await self.runner(job)
+        except Exception as e:
+            job.result = {'success': False, 'message': str(e)}
+        return 'completed' if job.result and job.result.get('success') else 'failed'
+
+    def _done(self, job: FlashJob, task: asyncio.Task):
+        if task.cancelled():
+            state = 'cancelled'
+        elif task.exception() is not None:
+            state = 'failed'
+        else:
+            state = task.result()
+        self._running -= 1
+        if job.kind == 'flash' and job.bus is not None:
+            self._running_per_bus[job.bus] -= 1
+        self._finish(job, state)
+        self._dispatch()
+
+    def _finish(self, job: FlashJob, state: str):
+        job.state = state
+        job.finished_at = time.time()
+        job.task = None
+        if job.started_at is not None:
+            FLASH_JOB_SECONDS.labels(job.kind, state).observe(job.finished_at - job.started_at)
+        self.journal.finish(job.serial, job.id, state, (job.result or {}).get('message'))
+        if self._by_serial.get(job.serial) is job:
+            del self._by_serial[job.serial]
+
+    async def start_recovery(self):
+        """Load the journal, then reconcile its unfinished jobs with live ADB state in the background.
+
+        Awaited before the app serves requests: load() replaces the
+        journal's view of active jobs, which would drop a job submitted
+        while it ran.
+        """
+        if self._recovery is None:
+            pending = await asyncio.to_thread(self.journal.load)
+            self._recovery = asyncio.create_task(self._recover(pending))
+
+    async def stop(self):
+        # Jobs cancelled by the shutdown must stay resumable
+        self.journal.close()
+        if self._recovery is not None:
+            self._recovery.cancel()
+            try:
+                await self._recovery
+            except asyncio.CancelledError:
+                pass
+            self._recovery = None
+
+    async def _recover(self, pending: Dict[str, Dict]):
+        if not pending:
+            return
+        print(f"Recovering {len(pending)} unfinished flash job(s) from the journal")
+        await asyncio.gather(*(self._recover_job(entry) for entry in pending.values()), return_exceptions=True)
+
+    async def _device_state(self, serial: str) -> Optional[str]:
+        try:
+            return await ADBManager.wait_for_state(serial, self.PRESENT_STATES, self.recovery_wait)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _recover_job(self, entry: Dict):
+        """Resume, restart or fail one journaled job without repeating finished stages"""
+        serial = entry['serial']
+        stage = entry.get('stage')
+        skip_download = entry.get('skip_download', True)
+        resubmit = dict(os_url=entry['os_url'], skip_download=skip_download,
+                        bus=entry.get('bus'), priority=entry.get('priority', 0))
+
+        try:
+            if self._superseded(serial):
+                return
+            if not skip_download:
+                if stage == 'downloaded':
+                    # Nothing left but the operator's confirmation
+                    flash_service.restore_status(serial, {
+                        'status': 'awaiting_confirmation',
+                        'progress': 0,
+                        'message': 'Download complete. Awaiting confirmation...'
+                    })
+                    self.journal.finish(serial, entry.get('job_id'), 'completed')
+                else:
+                    # The download resumes from its .part file
+                    self.submit(serial, **resubmit)
+                return
+
+            state = await self._device_state(serial)
+            if self._superseded(serial):
+                return
+            print(f"Journaled flash of {serial} was at {stage}; device is {state or 'absent'}")
+
+            if stage in ('queued', 'flashing_started') and state == 'device':
+                self.submit(serial, **resubmit)
+            elif stage in ('queued', 'flashing_started', 'rebooting_recovery', 'sideloading') \
+                    and state in ('recovery', 'sideload'):
+                # Already in recovery: skip the reboot, wait for (or use) sideload mode
+                self.submit(serial, resume_from='sideload', **resubmit)
+            elif stage == 'rebooting_recovery' and state == 'device':
+                self.submit(serial, **resubmit)
+            elif stage == 'rebooting_system':
+                self._fail_or_complete(serial, entry, 'completed', 'Flash completed (confirmed after restart)')
+            elif stage == 'sideloading' and state == 'device':
+                # Either the install finished and the device booted it, or recovery gave up
+                if await self._runs_image(serial, entry['os_url']):
+                    self._fail_or_complete(serial, entry, 'completed', 'Flash completed (confirmed after restart)')
+                else:
+                    self._fail_or_complete(serial, entry, 'failed',
+                                           'Sideload was interrupted by a restart and the device booted its old build')
+            else:
+                self._fail_or_complete(serial, entry, 'failed',
+                                       f"Interrupted by a restart during {stage}; device is {state or 'not connected'}")
+        except Exception as e:
+            print(f"Could not recover journaled job for {serial}: {e}")
+            self._fail_or_complete(serial, entry, 'failed', f"Could not resume after restart: {e}")
+
+    def _superseded(self, serial: str) -> bool:
+        """An operator submitted a new job for serial while its journaled one was being reconciled"""
+        if serial not in self._by_serial:
+            return False
+        # The new job's queued entry already replaced the journaled one
+        print(f"Skipping recovery of journaled job for {serial}: a new job was submitted")
+        return True
+
+    async def _runs_image(self, serial: str, os_url: str) -> bool:
+        inspection = await image_inspector.inspect(flash_service.get_os_filename(os_url))
+        expected = (inspection or {}).get('post_build')
+        if not expected:
+            return False
+        return await ADBManager.get_prop(serial, 'ro.build.fingerprint') == expected
+
+    def _fail_or_complete(self, serial: str, entry: Dict, state: str, message: str):
+        if self._superseded(serial):
+            return
+        flash_service.restore_status(serial, {
+            'status': 'completed' if state == 'completed' else 'error',
+            'progress': 100 if state == 'completed' else 0,
+            'message': message if state == 'completed' else f'Flash failed: {message}'
+        })
+        self.journal.finish(serial, entry.get('job_id'), state, message)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+
+async def _run_flash_job(job: FlashJob) -> Dict:
+    return await flash_service.flash_device_complete(
+        job.serial, job.os_url, skip_download=job.skip_download, resume_from=job.resume_from
+    )
+
+
+flash_scheduler = FlashScheduler(
+    _run_flash_job,
+    max_concurrent=get_settings().FLASH_MAX_CONCURRENT,
+    max_per_bus=get_settings().FLASH_MAX_PER_BUS,
+    journal=flash_journal,
+    recovery_wait=get_settings().FLASH_RECOVERY_WAIT
+)
+FLASH_QUEUE_DEPTH.set_function(flash_scheduler.queue_depth)
+FLASH_JOBS_RUNNING.set_function(lambda: flash_scheduler._running)
@@ -1,200 +1,335 @@
-import os
-import aiohttp
 import asyncio
-import hashlib
+import re
+import time
 import traceback
+from collections import deque
 from pathlib import Path
 from typing import Dict, Optional, Tuple
+from backend.config.settings import get_settings
+from backend.utils.adb_client import AdbError
+from backend.utils.adb_manager import ADBManager
+from backend.utils.metrics import FLASH_STAGE_SECONDS, SIDELOAD_SESSIONS_ACTIVE
+from backend.utils.sideload_host import SideloadMetrics, SideloadServer
+from backend.utils.tracing import tracer
+from backend.services.readiness import readiness_stats
+from backend.services.download_manager import download_manager
+from backend.services.image_cache import image_cache
+from backend.services.image_inspector import image_inspector
+from backend.services.job_journal import flash_journal
+from backend.services.status_store import StatusRecord, StatusStore, job_history
 
 class FlashService:
+    SIDELOAD_PROGRESS_RE = re.compile(rb'\(~?(\d+)%\)')
+    SIDELOAD_TAIL_LINES = 20
+    SIDELOAD_MAX_LINE = 4096
+    SIDELOAD_METRICS_INTERVAL = 1.0
+    # Recovery checks pre-device against these, in this order
+    DEVICE_CODENAME_PROPS = ('ro.product.device', 'ro.build.product')
+
     def __init__(self):
-        self.download_dir = Path("/tmp/lineage_downloads")
-        self.download_dir.mkdir(exist_ok=True)
-        self.flash_status = {}
+        self.download_dir = download_manager.download_dir
+        self.flash_status = StatusStore(
+            'flash',
+            history=job_history,
+            transitions=get_settings().STATUS_TRANSITIONS,
+            ttl=get_settings().STATUS_TTL,
+            max_records=get_settings().STATUS_MAX_RECORDS
+        )
         self.os_cache = {}
+        self.device_models = {}
+        # Native sideload: one shared mapping per image for all devices
+        self.sideload_server = SideloadServer(ADBManager.client, get_settings().SIDELOAD_READAHEAD)
 
     def get_os_filename(self, os_url: str) -> str:
         """Get consistent filename for OS image"""
-        url_hash = hashlib.md5(os_url.encode()).hexdigest()[:8]
-        filename = os_url.split('/')[-1]
-
-        # Keep original extension if it's a supported format
-        if not filename.endswith(('.zip', '.img')):
-            # Default to .zip for LineageOS (most common format)
-            filename = f"lineage_{url_hash}.zip"
-
-        return filename
+        return download_manager.get_filename(os_url)
 
     def check_os_cached(self, os_url: str) -> Tuple[bool, Optional[str]]:
         """Check if OS image is already downloaded"""
-        filename = self.get_os_filename(os_url)
-        file_path = self.download_dir / filename
-
-        if file_path.exists() and file_path.stat().st_size > 0:
-            return True, str(file_path)
-        return False, None
+        return download_manager.check_cached(os_url)
 
+    @tracer.traced()
     async def download_os_image(self, os_url: str, device_id: str) -> Optional[str]:
         """Download OS image and return local file path"""
         try:
-            filename = self.get_os_filename(os_url)
-            file_path = self.download_dir / filename
-
             is_cached, cached_path = self.check_os_cached(os_url)
             if is_cached:
-                self.flash_status[device_id] = {
+                self._set_status(device_id, {
                     'status': 'cached',
                     'progress': 100,
                     'message': 'OS image already available',
                     'download_progress': 100,
-                    'download_size': file_path.stat().st_size
-                }
+                    'download_size': Path(cached_path).stat().st_size
+                })
                 return cached_path
 
-            self.flash_status[device_id] = {
+            self._set_status(device_id, {
                 'status': 'downloading',
                 'progress': 0,
                 'message': 'Downloading OS image...',
                 'download_progress': 0,
                 'download_size': 0
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(os_url) as response:
-                    if response.status != 200:
-                        raise Exception(f"Failed to download: HTTP {response.status}")
-
-                    total_size = int(response.headers.get('content-length', 0))
-                    downloaded = 0
-
-                    with open(file_path, 'wb') as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            f.write(chunk)
-                            downloaded += len(chunk)
-
-                            if total_size > 0:
-                                download_progress = int((downloaded / total_size) * 100)
-                                self.flash_status[device_id].update({
-                                    'download_progress': download_progress,
-                                    'download_size': downloaded,
-                                    'total_size': total_size
-                                })
-
-            self.flash_status[device_id]['status'] = 'download_complete'
-            self.flash_status[device_id]['message'] = 'Download completed'
-            return str(file_path)
+            })
+
+            def on_progress(progress: StatusRecord):
+                if progress.get('total'):
+                    self._update_status(device_id, {
+                        'download_progress': progress.get('progress', 0),
+                        'download_size': progress.get('downloaded', 0),
+                        'total_size': progress.get('total')
+                    })
+
+            # Devices asking for the same URL share one transfer
+            image_path = await download_manager.fetch(os_url, on_progress)
+
+            self._update_status(device_id, {
+                'status': 'download_complete',
+                'message': 'Download completed'
+            })
+            return image_path
         except Exception as e:
             error_detail = str(e)
-            error_trace = traceback.format_exc()
             print(f"Download error for {device_id}: {error_detail}")
-            print(f"Traceback: {error_trace}")
-            self.flash_status[device_id] = {
+            print(f"Traceback: {traceback.format_exc()}")
+            self._set_status(device_id, {
                 'status': 'error',
                 'progress': 0,
                 'message': f'Download failed: {error_detail}',
                 'error_detail': error_detail,
-                'error_trace': error_trace
-            }
+                'error_type': type(e).__name__
+            })
             raise
 
+    @tracer.traced()
+    async def wait_until_ready(self, device_id: str, transition: str, states) -> Optional[str]:
+        """Wait for an ADB state with a per-model adaptive timeout, recording the wait"""
+        model = self.device_models.get(device_id) or ADBManager.get_model(device_id)
+        timeout = readiness_stats.timeout_for(model, transition)
+        tracer.annotate(transition=transition, model=model, timeout=timeout)
+        started = time.monotonic()
+
+        try:
+            state = await ADBManager.wait_for_state(device_id, states, timeout)
+        except asyncio.TimeoutError:
+            # A wait that ran out took at least this long; without it the timeout could only shrink
+            readiness_stats.record(model, transition, timeout)
+            raise
+
+        waited = time.monotonic() - started
+        readiness_stats.record(model, transition, waited)
+        tracer.annotate(state=state)
+        print(f"Device {device_id} ({model}) reached {state} after {waited:.1f}s")
+        return state
+
+    @tracer.traced()
     async def reboot_to_recovery(self, device_id: str) -> bool:
         """Reboot device to recovery mode"""
         try:
-            self.flash_status[device_id] = {
+            self._set_status(device_id, {
                 'status': 'rebooting',
                 'progress': 30,
                 'message': 'Rebooting to recovery mode...'
-            }
-
-            result = await asyncio.create_subprocess_exec(
-                'adb', '-s', device_id, 'reboot', 'recovery',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await result.communicate()
+            })
 
-            stderr_text = stderr.decode()
-            # ADB daemon startup messages are not errors
-            if result.returncode != 0 and not ('daemon started successfully' in stderr_text or 'daemon not running' in stderr_text):
-                raise Exception(f"Failed to reboot: {stderr_text}")
+            await ADBManager.reboot(device_id, 'recovery')
 
-            # Wait longer for recovery to fully boot
-            await asyncio.sleep(20)
+            # Wait for recovery to come up rather than a fixed delay
+            self._update_status(device_id, {'message': 'Waiting for recovery mode...'})
+            await self.wait_until_ready(device_id, 'recovery', ['recovery', 'sideload'])
             return True
         except Exception as e:
             error_detail = str(e)
-            error_trace = traceback.format_exc()
             print(f"Reboot error for {device_id}: {error_detail}")
-            print(f"Traceback: {error_trace}")
-            self.flash_status[device_id] = {
+            print(f"Traceback: {traceback.format_exc()}")
+            self._set_status(device_id, {
                 'status': 'error',
                 'progress': 30,
                 'message': f'Reboot failed: {error_detail}',
                 'error_detail': error_detail,
-                'error_trace': error_trace
-            }
+                'error_type': type(e).__name__
+            })
             raise
 
+    @tracer.traced()
     async def sideload_via_recovery(self, device_id: str, image_path: str) -> bool:
         """Sideload image via ADB in recovery mode"""
         try:
-            self.flash_status[device_id] = {
+            self._set_status(device_id, {
                 'status': 'preparing_sideload',
                 'progress': 50,
-                'message': 'Preparing to sideload OS image...'
-            }
+                'message': "Waiting for sideload mode (select 'Apply update' > 'Apply from ADB' in recovery)..."
+            })
 
-            # Wait for device to be in sideload mode
-            await asyncio.sleep(5)
+            with FLASH_STAGE_SECONDS.labels('wait_sideload').time():
+                await self.wait_until_ready(device_id, 'sideload', ['sideload'])
 
-            self.flash_status[device_id] = {
+            await flash_journal.stage(device_id, 'sideloading')
+            self._set_status(device_id, {
                 'status': 'sideloading',
                 'progress': 60,
                 'message': 'Sideloading OS image (this may take several minutes)...'
-            }
+            })
 
-            # Use adb sideload to flash the image
-            result = await asyncio.create_subprocess_exec(
-                'adb', 'sideload', image_path,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await result.communicate()
-
-            stdout_text = stdout.decode()
-            stderr_text = stderr.decode()
-
-            print(f"Sideload stdout: {stdout_text}")
-            print(f"Sideload stderr: {stderr_text}")
-
-            # Sideload returns 1 even on success sometimes, check output
-            if 'failed' in stderr_text.lower() or 'error' in stderr_text.lower():
-                if 'closed' not in stderr_text.lower():  # "closed" is normal after successful sideload
-                    raise Exception(f"Sideload failed: {stderr_text}")
+            with FLASH_STAGE_SECONDS.labels('sideload').time():
+                if self.use_native_sideload():
+                    await self._sideload_native(device_id, image_path)
+                else:
+                    await self._sideload_cli(device_id, image_path)
 
-            self.flash_status[device_id] = {
+            await flash_journal.stage(device_id, 'rebooting_system')
+            self._set_status(device_id, {
                 'status': 'rebooting',
                 'progress': 90,
                 'message': 'Installation complete. Rebooting device...'
-            }
+            })
 
-            await asyncio.sleep(10)
+            # Recovery leaves sideload mode once the package is installed
+            try:
+                with FLASH_STAGE_SECONDS.labels('reboot_system').time():
+                    await self.wait_until_ready(device_id, 'reboot', ['recovery', 'device', None])
+            except asyncio.TimeoutError:
+                print(f"Device {device_id} still in sideload mode after install")
 
             return True
         except Exception as e:
             error_detail = str(e)
-            error_trace = traceback.format_exc()
             print(f"Sideload error for {device_id}: {error_detail}")
-            print(f"Traceback: {error_trace}")
-            self.flash_status[device_id] = {
+            print(f"Traceback: {traceback.format_exc()}")
+            self._set_status(device_id, {
                 'status': 'error',
                 'progress': 70,
                 'message': f'Sideload failed: {error_detail}',
                 'error_detail': error_detail,
-                'error_trace': error_trace
-            }
+                'error_type': type(e).__name__
+            })
             raise
 
+    def use_native_sideload(self) -> bool:
+        return get_settings().SIDELOAD_BACKEND == 'native'
+
+    async def _sideload_native(self, device_id: str, image_path: str):
+        """Serve the image to recovery ourselves from the shared mapping"""
+        image_size = Path(image_path).stat().st_size
+        on_percent = self._sideload_progress_updater(device_id, image_size)
+        last_published = {'at': 0.0}
+
+        def on_block(metrics: SideloadMetrics):
+            # Recovery reads parts of the zip more than once; count coverage, not bytes
+            on_percent(int(metrics.coverage * 100))
+            now = time.monotonic()
+            if now - last_published['at'] >= self.SIDELOAD_METRICS_INTERVAL:
+                last_published['at'] = now
+                self._update_status(device_id, {'sideload_metrics': metrics.to_dict()})
+
+        try:
+            with ADBManager.timed('sideload', 'native'):
+                metrics = await self.sideload_server.sideload(device_id, image_path, on_block)
+            self._update_status(device_id, {'sideload_metrics': metrics.to_dict()})
+        except (AdbError, OSError, asyncio.TimeoutError) as e:
+            metrics = self.sideload_server.get_metrics(device_id)
+            self._update_status(device_id, {'sideload_metrics': metrics})
+            # Recovery already installing from us must not be sent the image again
+            if metrics and metrics['blocks_served']:
+                raise Exception(f"Sideload failed: {e or type(e).__name__}")
+            # Nothing sent yet: no ADB server, recovery without sideload-host support, or a refusal
+            print(f"Native sideload unavailable for {device_id} ({e or type(e).__name__}), falling back to adb CLI")
+            await self._sideload_cli(device_id, image_path)
+
+    def get_sideload_metrics(self, serial: Optional[str] = None):
+        """Block-level metrics of native sideloads, for one device or all"""
+        if serial is None:
+            return self.sideload_server.list_metrics()
+        return self.sideload_server.get_metrics(serial)
+
+    async def _sideload_cli(self, device_id: str, image_path: str):
+        # Target the serial so several devices can sideload at once;
+        # each adb process only ever talks to its own device
+        with ADBManager.timed('sideload', 'cli'):
+            result = await asyncio.create_subprocess_exec(
+                'adb', '-s', device_id, 'sideload', image_path,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+
+            # Only the last few lines of output are kept, however long the transfer
+            stdout_tail = deque(maxlen=self.SIDELOAD_TAIL_LINES)
+            stderr_tail = deque(maxlen=self.SIDELOAD_TAIL_LINES)
+            on_percent = self._sideload_progress_updater(device_id, Path(image_path).stat().st_size)
+            try:
+                await asyncio.gather(
+                    self._read_sideload_output(result.stdout, stdout_tail, on_percent),
+                    self._read_sideload_output(result.stderr, stderr_tail, on_percent)
+                )
+                await result.wait()
+            finally:
+                if result.returncode is None:
+                    result.kill()
+                    await result.wait()
+
+        stdout_text = '\n'.join(stdout_tail)
+        stderr_text = '\n'.join(stderr_tail)
+
+        print(f"Sideload stdout ({device_id}): {stdout_text}")
+        print(f"Sideload stderr ({device_id}): {stderr_text}")
+
+        # Sideload returns 1 even on success sometimes, check output
+        if 'failed' in stderr_text.lower() or 'error' in stderr_text.lower():
+            if 'closed' not in stderr_text.lower():  # "closed" is normal after successful sideload
+                raise Exception(f"Sideload failed: {stderr_text}")
+
+    async def _read_sideload_output(self, stream: asyncio.StreamReader, tail: deque, on_percent):
+        """Consume adb output as it arrives, reporting '(~NN%)' progress"""
+        pending = b''
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+
+            # adb redraws its progress line with '\r'
+            *lines, pending = re.split(rb'[\r\n]', pending + chunk)
+            pending = pending[-self.SIDELOAD_MAX_LINE:]
+            for line in lines:
+                line = line.strip()
+                # Progress redraws are not kept, so the tail holds real messages
+                if line and not self._report_sideload_percent(line, on_percent):
+                    tail.append(line[:self.SIDELOAD_MAX_LINE].decode(errors='replace'))
+            self._report_sideload_percent(pending, on_percent)
+
+        if pending.strip():
+            tail.append(pending.strip().decode(errors='replace'))
+
+    def _report_sideload_percent(self, line: bytes, on_percent) -> bool:
+        match = self.SIDELOAD_PROGRESS_RE.search(line)
+        if match:
+            on_percent(min(int(match.group(1)), 100))
+        return match is not None
+
+    def _sideload_progress_updater(self, device_id: str, image_size: int):
+        """Return a callback writing sideload percent, rate and ETA into the flash status"""
+        started = time.monotonic()
+        last = {'percent': -1}
+
+        def on_percent(percent: int):
+            if percent == last['percent']:
+                return
+            last['percent'] = percent
+
+            elapsed = time.monotonic() - started
+            bytes_sent = image_size * percent // 100
+            rate = bytes_sent / elapsed if elapsed > 0 else 0
+            eta = (image_size - bytes_sent) / rate if rate > 0 else None
+            self._update_status(device_id, {
+                'progress': 60 + percent * 30 // 100,
+                'sideload_progress': percent,
+                'bytes_sent': bytes_sent,
+                'total_size': image_size,
+                'bytes_per_sec': int(rate),
+                'eta_seconds': int(eta) if eta is not None else None
+            })
+
+        return on_percent
+
     async def prepare_os_download(self, device_id: str, os_url: str) -> Dict[str, any]:
         """Prepare OS download and check if cached"""
         try:
@@ -202,46 +337,63 @@ class FlashService:
 
             if is_cached:
                 file_size = Path(cached_path).stat().st_size
-                self.flash_status[device_id] = {
+                self._set_status(device_id, {
                     'status': 'awaiting_confirmation',
                     'progress': 0,
                     'message': 'OS image ready. Awaiting flash confirmation...',
                     'os_cached': True,
                     'os_size': file_size,
                     'os_path': cached_path
-                }
+                })
                 return {
                     'cached': True,
                     'path': cached_path,
                     'size': file_size
                 }
             else:
-                self.flash_status[device_id] = {
+                self._set_status(device_id, {
                     'status': 'awaiting_download',
                     'progress': 0,
                     'message': 'Ready to download OS image...',
                     'os_cached': False
-                }
+                })
                 return {
                     'cached': False
                 }
         except Exception as e:
             raise
 
-    async def flash_device_complete(self, device_id: str, os_url: str, skip_download: bool = False) -> Dict[str, str]:
-        """Complete flash process"""
+    async def flash_device_complete(self, device_id: str, os_url: str, skip_download: bool = False,
+                                    resume_from: Optional[str] = None) -> Dict[str, str]:
+        """Complete flash process; resume_from='sideload' skips the reboot into recovery"""
+        # The confirm run keeps the prepare run's trace; both are served at /api/devices/{serial}/flash/trace
+        phase = 'flash' if skip_download else 'download'
+        with tracer.trace(f"{device_id}/{phase}", 'flash_device_complete', os_url=os_url,
+                          skip_download=skip_download, resume_from=resume_from):
+            return await self._flash_device_complete(device_id, os_url, skip_download, resume_from)
+
+    async def _flash_device_complete(self, device_id: str, os_url: str, skip_download: bool,
+                                     resume_from: Optional[str]) -> Dict[str, str]:
+        # Keep the image out of cache eviction while this device uses it
+        image_filename = self.get_os_filename(os_url)
+        image_cache.pin(image_filename)
         try:
             if not skip_download:
-                self.flash_status[device_id] = {
+                self._start_status(device_id, {
                     'status': 'starting',
                     'progress': 0,
                     'message': 'Initializing flash process...'
-                }
+                })
 
-                image_path = await self.download_os_image(os_url, device_id)
+                await flash_journal.stage(device_id, 'downloading')
+                with FLASH_STAGE_SECONDS.labels('download').time():
+                    image_path = await self.download_os_image(os_url, device_id)
 
-                self.flash_status[device_id]['status'] = 'awaiting_confirmation'
-                self.flash_status[device_id]['message'] = 'Download complete. Awaiting confirmation...'
+                await flash_journal.stage(device_id, 'downloaded')
+                self._update_status(device_id, {
+                    'status': 'awaiting_confirmation',
+                    'message': 'Download complete. Awaiting confirmation...'
+                })
 
                 return {
                     'success': True,
@@ -252,52 +404,116 @@ class FlashService:
                 if not is_cached:
                     raise Exception("OS image not found in cache")
 
-            self.flash_status[device_id] = {
+            model = ADBManager.get_model(device_id)
+            if model:
+                self.device_models[device_id] = model
+
+            self._start_status(device_id, {
                 'status': 'flashing_started',
                 'progress': 30,
-                'message': 'Starting flash process...'
-            }
+                'message': 'Resuming flash after restart...' if resume_from else 'Starting flash process...',
+                'model': model or self.device_models.get(device_id)
+            })
+
+            if resume_from != 'sideload':
+                # Refuse a wrong image now rather than after a reboot and a partial transfer
+                await flash_journal.stage(device_id, 'flashing_started')
+                with FLASH_STAGE_SECONDS.labels('image_check').time():
+                    await self.check_image_matches_device(device_id, image_filename)
 
-            # Reboot to recovery mode for sideloading
-            await self.reboot_to_recovery(device_id)
+                # Reboot to recovery mode for sideloading
+                await flash_journal.stage(device_id, 'rebooting_recovery')
+                with FLASH_STAGE_SECONDS.labels('reboot_recovery').time():
+                    await self.reboot_to_recovery(device_id)
 
             # Sideload the image file
             await self.sideload_via_recovery(device_id, image_path)
 
-            self.flash_status[device_id] = {
+            self._set_status(device_id, {
                 'status': 'completed',
                 'progress': 100,
                 'message': 'Flash completed successfully'
-            }
+            })
 
             return {
                 'success': True,
                 'message': 'Flash completed successfully'
             }
+        except asyncio.CancelledError:
+            self._set_status(device_id, {
+                'status': 'cancelled',
+                'progress': 0,
+                'message': 'Flash cancelled'
+            })
+            raise
         except Exception as e:
             error_detail = str(e)
-            error_trace = traceback.format_exc()
             print(f"Complete flash error for {device_id}: {error_detail}")
-            print(f"Traceback: {error_trace}")
-            self.flash_status[device_id] = {
+            print(f"Traceback: {traceback.format_exc()}")
+            tracer.set_error(error_detail)
+            self._set_status(device_id, {
                 'status': 'error',
                 'progress': 0,
                 'message': f'Flash failed: {error_detail}',
                 'error_detail': error_detail,
-                'error_trace': error_trace
-            }
+                'error_type': type(e).__name__
+            })
             return {
                 'success': False,
                 'message': error_detail
             }
+        finally:
+            image_cache.unpin(image_filename)
+
+    @tracer.traced()
+    async def check_image_matches_device(self, device_id: str, image_filename: str):
+        """Raise if the image's pre-device list does not include this device"""
+        inspection = await image_inspector.inspect(image_filename)
+        if not inspection or not inspection['devices']:
+            return
+
+        names = await asyncio.gather(*(ADBManager.get_prop(device_id, prop) for prop in self.DEVICE_CODENAME_PROPS))
+        codenames = [name for name in names if name]
+        if not codenames:
+            print(f"Could not read the codename of {device_id}, skipping the image device check")
+            return
+
+        mismatch = await image_inspector.check_device(image_filename, codenames)
+        if mismatch:
+            raise Exception(mismatch)
+
+    def _start_status(self, device_id: str, status: Dict):
+        self.flash_status.start(device_id, status)
+
+    def restore_status(self, device_id: str, status: Dict):
+        """Status for a job reconciled from the journal after a restart"""
+        self.flash_status.start(device_id, status)
+
+    def _set_status(self, device_id: str, status: Dict):
+        self.flash_status.set(device_id, status)
+
+    def _update_status(self, device_id: str, fields: Dict):
+        self.flash_status.update(device_id, fields)
 
     def get_flash_status(self, device_id: str) -> Dict:
         """Get current flash status for a device"""
-        return self.flash_status.get(device_id, {
-            'status': 'idle',
-            'progress': 0,
-            'message': 'No flash operation in progress'
-        })
+        record = self.flash_status.get(device_id)
+        if record is None:
+            return {
+                'status': 'idle',
+                'progress': 0,
+                'message': 'No flash operation in progress'
+            }
+        return record.to_dict()
+
+    def get_flash_trace(self, device_id: str) -> Optional[Dict]:
+        """Span waterfalls of the device's latest download and flash; None when it has neither"""
+        traces = {phase: tracer.get(f"{device_id}/{phase}") for phase in ('download', 'flash')}
+        return traces if any(traces.values()) else None
+
+    def get_flash_transitions(self, device_id: str):
+        """Recent status changes for a device, oldest first"""
+        return self.flash_status.get_transitions(device_id)
 
     def check_os_availability(self, os_url: str) -> Dict:
         """Check if OS is available for flashing"""
@@ -313,4 +529,23 @@ class FlashService:
             'available': False
         }
 
+    async def check_os_freshness(self, os_url: str, force: bool = False) -> Dict:
+        """Availability plus whether the server has a newer image than the cached one"""
+        availability = self.check_os_availability(os_url)
+        freshness = await download_manager.check_freshness(os_url, force=force)
+        remote = freshness['remote'] or {}
+        availability.update({
+            'remote_size': remote.get('size'),
+            'remote_etag': remote.get('etag'),
+            'remote_last_modified': remote.get('last_modified'),
+            'local_etag': (freshness['local'] or {}).get('etag'),
+            'stale': freshness['stale'],
+            'checked_at': freshness.get('checked_at'),
+            'freshness_error': freshness['error']
+        })
+        return availability
+
 flash_service = FlashService()
+SIDELOAD_SESSIONS_ACTIVE.set_function(
+    lambda: sum(1 for session in flash_service.sideload_server.sessions.values() if session.state == 'running')
+)
@@ -0,0 +1,100 @@
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+import aiohttp
+from backend.config.settings import get_settings
+
+# Failures worth another attempt: refused/reset connections, timeouts, truncated bodies
+RETRYABLE_ERRORS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+class HttpClient:
+    """Application-scoped aiohttp session for all outbound fetches.
+
+    One pooled connector with a DNS cache is shared by checksum fetches,
+    HEAD probes and range segments. The lifespan in app/main.py opens and
+    closes it; scripts that skip the lifespan get a session on first use.
+    """
+
+    def __init__(self, pool_size: int, pool_per_host: int, dns_cache_ttl: float,
+                 connect_timeout: float, read_timeout: float,
+                 retries: int, retry_backoff: float, retry_backoff_max: float = 30.0):
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        # No total timeout: multi-GB images take as long as they take
+        self.timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=connect_timeout,
+            sock_connect=connect_timeout,
+            sock_read=read_timeout
+        )
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_per_host,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        await self.start()
+        return self._session
+
+    def retry_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (0-based) retry"""
+        return random.uniform(0, min(self.retry_backoff_max, self.retry_backoff * 2 ** attempt))
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, retries: Optional[int] = None,
+                      **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Issue a request, retrying connection errors and 5xx responses before yielding it.
+
+        After the last retry the 5xx response is yielded like any other;
+        errors while reading the body are left to the caller.
+        """
+        session = await self.session()
+        retries = self.retries if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                response = await session.request(method, url, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= retries:
+                    raise
+                print(f"{method} {url} failed ({e or type(e).__name__}), retrying")
+            else:
+                if response.status < 500 or attempt >= retries:
+                    try:
+                        yield response
+                    finally:
+                        response.release()
+                    return
+                response.release()
+                print(f"{method} {url} returned HTTP {response.status}, retrying")
+
+            await asyncio.sleep(self.retry_delay(attempt))
+            attempt += 1
+
+
+http_client = HttpClient(
+    pool_size=get_settings().HTTP_POOL_SIZE,
+    pool_per_host=get_settings().HTTP_POOL_PER_HOST,
+    dns_cache_ttl=get_settings().HTTP_DNS_CACHE_TTL,
+    connect_timeout=get_settings().HTTP_CONNECT_TIMEOUT,
+    read_timeout=get_settings().HTTP_READ_TIMEOUT,
+    retries=get_settings().HTTP_RETRIES,
+    retry_backoff=get_settings().HTTP_RETRY_BACKOFF
+)
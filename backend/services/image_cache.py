@@ -0,0 +1,205 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from backend.config.settings import get_settings
+
+IMAGE_SUFFIXES = ('.zip', '.img')
+
+
+class ImageCache:
+    """Index of downloaded OS images keyed by SHA-256, with an LRU size budget.
+
+    Images keep their URL-derived filenames in ``cache_dir`` (that is what
+    the API and sideload use); ``index.json`` maps each content hash to its
+    filenames, size, verification state and last use. Identical content
+    downloaded under a second name is hardlinked instead of stored twice.
+    Pinned images (in use by a flash) are never evicted.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = cache_dir / 'index.json'
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.entries: Dict[str, Dict] = {}
+        self._by_filename: Dict[str, str] = {}
+        self._pins: Dict[str, int] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+
+        # Drop names whose files were removed behind our back
+        for sha256, entry in entries.items():
+            entry['filenames'] = [n for n in entry.get('filenames', []) if (self.cache_dir / n).exists()]
+            if entry['filenames']:
+                self.entries[sha256] = entry
+                for filename in entry['filenames']:
+                    self._by_filename[filename] = sha256
+
+    def _save(self):
+        tmp = self.index_path.with_name(self.index_path.name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def get(self, filename: str) -> Optional[Dict]:
+        sha256 = self._by_filename.get(filename)
+        return self.entries.get(sha256) if sha256 else None
+
+    def add(self, filename: str, url: str, sha256: str, verified: bool,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict:
+        """Register a completed download, deduplicating identical content"""
+        self._forget(filename)
+        path = self.cache_dir / filename
+        entry = self.entries.get(sha256)
+
+        if entry:
+            existing = self.cache_dir / entry['filenames'][0]
+            try:
+                os.remove(path)
+                os.link(existing, path)
+            except OSError as e:
+                print(f"Could not deduplicate {filename} against {existing.name}: {e}")
+            entry['filenames'].append(filename)
+            entry['verified'] = entry['verified'] or verified
+            entry.update({'url': url, 'etag': etag, 'last_modified': last_modified})
+        else:
+            entry = {
+                'sha256': sha256,
+                'filenames': [filename],
+                'url': url,
+                'size': path.stat().st_size,
+                'verified': verified,
+                # Server validators, for conditional freshness checks
+                'etag': etag,
+                'last_modified': last_modified,
+                'added_at': time.time(),
+                'last_used': time.time()
+            }
+            self.entries[sha256] = entry
+
+        self._by_filename[filename] = sha256
+        self._save()
+        return entry
+
+    def remove(self, filename: str):
+        """Forget filename after it was deleted from disk"""
+        if self._forget(filename):
+            self._save()
+
+    def _forget(self, filename: str) -> bool:
+        sha256 = self._by_filename.pop(filename, None)
+        if sha256 is None:
+            return False
+        entry = self.entries[sha256]
+        entry['filenames'].remove(filename)
+        if not entry['filenames']:
+            del self.entries[sha256]
+        return True
+
+    def touch(self, filename: str):
+        entry = self.get(filename)
+        if entry:
+            entry['last_used'] = time.time()
+            self._save()
+
+    def set_inspection(self, filename: str, inspection: Dict):
+        """Store the OTA metadata read from filename; shared by every name of the content"""
+        entry = self.get(filename)
+        if entry:
+            entry['inspection'] = inspection
+            self._save()
+
+    def pin(self, filename: str):
+        """Mark filename as in use by a flash; pins are counted"""
+        self._pins[filename] = self._pins.get(filename, 0) + 1
+        self.touch(filename)
+
+    def unpin(self, filename: str):
+        count = self._pins.get(filename, 0) - 1
+        if count > 0:
+            self._pins[filename] = count
+        else:
+            self._pins.pop(filename, None)
+
+    def is_pinned(self, filename: str) -> bool:
+        sha256 = self._by_filename.get(filename)
+        names = self.entries[sha256]['filenames'] if sha256 else [filename]
+        return any(name in self._pins for name in names)
+
+    def list_images(self) -> List[Dict]:
+        """Every image file in the cache directory, indexed or not"""
+        images = []
+        for file_path in self.cache_dir.iterdir():
+            if not file_path.is_file() or file_path.suffix not in IMAGE_SUFFIXES:
+                continue
+            stat = file_path.stat()
+            entry = self.get(file_path.name) or {}
+            images.append({
+                'filename': file_path.name,
+                'size': stat.st_size,
+                'modified': stat.st_mtime,
+                'inode': (stat.st_dev, stat.st_ino),
+                'sha256': entry.get('sha256'),
+                'verified': entry.get('verified', False),
+                'last_used': entry.get('last_used', stat.st_mtime),
+                'pinned': self.is_pinned(file_path.name)
+            })
+        return images
+
+    def usage(self, images: Optional[List[Dict]] = None) -> int:
+        images = self.list_images() if images is None else images
+        # Hardlinked duplicates occupy space once
+        return sum({image['inode']: image['size'] for image in images}.values())
+
+    def evict(self, reserve: int = 0, keep: Optional[str] = None) -> List[str]:
+        """Remove least recently used, unpinned images (except keep) until reserve more bytes fit"""
+        if self.max_bytes <= 0:
+            return []
+
+        images = self.list_images()
+        used = self.usage(images)
+        evicted = []
+
+        for image in sorted(images, key=lambda i: i['last_used']):
+            if used + reserve <= self.max_bytes:
+                break
+            if image['pinned'] or image['filename'] in evicted or image['filename'] == keep:
+                continue
+
+            sha256 = image['sha256']
+            names = self.entries[sha256]['filenames'] if sha256 else [image['filename']]
+            for name in list(names):
+                try:
+                    os.remove(self.cache_dir / name)
+                except FileNotFoundError:
+                    pass
+                self._forget(name)
+                evicted.append(name)
+            used -= image['size']
+
+        if evicted:
+            print(f"Evicted cached images: {', '.join(evicted)}")
+            self._save()
+        if used + reserve > self.max_bytes:
+            print(f"Image cache over budget: {used + reserve} of {self.max_bytes} bytes, rest pinned")
+        return evicted
+
+    def to_dict(self) -> Dict:
+        return {
+            'used_bytes': self.usage(),
+            'max_bytes': self.max_bytes
+        }
+
+
+image_cache = ImageCache(
+    Path(get_settings().DOWNLOAD_DIR),
+    max_bytes=int(get_settings().IMAGE_CACHE_MAX_GB * 1024 ** 3)
+)
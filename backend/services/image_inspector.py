@@ -0,0 +1,137 @@
+import asyncio
+import os
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from backend.services.image_cache import ImageCache, image_cache
+
+METADATA_ENTRY = 'META-INF/com/android/metadata'
+PAYLOAD_PROPERTIES_ENTRY = 'payload_properties.txt'
+# Entries are a few hundred bytes; anything bigger is not what we expect
+MAX_ENTRY_SIZE = 64 * 1024
+
+
+def parse_properties(text: str) -> Dict[str, str]:
+    """key=value lines, as used by both the OTA metadata and payload_properties.txt"""
+    properties = {}
+    for line in text.splitlines():
+        key, sep, value = line.strip().partition('=')
+        if sep and key:
+            properties[key] = value
+    return properties
+
+
+def read_entry(archive: zipfile.ZipFile, name: str) -> Optional[str]:
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        return None
+    if info.file_size > MAX_ENTRY_SIZE:
+        return None
+    return archive.read(info).decode(errors='replace')
+
+
+def inspect_zip(path: Path) -> Dict:
+    """Read the OTA metadata of a zip from its central directory, without extracting.
+
+    Only the central directory and the two small entries are read, so
+    this costs a few KB of I/O whatever the image size.
+    """
+    result = {
+        'ota': False,
+        'devices': [],
+        'post_build': None,
+        'post_build_incremental': None,
+        'post_timestamp': None,
+        'post_sdk_level': None,
+        'post_security_patch_level': None,
+        'ota_type': None,
+        'pre_build': None,
+        'metadata': {},
+        'payload_properties': {},
+        'entries': None,
+        'error': None
+    }
+    try:
+        with zipfile.ZipFile(path) as archive:
+            metadata = read_entry(archive, METADATA_ENTRY)
+            payload_properties = read_entry(archive, PAYLOAD_PROPERTIES_ENTRY)
+            result['entries'] = len(archive.infolist())
+    except (OSError, zipfile.BadZipFile) as e:
+        result['error'] = str(e)
+        return result
+
+    if metadata is not None:
+        fields = parse_properties(metadata)
+        # Multi-device packages list their devices separated by '|'
+        devices = [d for d in fields.get('pre-device', '').replace(',', '|').split('|') if d]
+        result.update({
+            'ota': True,
+            'devices': devices,
+            'post_build': fields.get('post-build'),
+            'post_build_incremental': fields.get('post-build-incremental'),
+            'post_timestamp': fields.get('post-timestamp'),
+            'post_sdk_level': fields.get('post-sdk-level'),
+            'post_security_patch_level': fields.get('post-security-patch-level'),
+            'ota_type': fields.get('ota-type'),
+            'pre_build': fields.get('pre-build'),
+            'metadata': fields
+        })
+    if payload_properties is not None:
+        result['payload_properties'] = parse_properties(payload_properties)
+    return result
+
+
+class ImageInspector:
+    """OTA metadata of cached images, stored with their cache entry.
+
+    Indexed images keep the result in the image cache entry, keyed by
+    content hash, so it is computed once per image and survives restarts.
+    Files the cache does not know are remembered by inode, size and mtime
+    for the life of the process. Only the zip is read in a worker thread;
+    the cache index is updated on the event loop, which owns it.
+    """
+
+    def __init__(self, cache: ImageCache):
+        self.cache = cache
+        self._unindexed: Dict[Tuple[int, int, int, int], Dict] = {}
+
+    async def inspect(self, filename: str) -> Optional[Dict]:
+        """Metadata for filename, or None for missing files and files that are not zips"""
+        path = self.cache.cache_dir / filename
+        if path.suffix != '.zip':
+            return None
+
+        entry = self.cache.get(filename)
+        if entry and entry.get('inspection'):
+            return entry['inspection']
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if not entry and key in self._unindexed:
+            return self._unindexed[key]
+
+        inspection = await asyncio.to_thread(inspect_zip, path)
+        # The index may have changed while the zip was read
+        entry = self.cache.get(filename)
+        if entry:
+            self.cache.set_inspection(filename, inspection)
+        else:
+            self._unindexed[key] = inspection
+        return inspection
+
+    async def check_device(self, filename: str, codenames: List[str]) -> Optional[str]:
+        """Why filename cannot be flashed to a device reporting codenames, or None if it can"""
+        inspection = await self.inspect(filename)
+        if not inspection or not inspection['devices'] or not codenames:
+            return None
+        if any(codename in inspection['devices'] for codename in codenames):
+            return None
+        return (f"Image {filename} is built for {', '.join(inspection['devices'])}, "
+                f"but the device is {codenames[0]}")
+
+
+image_inspector = ImageInspector(image_cache)
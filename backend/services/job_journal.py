@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from backend.config.settings import get_settings
+
+TERMINAL_STAGES = frozenset({'completed', 'failed', 'cancelled'})
+
+
+class JobJournal:
+    """Write-ahead log of flash job stages, one JSON object per line.
+
+    A stage is appended and fdatasync'ed before the pipeline starts it,
+    so after a crash or restart the last line for a serial says what was
+    in progress. Entries are keyed by serial (the scheduler runs at most
+    one job per device); later entries are merged over earlier ones.
+    The file is rewritten with only unfinished jobs when loaded and once
+    enough finished jobs have accumulated. The in-memory view is updated
+    on the caller's thread; writes and fdatasync run in order on one
+    writer thread, so recording a stage never blocks the event loop.
+    """
+
+    COMPACT_AFTER = 1000
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.closed = False
+        # _lock guards _active; _io_lock guards the file
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._fd: Optional[int] = None
+        self._active: Dict[str, Dict[str, Any]] = {}
+        self._appended = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None and not self.closed
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Replay the journal; returns serial -> merged entry for jobs that never finished"""
+        if self.path is None:
+            return {}
+        jobs: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write
+                        continue
+                    serial = entry.get('serial')
+                    if not serial:
+                        continue
+                    if entry.get('stage') == 'queued':
+                        jobs[serial] = entry
+                    else:
+                        jobs.setdefault(serial, {}).update(entry)
+        except FileNotFoundError:
+            pass
+
+        with self._lock, self._io_lock:
+            self._active = {s: e for s, e in jobs.items() if e.get('stage') not in TERMINAL_STAGES}
+            self._rewrite(list(self._active.values()))
+        return {serial: dict(entry) for serial, entry in self._active.items()}
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        return self._fd
+
+    def _rewrite(self, entries: List[Dict[str, Any]]):
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        os.replace(tmp, self.path)
+
+    def _write(self, entry: Dict[str, Any], compact: Optional[List[Dict[str, Any]]]):
+        with self._io_lock:
+            try:
+                fd = self._open()
+                os.write(fd, (json.dumps(entry) + '\n').encode())
+                os.fdatasync(fd)
+                if compact is not None:
+                    self._rewrite(compact)
+            except OSError as e:
+                print(f"Could not write flash journal entry for {entry.get('serial')}: {e}")
+
+    def _append(self, entry: Dict[str, Any]) -> Optional[Future]:
+        """Apply entry to the active jobs and queue its write; the returned future resolves once it is on disk"""
+        with self._lock:
+            if not self.enabled:
+                return None
+            serial = entry['serial']
+            current = self._active.get(serial)
+            if entry['stage'] in TERMINAL_STAGES and current is not None \
+                    and entry.get('job_id') != current.get('job_id'):
+                # A job that has since been replaced by a newer one for the same serial
+                return None
+
+            if entry['stage'] == 'queued':
+                self._active[serial] = dict(entry)
+            elif entry['stage'] in TERMINAL_STAGES:
+                self._active.pop(serial, None)
+            else:
+                self._active.setdefault(serial, {}).update(entry)
+
+            compact = None
+            self._appended += 1
+            if self._appended >= self.COMPACT_AFTER and entry['stage'] in TERMINAL_STAGES:
+                compact = [dict(e) for e in self._active.values()]
+                self._appended = 0
+
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='flash-journal')
+            return self._writer.submit(self._write, entry, compact)
+
+    def queued(self, serial: str, job_id: str, os_url: str, skip_download: bool,
+               bus: Optional[str], priority: int, resume_from: Optional[str] = None):
+        self._append({
+            'at': time.time(),
+            'serial': serial,
+            'stage': 'queued',
+            'job_id': job_id,
+            'os_url': os_url,
+            'skip_download': skip_download,
+            'bus': bus,
+            'priority': priority,
+            'resume_from': resume_from
+        })
+
+    async def stage(self, serial: str, stage: str, **fields):
+        """Record that serial is about to enter stage; returns once it is on disk"""
+        if not self.enabled:
+            return
+        written = self._append({'at': time.time(), 'serial': serial, 'stage': stage, **fields})
+        if written is not None:
+            await asyncio.wrap_future(written)
+
+    def finish(self, serial: str, job_id: str, stage: str, message: Optional[str] = None):
+        self._append({'at': time.time(), 'serial': serial, 'stage': stage, 'job_id': job_id, 'message': message})
+
+    def active(self) -> Dict[str, Dict[str, Any]]:
+        return {serial: dict(entry) for serial, entry in self._active.items()}
+
+    def close(self):
+        """Stop recording; jobs cancelled by shutdown stay unfinished in the journal"""
+        with self._lock:
+            self.closed = True
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            # Entries already queued still reach the disk
+            writer.shutdown(wait=True)
+        with self._io_lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+flash_journal = JobJournal(Path(get_settings().FLASH_JOURNAL_PATH) if get_settings().FLASH_JOURNAL_PATH else None)
@@ -0,0 +1,60 @@
+from collections import deque
+from typing import Dict, Tuple
+from backend.config.settings import get_settings
+
+
+class ReadinessStats:
+    """Observed device readiness waits per (model, transition).
+
+    Timeouts start from the configured defaults and, once a model has a
+    few samples, follow its slowest recent wait with some headroom.
+    Waits that include an operator's action only ever grow from the
+    default, since fast operators say nothing about the next one.
+    """
+
+    # Reaching sideload mode needs someone to pick 'Apply update from ADB'
+    OPERATOR_GATED = frozenset({'sideload'})
+    MIN_SAMPLES = 3
+    HEADROOM = 1.5
+    MARGIN = 10.0
+
+    def __init__(self, defaults: Dict[str, float], history: int = 20, min_timeout: float = 15.0):
+        self.defaults = defaults
+        self.history = history
+        self.min_timeout = min_timeout
+        self.samples: Dict[Tuple[str, str], deque] = {}
+
+    def record(self, model: str, transition: str, seconds: float):
+        key = (model or 'Unknown', transition)
+        if key not in self.samples:
+            self.samples[key] = deque(maxlen=self.history)
+        self.samples[key].append(seconds)
+
+    def timeout_for(self, model: str, transition: str) -> float:
+        default = self.defaults[transition]
+        samples = self.samples.get((model or 'Unknown', transition))
+        if not samples or len(samples) < self.MIN_SAMPLES:
+            return default
+
+        # Never go above twice the configured default, whatever was observed
+        adapted = max(samples) * self.HEADROOM + self.MARGIN
+        floor = default if transition in self.OPERATOR_GATED else self.min_timeout
+        return max(floor, min(adapted, default * 2))
+
+    def to_dict(self) -> Dict:
+        return {
+            f"{model}/{transition}": {
+                'count': len(samples),
+                'last': round(samples[-1], 2),
+                'max': round(max(samples), 2),
+                'timeout': round(self.timeout_for(model, transition), 1)
+            }
+            for (model, transition), samples in self.samples.items()
+        }
+
+
+readiness_stats = ReadinessStats({
+    'recovery': get_settings().RECOVERY_WAIT_TIMEOUT,
+    'sideload': get_settings().SIDELOAD_WAIT_TIMEOUT,
+    'reboot': get_settings().REBOOT_WAIT_TIMEOUT
+})
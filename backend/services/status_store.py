@@ -0,0 +1,393 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from backend.config.settings import get_settings
+from backend.services.event_bus import event_bus
+
+TERMINAL_STATES = frozenset({'completed', 'error', 'cancelled'})
+MAX_MESSAGE_CHARS = 500
+
+
+@dataclass(slots=True)
+class Transition:
+    at: float
+    status: str
+    message: str
+
+
+@dataclass(slots=True)
+class StatusRecord:
+    """Current status of one flash or download, plus its recent transitions.
+
+    status, progress and message are the fields every writer sets; the
+    rest (byte counters, sideload rates, error details) live in ``extra``.
+    """
+
+    key: str
+    transitions: deque
+    status: str = 'idle'
+    progress: int = 0
+    message: str = ''
+    started_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def apply(self, fields: Dict[str, Any]):
+        for name, value in fields.items():
+            if name == 'status':
+                self.status = value
+            elif name == 'progress':
+                self.progress = value
+            elif name == 'message':
+                self.message = value
+            else:
+                self.extra[name] = value
+        self.updated_at = time.time()
+
+    def get(self, name: str, default: Any = None) -> Any:
+        if name in ('status', 'progress', 'message'):
+            return getattr(self, name)
+        return self.extra.get(name, default)
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            **self.extra,
+            'started_at': self.started_at,
+            'updated_at': self.updated_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobHistory:
+    """Finished flashes and downloads in a local SQLite database.
+
+    Rows are buffered and written in one transaction per batch, from a
+    worker thread, when ``batch_size`` rows are pending or every
+    ``flush_interval`` seconds while the lifespan task runs.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            model TEXT,
+            started_at REAL NOT NULL,
+            finished_at REAL NOT NULL,
+            duration REAL NOT NULL,
+            bytes INTEGER,
+            message TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+    """
+    COLUMNS = ('kind', 'key', 'status', 'model', 'started_at', 'finished_at', 'duration', 'bytes', 'message')
+    GROUPS = ('kind', 'model', 'status')
+
+    def __init__(self, path: Optional[Path], batch_size: int = 100, flush_interval: float = 5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def record(self, kind: str, record: StatusRecord):
+        if not self.enabled:
+            return
+        bytes_total = record.extra.get('total_size') or record.extra.get('total')
+        self._pending.append((
+            kind,
+            record.key,
+            record.status,
+            record.extra.get('model'),
+            record.started_at,
+            record.finished_at,
+            record.finished_at - record.started_at,
+            bytes_total or None,
+            record.message[:MAX_MESSAGE_CHARS] if record.message else record.extra.get('error')
+        ))
+        if len(self._pending) >= self.batch_size:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.create_task(self.flush_async())
+
+    def _take_pending(self) -> List[tuple]:
+        rows, self._pending = self._pending, []
+        return rows
+
+    def flush(self) -> int:
+        """Write every pending row in one transaction; returns how many were written"""
+        return self._write(self._take_pending())
+
+    async def flush_async(self) -> int:
+        # Rows are taken on the loop thread, only the write happens in a worker
+        rows = self._take_pending()
+        return await asyncio.to_thread(self._write, rows) if rows else 0
+
+    def _write(self, rows: List[tuple]) -> int:
+        if not rows:
+            return 0
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany(
+                        f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                        rows
+                    )
+        except sqlite3.Error as e:
+            print(f"Could not write {len(rows)} job history rows: {e}")
+            return 0
+        return len(rows)
+
+    async def start(self):
+        if self.enabled and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self.enabled:
+            await self.flush_async()
+            with self._lock:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_async()
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        """Run a read query; callers on the event loop flush_async() first and run this in a thread"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            try:
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.row_factory = None
+
+    def throughput(self, since: float, bucket_seconds: int, kind: Optional[str] = None) -> List[Dict]:
+        """Jobs finished per time bucket since the given time"""
+        rows = self._query(
+            """
+            SELECT CAST(finished_at / ? AS INTEGER) * ? AS bucket,
+                   SUM(status = 'completed') AS completed,
+                   SUM(status != 'completed') AS failed,
+                   SUM(CASE WHEN status = 'completed' THEN bytes ELSE 0 END) AS bytes,
+                   AVG(CASE WHEN status = 'completed' THEN duration END) AS avg_duration
+            FROM jobs
+            WHERE finished_at >= ? AND (? IS NULL OR kind = ?)
+            GROUP BY bucket ORDER BY bucket
+            """,
+            (bucket_seconds, bucket_seconds, since, kind, kind)
+        )
+        return [
+            {
+                'bucket_start': row['bucket'],
+                'completed': row['completed'],
+                'failed': row['failed'],
+                'bytes': row['bytes'] or 0,
+                'avg_duration': round(row['avg_duration'], 1) if row['avg_duration'] is not None else None
+            }
+            for row in rows
+        ]
+
+    def failure_rate(self, since: float, group_by: str = 'kind', kind: Optional[str] = None) -> List[Dict]:
+        """Share of finished jobs that did not complete, per kind, model or status"""
+        if group_by not in self.GROUPS:
+            raise ValueError(f"group_by must be one of {', '.join(self.GROUPS)}")
+        rows = self._query(
+            f"""
+            SELECT {group_by} AS grp, COUNT(*) AS total, SUM(status != 'completed') AS failed
+            FROM jobs
+            WHERE finished_at >= ? AND (? IS NULL OR kind = ?)
+            GROUP BY grp ORDER BY total DESC
+            """,
+            (since, kind, kind)
+        )
+        return [
+            {
+                group_by: row['grp'],
+                'total': row['total'],
+                'failed': row['failed'],
+                'failure_rate': round(row['failed'] / row['total'], 4)
+            }
+            for row in rows
+        ]
+
+    def recent(self, limit: int = 50, kind: Optional[str] = None) -> List[Dict]:
+        rows = self._query(
+            f"""
+            SELECT {', '.join(self.COLUMNS)} FROM jobs
+            WHERE (? IS NULL OR kind = ?)
+            ORDER BY finished_at DESC LIMIT ?
+            """,
+            (kind, kind, limit)
+        )
+        return [dict(row) for row in rows]
+
+
+class StatusStore:
+    """Bounded current-status map for one event topic ('flash' or 'download').
+
+    Every write is published on the event bus; the record itself is
+    published and only turned into a dict when a subscriber is sent it.
+    ``start`` begins a job and ``set`` moves it to a new phase, keeping its
+    start time. A record that reaches a terminal state is written to the
+    job history and evicted ``ttl`` seconds later; beyond ``max_records``
+    the oldest finished records go first, and unfinished ones untouched
+    for ``idle_ttl`` are dropped.
+    """
+
+    SWEEP_INTERVAL = 30.0
+    # Extra fields that describe the job rather than its current phase
+    CARRIED_FIELDS = ('model',)
+
+    def __init__(self, topic: str, history: Optional[JobHistory] = None, transitions: int = 20,
+                 ttl: float = 3600.0, max_records: int = 1000, idle_ttl: float = 86400.0):
+        self.topic = topic
+        self.history = history
+        self.transitions = transitions
+        self.ttl = ttl
+        self.idle_ttl = idle_ttl
+        self.max_records = max_records
+        self.records: Dict[str, StatusRecord] = {}
+        self._last_sweep = time.monotonic()
+
+    def start(self, key: str, fields: Dict[str, Any]) -> StatusRecord:
+        """Begin a new job for key; transitions of earlier jobs are kept"""
+        old = self.records.get(key)
+        record = StatusRecord(key, old.transitions if old else deque(maxlen=self.transitions))
+        self.records[key] = record
+        return self._apply(record, fields, new=True)
+
+    def set(self, key: str, fields: Dict[str, Any]) -> StatusRecord:
+        """Replace the status of key's current job (a new phase), or start one if it has finished"""
+        old = self.records.get(key)
+        # Re-reporting how a finished job ended is not a new job
+        if old is None or (old.finished and fields.get('status') not in TERMINAL_STATES):
+            return self.start(key, fields)
+        record = StatusRecord(key, old.transitions, started_at=old.started_at, finished_at=old.finished_at)
+        record.extra.update({name: old.extra[name] for name in self.CARRIED_FIELDS if name in old.extra})
+        self.records[key] = record
+        return self._apply(record, fields, previous=old.status)
+
+    def update(self, key: str, fields: Dict[str, Any]) -> StatusRecord:
+        record = self.records.get(key)
+        if record is None:
+            return self.set(key, fields)
+        return self._apply(record, fields)
+
+    def _apply(self, record: StatusRecord, fields: Dict[str, Any], new: bool = False,
+               previous: Optional[str] = None) -> StatusRecord:
+        if not new and previous is None:
+            previous = record.status
+        record.apply(fields)
+
+        if record.status != previous:
+            record.transitions.append(Transition(record.updated_at, record.status, record.message[:MAX_MESSAGE_CHARS]))
+            if record.status in TERMINAL_STATES and not record.finished:
+                record.finished_at = record.updated_at
+                if self.history is not None:
+                    self.history.record(self.topic, record)
+            elif record.status not in TERMINAL_STATES:
+                record.finished_at = None
+
+        event_bus.publish(self.topic, record.key, record)
+        self._maybe_sweep()
+        return record
+
+    def get(self, key: str) -> Optional[StatusRecord]:
+        return self.records.get(key)
+
+    def get_transitions(self, key: str) -> List[Dict]:
+        record = self.records.get(key)
+        if record is None:
+            return []
+        return [{'at': t.at, 'status': t.status, 'message': t.message} for t in record.transitions]
+
+    def to_dict(self) -> Dict[str, Dict]:
+        return {key: record.to_dict() for key, record in self.records.items()}
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep >= self.SWEEP_INTERVAL or len(self.records) > self.max_records:
+            self._last_sweep = now
+            self.evict()
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Drop finished records older than ttl, then the oldest finished ones over max_records"""
+        now = time.time() if now is None else now
+        # Jobs abandoned mid-way (e.g. never confirmed) stop counting as live after idle_ttl
+        for record in list(self.records.values()):
+            if not record.finished and now - record.updated_at >= self.idle_ttl:
+                self._forget(record.key)
+        finished = sorted(
+            (record for record in self.records.values() if record.finished),
+            key=lambda r: r.finished_at
+        )
+        excess = len(self.records) - self.max_records
+        evicted = 0
+        for record in finished:
+            if now - record.finished_at < self.ttl and evicted >= excess:
+                break
+            self._forget(record.key)
+            evicted += 1
+        return evicted
+
+    def _forget(self, key: str):
+        self.records.pop(key, None)
+        event_bus.forget(self.topic, key)
+
+
+job_history = JobHistory(
+    Path(get_settings().STATUS_DB_PATH) if get_settings().STATUS_DB_PATH else None,
+    batch_size=get_settings().STATUS_DB_BATCH_SIZE,
+    flush_interval=get_settings().STATUS_DB_FLUSH_INTERVAL
+)
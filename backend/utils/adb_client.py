@@ -0,0 +1,136 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+
+class AdbError(Exception):
+    """The ADB server answered FAIL, or the connection broke mid-request"""
+
+
+class AdbConnection:
+    """One socket to the ADB server speaking the host protocol.
+
+    Requests are a 4-digit hex length followed by the service name; the
+    server answers OKAY or FAIL plus a length-prefixed message.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, service: str):
+        payload = service.encode()
+        self.writer.write(f"{len(payload):04x}".encode() + payload)
+        await self.writer.drain()
+        await self.read_status(service)
+
+    async def read_status(self, service: str = ''):
+        status = await self.read_exactly(4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise AdbError(await self.read_string())
+        raise AdbError(f"Unexpected ADB response to {service!r}: {status!r}")
+
+    async def read_exactly(self, size: int) -> bytes:
+        try:
+            return await self.reader.readexactly(size)
+        except asyncio.IncompleteReadError as e:
+            raise AdbError("ADB server closed the connection") from e
+
+    async def read_string(self) -> str:
+        length = int(await self.read_exactly(4), 16)
+        return (await self.read_exactly(length)).decode(errors='replace')
+
+    async def read_all(self) -> bytes:
+        return await self.reader.read()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def parse_device_list(text: str) -> List[Tuple[str, str, Dict[str, str]]]:
+    """Parse 'serial state key:value ...' lines from devices-l output"""
+    devices = []
+    for line in text.strip().split('\n'):
+        parts = line.split()
+        if len(parts) < 2 or line.startswith(('List of devices', '*')):
+            continue
+        props = dict(part.split(':', 1) for part in parts[2:] if ':' in part)
+        devices.append((parts[0], parts[1], props))
+    return devices
+
+
+class AdbClient:
+    """Asyncio client for the ADB server (adb host protocol on localhost:5037).
+
+    The server closes the socket after every host query and binds a
+    socket to one device after host:transport, so each request opens a
+    fresh loopback connection; this is still far cheaper than forking
+    the adb binary, which does the same connect internally.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 5037, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    async def connect(self) -> AdbConnection:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        return AdbConnection(reader, writer)
+
+    async def query(self, service: str) -> str:
+        """Run a host service that answers with one length-prefixed string"""
+        async with await self.connect() as conn:
+            await asyncio.wait_for(conn.send(service), self.timeout)
+            return await asyncio.wait_for(conn.read_string(), self.timeout)
+
+    async def transport(self, serial: str, service: str) -> AdbConnection:
+        """Open a device service (e.g. 'shell:getprop') and return the raw stream"""
+        conn = await self.connect()
+        try:
+            await asyncio.wait_for(conn.send(f"host:transport:{serial}"), self.timeout)
+            await asyncio.wait_for(conn.send(service), self.timeout)
+        except BaseException:
+            await conn.close()
+            raise
+        return conn
+
+    async def version(self) -> int:
+        return int(await self.query('host:version'), 16)
+
+    async def devices(self) -> List[Tuple[str, str, Dict[str, str]]]:
+        return parse_device_list(await self.query('host:devices-l'))
+
+    async def track_devices(self) -> AdbConnection:
+        """Subscribe to host:track-devices-l; read updates with read_string()"""
+        conn = await self.connect()
+        try:
+            await asyncio.wait_for(conn.send('host:track-devices-l'), self.timeout)
+        except BaseException:
+            await conn.close()
+            raise
+        return conn
+
+    async def get_state(self, serial: str) -> str:
+        return await self.query(f"host-serial:{serial}:get-state")
+
+    async def shell(self, serial: str, command: str) -> str:
+        async with await self.transport(serial, f"shell:{command}") as conn:
+            return (await asyncio.wait_for(conn.read_all(), self.timeout)).decode(errors='replace')
+
+    async def reboot(self, serial: str, target: str = ''):
+        """Reboot a device, e.g. target='recovery' or 'bootloader'"""
+        async with await self.transport(serial, f"reboot:{target}"):
+            pass
@@ -1,9 +1,200 @@
 import subprocess
 import asyncio
-from typing import List, Dict, Optional
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Dict, Optional, Set
+from backend.utils.adb_client import AdbClient, AdbError, parse_device_list
+from backend.config.settings import get_settings
+from backend.utils.metrics import ADB_CALL_SECONDS
+from backend.utils.tracing import tracer
 
 class ADBManager:
     _server_started = False
+    # asyncio primitives bind to the first loop that waits on them, so they
+    # are created on the running loop, and again if the app runs on a new one
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _server_lock: Optional[asyncio.Lock] = None
+
+    backend = get_settings().ADB_BACKEND
+    client = AdbClient(get_settings().ADB_SERVER_HOST, get_settings().ADB_SERVER_PORT)
+
+    # serial -> state (device/unauthorized/offline/recovery/sideload/...)
+    # kept current by the host:track-devices-l stream
+    _states: Dict[str, str] = {}
+    _models: Dict[str, str] = {}
+    _tracking = False
+    _tracking_task: Optional[asyncio.Task] = None
+    _state_changed: Optional[asyncio.Condition] = None
+    _listeners: List[Callable[[Set[str]], None]] = []
+
+    @staticmethod
+    def use_native() -> bool:
+        return ADBManager.backend == 'native'
+
+    @staticmethod
+    def is_tracking() -> bool:
+        return ADBManager._tracking
+
+    @staticmethod
+    def _bind_loop():
+        """Create the server lock and state condition for the running loop"""
+        loop = asyncio.get_running_loop()
+        if ADBManager._loop is not loop:
+            ADBManager._loop = loop
+            ADBManager._server_lock = asyncio.Lock()
+            ADBManager._state_changed = asyncio.Condition()
+
+    @staticmethod
+    @contextmanager
+    def timed(call: str, backend: str):
+        """Record one ADB call in the latency histogram, and as a span of the current trace"""
+        with ADB_CALL_SECONDS.labels(call, backend).time(), tracer.span(f'adb {call}', backend=backend):
+            yield
+
+    @staticmethod
+    def get_state(serial: str) -> Optional[str]:
+        """Tracked ADB state of a device, or None if the server does not see it"""
+        return ADBManager._states.get(serial)
+
+    @staticmethod
+    def get_states() -> Dict[str, str]:
+        return dict(ADBManager._states)
+
+    @staticmethod
+    def add_listener(listener: Callable[[Set[str]], None]):
+        """Call listener(changed_serials) whenever tracked states change"""
+        if listener not in ADBManager._listeners:
+            ADBManager._listeners.append(listener)
+
+    @staticmethod
+    def remove_listener(listener: Callable[[Set[str]], None]):
+        if listener in ADBManager._listeners:
+            ADBManager._listeners.remove(listener)
+
+    @staticmethod
+    async def _apply_tracked_devices(text: str):
+        states = {}
+        models = {}
+        for serial, state, props in parse_device_list(text):
+            states[serial] = state
+            models[serial] = props.get('model', 'Unknown')
+
+        old_states = ADBManager._states
+        changed = {
+            serial for serial in set(old_states) | set(states)
+            if old_states.get(serial) != states.get(serial)
+        }
+        ADBManager._states = states
+        ADBManager._models = models
+
+        if changed:
+            ADBManager._bind_loop()
+            async with ADBManager._state_changed:
+                ADBManager._state_changed.notify_all()
+            for listener in list(ADBManager._listeners):
+                try:
+                    listener(changed)
+                except Exception as e:
+                    print(f"ADB state listener failed: {e}")
+
+    @staticmethod
+    async def _track_devices():
+        backoff = 0.5
+        while True:
+            try:
+                await ADBManager.ensure_adb_server()
+                conn = await ADBManager.client.track_devices()
+                try:
+                    print("Tracking ADB devices")
+                    while True:
+                        text = await conn.read_string()
+                        ADBManager._tracking = True
+                        backoff = 0.5
+                        await ADBManager._apply_tracked_devices(text)
+                finally:
+                    await conn.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ADB device tracking interrupted: {e}")
+
+            # Callers fall back to querying until the stream is back
+            ADBManager._tracking = False
+            ADBManager._server_started = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 10.0)
+
+    @staticmethod
+    def start_tracking():
+        """Keep one host:track-devices-l stream open (native backend only)"""
+        if not ADBManager.use_native():
+            return
+        ADBManager._bind_loop()
+        if ADBManager._tracking_task is None or ADBManager._tracking_task.done():
+            ADBManager._tracking_task = asyncio.create_task(ADBManager._track_devices())
+
+    @staticmethod
+    async def stop_tracking():
+        task = ADBManager._tracking_task
+        ADBManager._tracking_task = None
+        ADBManager._tracking = False
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    @staticmethod
+    def get_model(serial: str) -> Optional[str]:
+        return ADBManager._models.get(serial)
+
+    @staticmethod
+    async def query_state(serial: str) -> Optional[str]:
+        """Current ADB state of serial, asking the server if nothing is tracked"""
+        if ADBManager.is_tracking():
+            return ADBManager._states.get(serial)
+        devices = await ADBManager.get_connected_devices()
+        return next((d.get('state', 'device') for d in devices if d['id'] == serial), None)
+
+    @staticmethod
+    async def wait_for_state(serial: str, states: Iterable[Optional[str]], timeout: float) -> Optional[str]:
+        """Wait until serial is in one of states (None = gone); raises asyncio.TimeoutError.
+
+        Subscribes to tracked state changes when the track-devices stream
+        is up, and otherwise polls the server with exponential backoff.
+        """
+        wanted = set(states)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = 0.25
+
+        while True:
+            remaining = deadline - loop.time()
+
+            if ADBManager.is_tracking():
+                predicate = lambda: ADBManager._states.get(serial) in wanted
+                ADBManager._bind_loop()
+                async with ADBManager._state_changed:
+                    try:
+                        # Re-check the tracking flag at least every few seconds
+                        await asyncio.wait_for(
+                            ADBManager._state_changed.wait_for(predicate),
+                            max(0, min(remaining, 5.0))
+                        )
+                        return ADBManager._states.get(serial)
+                    except asyncio.TimeoutError:
+                        pass
+            else:
+                state = await ADBManager.query_state(serial)
+                if state in wanted:
+                    return state
+                await asyncio.sleep(max(0, min(delay, remaining)))
+                delay = min(delay * 2, 2.0)
+
+            if loop.time() >= deadline:
+                raise asyncio.TimeoutError(
+                    f"Device {serial} did not reach {'/'.join(str(s) for s in wanted)} within {timeout:g}s"
+                )
 
     @staticmethod
     async def ensure_adb_server():
@@ -11,14 +202,32 @@ class ADBManager:
         if ADBManager._server_started:
             return
 
+        ADBManager._bind_loop()
+        async with ADBManager._server_lock:
+            if not ADBManager._server_started:
+                await ADBManager._start_adb_server()
+
+    @staticmethod
+    async def _start_adb_server():
+        if ADBManager.use_native():
+            try:
+                with ADBManager.timed('version', 'native'):
+                    await ADBManager.client.version()
+                ADBManager._server_started = True
+                print(f"ADB server already running")
+                return
+            except (OSError, asyncio.TimeoutError, AdbError) as e:
+                print(f"ADB server not reachable ({e}), starting it")
+
         try:
             # Just check if server is running, don't kill it
-            result = await asyncio.create_subprocess_exec(
-                'adb', 'devices',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await result.communicate()
+            with ADBManager.timed('devices', 'cli'):
+                result = await asyncio.create_subprocess_exec(
+                    'adb', 'devices',
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                stdout, stderr = await result.communicate()
 
             # If this succeeds, server is running
             if result.returncode == 0:
@@ -26,23 +235,21 @@ class ADBManager:
                 print(f"ADB server already running")
             else:
                 # Only start if it's not running
-                start_result = await asyncio.create_subprocess_exec(
-                    'adb', 'start-server',
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                await start_result.communicate()
+                with ADBManager.timed('start-server', 'cli'):
+                    start_result = await asyncio.create_subprocess_exec(
+                        'adb', 'start-server',
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE
+                    )
+                    await start_result.communicate()
                 ADBManager._server_started = True
                 print(f"ADB server started")
         except Exception as e:
             print(f"Error ensuring ADB server: {e}")
 
     @staticmethod
-    async def get_connected_devices() -> List[Dict[str, str]]:
-        try:
-            # Ensure ADB server is running (won't restart if already running)
-            await ADBManager.ensure_adb_server()
-
+    async def _list_devices_cli() -> Optional[str]:
+        with ADBManager.timed('devices', 'cli'):
             result = await asyncio.create_subprocess_exec(
                 'adb', 'devices', '-l',
                 stdout=asyncio.subprocess.PIPE,
@@ -50,33 +257,57 @@ class ADBManager:
             )
             stdout, stderr = await result.communicate()
 
-            if result.returncode != 0:
-                print("ADB command failed")
-                return []
+        if result.returncode != 0:
+            print("ADB command failed")
+            return None
+        return stdout.decode()
 
-            devices = []
-            lines = stdout.decode().strip().split('\n')[1:]
+    @staticmethod
+    async def get_connected_devices() -> List[Dict[str, str]]:
+        try:
+            if ADBManager.is_tracking():
+                return [
+                    {
+                        'id': serial,
+                        'model': ADBManager._models.get(serial, 'Unknown'),
+                        'status': 'online',
+                        'state': state
+                    }
+                    for serial, state in ADBManager._states.items()
+                    if state != 'offline'
+                ]
 
-            for line in lines:
-                if not line.strip() or 'offline' in line:
-                    continue
+            # Ensure ADB server is running (won't restart if already running)
+            await ADBManager.ensure_adb_server()
 
-                parts = line.split()
-                if len(parts) >= 2:
-                    device_id = parts[0]
-                    model = 'Unknown'
+            if ADBManager.use_native():
+                try:
+                    with ADBManager.timed('devices', 'native'):
+                        adb_devices = await ADBManager.client.devices()
+                except (OSError, asyncio.TimeoutError, AdbError) as e:
+                    print(f"ADB server query failed ({e}), falling back to adb CLI")
+                    ADBManager._server_started = False
+                    adb_devices = None
+            else:
+                adb_devices = None
 
-                    for part in parts:
-                        if part.startswith('model:'):
-                            model = part.split(':', 1)[1]
-                            break
+            if adb_devices is None:
+                output = await ADBManager._list_devices_cli()
+                if output is None:
+                    return []
+                adb_devices = parse_device_list(output)
 
-                    device_info = {
-                        'id': device_id,
-                        'model': model,
-                        'status': 'online'
-                    }
-                    devices.append(device_info)
+            devices = []
+            for device_id, state, props in adb_devices:
+                if state == 'offline':
+                    continue
+
+                devices.append({
+                    'id': device_id,
+                    'model': props.get('model', 'Unknown'),
+                    'status': 'online',
+                    'state': state
+                })
 
             return devices
         except Exception as e:
@@ -85,6 +316,65 @@ class ADBManager:
             traceback.print_exc()
             return []
 
+    @staticmethod
+    async def get_prop(device_id: str, name: str) -> Optional[str]:
+        """getprop name on a booted device; None if it cannot be read (e.g. in recovery)"""
+        await ADBManager.ensure_adb_server()
+
+        if ADBManager.use_native():
+            try:
+                with ADBManager.timed('getprop', 'native'):
+                    output = await ADBManager.client.shell(device_id, f"getprop {name}")
+                return output.strip() or None
+            except AdbError as e:
+                print(f"getprop {name} failed on {device_id}: {e}")
+                return None
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"ADB server unreachable ({e}), falling back to adb CLI")
+                ADBManager._server_started = False
+
+        with ADBManager.timed('getprop', 'cli'):
+            result = await asyncio.create_subprocess_exec(
+                'adb', '-s', device_id, 'shell', 'getprop', name,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await result.communicate()
+        if result.returncode != 0:
+            print(f"getprop {name} failed on {device_id}: {stderr.decode().strip()}")
+            return None
+        return stdout.decode(errors='replace').strip() or None
+
+    @staticmethod
+    async def reboot(device_id: str, target: str = ''):
+        """Reboot a device, e.g. target='recovery'; raises on failure"""
+        await ADBManager.ensure_adb_server()
+
+        if ADBManager.use_native():
+            try:
+                with ADBManager.timed('reboot', 'native'):
+                    await ADBManager.client.reboot(device_id, target)
+                return
+            except AdbError as e:
+                raise Exception(f"Failed to reboot: {e}")
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"ADB server unreachable ({e}), falling back to adb CLI")
+                ADBManager._server_started = False
+
+        args = ['reboot', target] if target else ['reboot']
+        with ADBManager.timed('reboot', 'cli'):
+            result = await asyncio.create_subprocess_exec(
+                'adb', '-s', device_id, *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await result.communicate()
+
+        stderr_text = stderr.decode()
+        # ADB daemon startup messages are not errors
+        if result.returncode != 0 and not ('daemon started successfully' in stderr_text or 'daemon not running' in stderr_text):
+            raise Exception(f"Failed to reboot: {stderr_text}")
+
     @staticmethod
     async def flash_device(device_id: str, os_url: str) -> Dict[str, str]:
         try:
@@ -115,14 +405,13 @@ class ADBManager:
             print(f"Starting flash process for device {device_id}")
             print(f"OS URL: {os_url}")
 
-            result = await asyncio.create_subprocess_exec(
-                'adb', '-s', device_id, 'reboot', 'bootloader',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            await result.communicate()
+            await ADBManager.reboot(device_id, 'bootloader')
 
-            await asyncio.sleep(10)
+            # Bootloader (fastboot) devices drop off ADB
+            try:
+                await ADBManager.wait_for_state(device_id, [None], get_settings().REBOOT_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"Device {device_id} still visible to ADB after reboot to bootloader")
 
             print(f"Device {device_id} is in bootloader mode")
             print(f"Download OS from: {os_url}")
@@ -0,0 +1,151 @@
+import asyncio
+import socket
+from typing import Awaitable, Callable, Dict, Optional
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+NETLINK_KOBJECT_UEVENT = 15
+# Kernel multicast group; group 2 carries udev's re-broadcast ("libudev" header)
+UEVENT_KERNEL_GROUP = 1
+
+
+def parse_uevent(data: bytes) -> Optional[Dict[str, str]]:
+    """Parse a kernel uevent datagram ('action@devpath\\0KEY=VALUE\\0...')"""
+    if not data or data.startswith(b'libudev'):
+        return None
+
+    parts = data.split(b'\0')
+    header = parts[0].decode(errors='replace')
+    if '@' not in header:
+        return None
+
+    action, devpath = header.split('@', 1)
+    event = {'ACTION': action, 'DEVPATH': devpath}
+    for part in parts[1:]:
+        key, sep, value = part.partition(b'=')
+        if sep:
+            event[key.decode(errors='replace')] = value.decode(errors='replace')
+    return event
+
+
+class HotplugWatcher:
+    """Deliver USB device add/remove uevents to an async callback.
+
+    Listens on pyudev when installed, otherwise on a raw
+    NETLINK_KOBJECT_UEVENT socket. When neither is usable the watcher
+    reports the 'poll' backend and the caller keeps polling. Events are
+    handled one at a time in arrival order; synthetic events can be
+    injected with feed().
+    """
+
+    def __init__(self, callback: Callable[[Dict[str, str]], Awaitable[None]], backend: str = 'auto'):
+        self.callback = callback
+        self.requested_backend = backend
+        self.backend: Optional[str] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._consumer: Optional[asyncio.Task] = None
+        self._sock: Optional[socket.socket] = None
+        self._monitor = None
+
+    def start(self) -> str:
+        """Start listening and return the backend in use"""
+        if self.backend is not None:
+            return self.backend
+
+        loop = asyncio.get_running_loop()
+        backend = 'poll'
+
+        if self.requested_backend in ('auto', 'pyudev') and pyudev is not None:
+            try:
+                context = pyudev.Context()
+                self._monitor = pyudev.Monitor.from_netlink(context)
+                self._monitor.filter_by('usb', 'usb_device')
+                self._monitor.start()
+                loop.add_reader(self._monitor.fileno(), self._on_pyudev)
+                backend = 'pyudev'
+            except Exception as e:
+                print(f"pyudev monitor unavailable: {e}")
+                self._monitor = None
+
+        if backend == 'poll' and self.requested_backend in ('auto', 'pyudev', 'netlink'):
+            try:
+                sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+                sock.bind((0, UEVENT_KERNEL_GROUP))
+                sock.setblocking(False)
+                loop.add_reader(sock.fileno(), self._on_netlink)
+                self._sock = sock
+                backend = 'netlink'
+            except (OSError, AttributeError) as e:
+                print(f"Netlink uevent socket unavailable: {e}")
+
+        self.backend = backend
+        self._consumer = asyncio.create_task(self._consume())
+        print(f"Hotplug watcher using {backend} backend")
+        return backend
+
+    async def stop(self):
+        loop = asyncio.get_running_loop()
+        if self._sock is not None:
+            loop.remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+        if self._monitor is not None:
+            loop.remove_reader(self._monitor.fileno())
+            self._monitor = None
+        if self._consumer is not None:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+        self.backend = None
+
+    def feed(self, event):
+        """Queue a uevent (raw bytes or parsed dict); used by the listeners and by tests"""
+        if isinstance(event, (bytes, bytearray)):
+            event = parse_uevent(bytes(event))
+        if not event:
+            return
+
+        action = event.get('ACTION')
+        if action == 'resync':
+            self._queue.put_nowait(event)
+        elif (action in ('add', 'remove')
+                and event.get('SUBSYSTEM', 'usb') == 'usb'
+                and event.get('DEVTYPE') == 'usb_device'):
+            self._queue.put_nowait(event)
+
+    def _on_netlink(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # ENOBUFS: the kernel dropped events, so the caller must rescan
+                print(f"Netlink uevent receive failed: {e}")
+                self.feed({'ACTION': 'resync'})
+                return
+            self.feed(data)
+
+    def _on_pyudev(self):
+        while True:
+            device = self._monitor.poll(timeout=0)
+            if device is None:
+                return
+            event = dict(device.properties)
+            event['ACTION'] = device.action
+            self.feed(event)
+
+    async def _consume(self):
+        while True:
+            event = await self._queue.get()
+            try:
+                await self.callback(event)
+            except Exception as e:
+                print(f"Error handling uevent {event.get('ACTION')} {event.get('DEVPATH')}: {e}")
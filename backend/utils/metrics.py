@@ -0,0 +1,283 @@
+import bisect
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds, from a fast ADB query up to a full sideload
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+# Bytes per second, from a struggling mirror to local disk speed
+THROUGHPUT_BUCKETS = (1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 1e9)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram: '_HistogramChild'):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        """Context manager observing the time spent in its block"""
+        return _Timer(self)
+
+
+class Metric:
+    """A named metric family; labelled children are created on first use and reused.
+
+    Recording is a dict lookup plus an increment (a bisect for
+    histograms), with no locks: all writers run on the event loop, and a
+    lost increment from a worker thread is acceptable for monitoring.
+    """
+
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._new_child()
+            self._children[key] = child
+        return child
+
+    def _unlabelled(self):
+        return self.labels()
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+
+class Gauge(Metric):
+    """Gauge set directly, or read from a callback when scraped.
+
+    The callback returns a number, or a dict of label value tuples to
+    numbers for labelled gauges.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], object]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+    def set_function(self, function: Callable[[], object]):
+        self.function = function
+
+    def _samples(self) -> Iterable[str]:
+        if self.function is None:
+            yield from super()._samples()
+            return
+        try:
+            value = self.function()
+        except Exception as e:
+            print(f"Metric {self.name} callback failed: {e}")
+            return
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, sample in items:
+            values = values if isinstance(values, tuple) else (values,)
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(sample)}"
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def time(self) -> _Timer:
+        return self._unlabelled().time()
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    """Every metric of the process, rendered in the Prometheus text format"""
+
+    # The response class appends the charset
+    CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], object]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+ADB_CALL_SECONDS = registry.histogram(
+    'xam_adb_call_duration_seconds', 'ADB server queries and adb CLI invocations', ['call', 'backend']
+)
+USB_CALL_SECONDS = registry.histogram(
+    'xam_usb_call_duration_seconds', 'USB enumeration passes and lsusb invocations', ['call']
+)
+DOWNLOAD_BYTES = registry.counter(
+    'xam_download_bytes_total', 'OS image bytes written to disk'
+)
+DOWNLOAD_SECONDS = registry.histogram(
+    'xam_download_duration_seconds', 'Duration of finished OS image downloads', ['result']
+)
+DOWNLOAD_THROUGHPUT = registry.histogram(
+    'xam_download_throughput_bytes_per_second', 'Average throughput of completed downloads',
+    buckets=THROUGHPUT_BUCKETS
+)
+FLASH_STAGE_SECONDS = registry.histogram(
+    'xam_flash_stage_duration_seconds', 'Time spent in each flash pipeline stage', ['stage']
+)
+FLASH_JOB_SECONDS = registry.histogram(
+    'xam_flash_job_duration_seconds', 'Duration of finished flash scheduler jobs', ['kind', 'result']
+)
+FLASH_QUEUE_DEPTH = registry.gauge(
+    'xam_flash_queue_depth', 'Flash jobs waiting for a slot'
+)
+FLASH_JOBS_RUNNING = registry.gauge(
+    'xam_flash_jobs_running', 'Flash jobs currently running'
+)
+DOWNLOADS_ACTIVE = registry.gauge(
+    'xam_downloads_active', 'OS image downloads in progress'
+)
+SIDELOAD_SESSIONS_ACTIVE = registry.gauge(
+    'xam_sideload_sessions_active', 'Native sideload sessions serving a device'
+)
+EVENT_SUBSCRIBERS = registry.gauge(
+    'xam_event_subscribers', 'Connected SSE/WebSocket event clients'
+)
@@ -0,0 +1,262 @@
+import asyncio
+import mmap
+import os
+import time
+from typing import Callable, Dict, Optional
+from backend.utils.adb_client import AdbClient, AdbError
+
+# Block size adb uses for sideload-host; recovery asks for blocks of this size
+SIDELOAD_BLOCK_SIZE = 65536
+
+
+class SharedImage:
+    """Read-only mmap of an OS image, shared by every session serving it.
+
+    The mapping is advised MADV_RANDOM so the kernel does not guess;
+    sessions prefetch a window ahead of the block recovery asked for,
+    which matches how it reads (mostly sequential runs with jumps to the
+    zip central directory and between entries).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.refs = 0
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.map = mmap.mmap(fd, self.size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        self._advise(getattr(mmap, 'MADV_RANDOM', None), 0, self.size)
+
+    @property
+    def block_count(self) -> int:
+        return -(-self.size // SIDELOAD_BLOCK_SIZE)
+
+    def read_block(self, block: int) -> bytes:
+        """Copy one block out of the mapping (page faults happen in the caller's thread)"""
+        offset = block * SIDELOAD_BLOCK_SIZE
+        return self.map[offset:offset + SIDELOAD_BLOCK_SIZE]
+
+    def prefetch(self, offset: int, length: int):
+        self._advise(getattr(mmap, 'MADV_WILLNEED', None), offset, length)
+
+    def _advise(self, advice: Optional[int], offset: int, length: int):
+        if advice is None or not hasattr(self.map, 'madvise'):
+            return
+        start = offset - offset % mmap.PAGESIZE
+        length = min(length + offset - start, self.size - start)
+        if length > 0:
+            try:
+                self.map.madvise(advice, start, length)
+            except OSError:
+                pass
+
+    def close(self):
+        self.map.close()
+
+
+class SideloadMetrics:
+    """Block-level view of one device's sideload session.
+
+    Request latency is the host's time from reading a block number to
+    having written the block; stalls are gaps longer than STALL_THRESHOLD
+    between sending a block and the device asking for the next one;
+    retransmits are requests for a block the device already received.
+    """
+
+    STALL_THRESHOLD = 1.0
+    RATE_WINDOW = 5.0
+
+    def __init__(self, serial: str, image_path: str, image_size: int, block_count: int):
+        self.serial = serial
+        self.image_path = image_path
+        self.image_size = image_size
+        self.block_count = block_count
+        self.state = 'running'
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.blocks_served = 0
+        self.bytes_served = 0
+        self.retransmits = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self.longest_stall = 0.0
+        self.latency_max = 0.0
+        self._latency_total = 0.0
+        self._seen = bytearray(block_count)
+        self.distinct_blocks = 0
+        self._started = time.monotonic()
+        self._last_sent: Optional[float] = None
+        # (monotonic time, bytes) of recent blocks for the windowed rates
+        self._recent = []
+
+    def request_received(self, block: int) -> float:
+        now = time.monotonic()
+        if self._last_sent is not None:
+            gap = now - self._last_sent
+            if gap > self.STALL_THRESHOLD:
+                self.stalls += 1
+                self.stall_seconds += gap
+                self.longest_stall = max(self.longest_stall, gap)
+        if self._seen[block]:
+            self.retransmits += 1
+        return now
+
+    def block_sent(self, block: int, length: int, requested_at: float):
+        now = time.monotonic()
+        latency = now - requested_at
+        self.latency_max = max(self.latency_max, latency)
+        self._latency_total += latency
+        self.blocks_served += 1
+        self.bytes_served += length
+        if not self._seen[block]:
+            self._seen[block] = 1
+            self.distinct_blocks += 1
+        self._last_sent = now
+
+        self._recent.append((now, length))
+        cutoff = now - self.RATE_WINDOW
+        if self._recent[0][0] < cutoff:
+            self._recent = [entry for entry in self._recent if entry[0] >= cutoff]
+
+    def finish(self, state: str, error: Optional[str] = None):
+        self.state = state
+        self.error = error
+        self.finished_at = time.time()
+
+    @property
+    def coverage(self) -> float:
+        return self.distinct_blocks / self.block_count if self.block_count else 1.0
+
+    def to_dict(self) -> Dict:
+        elapsed = (self.finished_at - self.started_at) if self.finished_at else time.monotonic() - self._started
+        window = min(self.RATE_WINDOW, elapsed) or 1.0
+        recent_bytes = sum(length for _, length in self._recent) if self.state == 'running' else 0
+        return {
+            'serial': self.serial,
+            'image': os.path.basename(self.image_path),
+            'state': self.state,
+            'error': self.error,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_seconds': round(elapsed, 2),
+            'block_count': self.block_count,
+            'blocks_served': self.blocks_served,
+            'distinct_blocks': self.distinct_blocks,
+            'coverage': round(self.coverage, 4),
+            'bytes_served': self.bytes_served,
+            'retransmits': self.retransmits,
+            'blocks_per_sec': round(self.blocks_served / elapsed, 1) if elapsed > 0 else 0.0,
+            'bytes_per_sec': int(self.bytes_served / elapsed) if elapsed > 0 else 0,
+            'recent_blocks_per_sec': round(len(self._recent) / window, 1) if self.state == 'running' else 0.0,
+            'recent_bytes_per_sec': int(recent_bytes / window),
+            'stalls': self.stalls,
+            'stall_seconds': round(self.stall_seconds, 2),
+            'longest_stall': round(self.longest_stall, 2),
+            'latency_avg_ms': round(self._latency_total / self.blocks_served * 1000, 2) if self.blocks_served else None,
+            'latency_max_ms': round(self.latency_max * 1000, 2)
+        }
+
+
+class SideloadServer:
+    """Host side of recovery's ``sideload-host`` protocol.
+
+    After ``host:transport:<serial>`` and ``sideload-host:<size>:<block>``
+    the device sends 8-byte ASCII block numbers and the host answers with
+    that block of the image (the last one truncated), until the device
+    sends DONEDONE or FAILFAIL. Sessions for the same image share one
+    SharedImage, so N devices cost one pass over the disk.
+    """
+
+    def __init__(self, client: AdbClient, readahead: int):
+        self.client = client
+        self.readahead = readahead
+        self._images: Dict[str, SharedImage] = {}
+        # serial -> metrics of the running or most recent session
+        self.sessions: Dict[str, SideloadMetrics] = {}
+
+    def acquire(self, path: str) -> SharedImage:
+        key = os.path.realpath(path)
+        image = self._images.get(key)
+        if image is None:
+            image = SharedImage(key)
+            self._images[key] = image
+        image.refs += 1
+        return image
+
+    def release(self, image: SharedImage):
+        image.refs -= 1
+        if image.refs <= 0:
+            self._images.pop(image.path, None)
+            image.close()
+
+    def active_images(self) -> Dict[str, int]:
+        """Mapped image path -> number of sessions using it"""
+        return {path: image.refs for path, image in self._images.items()}
+
+    def get_metrics(self, serial: str) -> Optional[Dict]:
+        metrics = self.sessions.get(serial)
+        return metrics.to_dict() if metrics else None
+
+    def list_metrics(self):
+        return [metrics.to_dict() for metrics in self.sessions.values()]
+
+    async def sideload(self, serial: str, path: str,
+                       on_block: Optional[Callable[[SideloadMetrics], None]] = None) -> SideloadMetrics:
+        """Serve path to serial until recovery is done; raises AdbError on failure.
+
+        on_block(metrics) is called after each block is sent.
+        """
+        image = self.acquire(path)
+        metrics = SideloadMetrics(serial, image.path, image.size, image.block_count)
+        self.sessions[serial] = metrics
+        try:
+            conn = await self.client.transport(
+                serial, f"sideload-host:{image.size}:{SIDELOAD_BLOCK_SIZE}"
+            )
+            async with conn:
+                await self._serve(conn, image, metrics, on_block)
+            metrics.finish('completed')
+            return metrics
+        except asyncio.CancelledError:
+            metrics.finish('cancelled')
+            raise
+        except BaseException as e:
+            metrics.finish('failed', str(e) or type(e).__name__)
+            raise
+        finally:
+            self.release(image)
+
+    async def _serve(self, conn, image: SharedImage, metrics: SideloadMetrics, on_block):
+        window = max(0, self.readahead)
+        prefetched_until = 0
+
+        while True:
+            request = await conn.read_exactly(8)
+            if request == b'DONEDONE':
+                return
+            if request == b'FAILFAIL':
+                raise AdbError("Recovery reported the sideload as failed")
+
+            try:
+                block = int(request)
+            except ValueError:
+                raise AdbError(f"Unexpected sideload request {request!r}")
+            offset = block * SIDELOAD_BLOCK_SIZE
+            if block < 0 or offset >= image.size:
+                raise AdbError(f"Recovery asked for block {block} past the end of the image")
+            requested_at = metrics.request_received(block)
+
+            # Re-arm the read-ahead window once the device is halfway through it
+            if window and (offset < prefetched_until - window or offset + window // 2 >= prefetched_until):
+                image.prefetch(offset, window + SIDELOAD_BLOCK_SIZE)
+                prefetched_until = offset + window
+
+            data = await asyncio.to_thread(image.read_block, block)
+            conn.writer.write(data)
+            await conn.writer.drain()
+            metrics.block_sent(block, len(data), requested_at)
+            if on_block is not None:
+                on_block(metrics)
@@ -0,0 +1,219 @@
+import asyncio
+import functools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from backend.config.settings import get_settings
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+@dataclass(slots=True)
+class Span:
+    trace: 'Trace'
+    span_id: int
+    parent_id: Optional[int]
+    name: str
+    started_at: float
+    start: float
+    duration: Optional[float] = None
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.start
+
+    def fail(self, error: BaseException):
+        if isinstance(error, asyncio.CancelledError):
+            self.error = 'cancelled'
+        else:
+            self.error = str(error) or type(error).__name__
+
+
+class Trace:
+    """Spans of one traced operation, in the order they started"""
+
+    def __init__(self, key: str, max_spans: int):
+        self.trace_id = uuid.uuid4().hex
+        self.key = key
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    @property
+    def root(self) -> Optional[Span]:
+        return self.spans[0] if self.spans else None
+
+    def open(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Optional[Span]:
+        """New span, or None once the trace has ended or is full"""
+        root = self.root
+        if root is not None and root.duration is not None:
+            # A task spawned during the trace that outlived it
+            return None
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return None
+        span = Span(
+            trace=self,
+            span_id=len(self.spans) + 1,
+            parent_id=parent.span_id if parent else None,
+            name=name,
+            started_at=time.time(),
+            start=time.perf_counter(),
+            attributes=attributes
+        )
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict:
+        """The trace as a waterfall: spans with their offset from the start of the trace"""
+        root = self.root
+        depths: Dict[int, int] = {}
+        spans = []
+        for span in self.spans:
+            depth = depths[span.span_id] = depths.get(span.parent_id, -1) + 1
+            spans.append({
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'name': span.name,
+                'depth': depth,
+                'offset_ms': round((span.start - root.start) * 1000, 3),
+                'duration_ms': round(span.duration * 1000, 3) if span.duration is not None else None,
+                'error': span.error,
+                'attributes': span.attributes
+            })
+        if root is None:
+            status = 'empty'
+        elif root.duration is None:
+            status = 'running'
+        else:
+            status = 'error' if root.error else 'ok'
+        return {
+            'trace_id': self.trace_id,
+            'key': self.key,
+            'name': root.name if root else None,
+            'started_at': root.started_at if root else None,
+            'duration_ms': spans[0]['duration_ms'] if spans else None,
+            'status': status,
+            'dropped_spans': self.dropped,
+            'spans': spans
+        }
+
+
+class Tracer:
+    """In-memory span tracing; the latest trace per key is kept, oldest keys dropped first.
+
+    The current span lives in a context variable, so spans opened in
+    tasks spawned inside a trace (asyncio copies the context) nest under
+    the span that spawned them. Outside a trace span() is a no-op, so
+    instrumented helpers cost almost nothing when called from background
+    polling. Finished traces are optionally appended to a JSONL file.
+    """
+
+    def __init__(self, max_traces: int, max_spans: int, export_path: Optional[Path] = None):
+        self.max_traces = max_traces
+        self.max_spans = max_spans
+        self.export_path = export_path
+        self.traces: 'OrderedDict[str, Trace]' = OrderedDict()
+        self._export_lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, key: str, name: str, **attributes):
+        """Start a new trace for key, replacing its previous one, with a root span named name"""
+        trace = Trace(key, self.max_spans)
+        self.traces.pop(key, None)
+        self.traces[key] = trace
+        while len(self.traces) > self.max_traces:
+            self.traces.popitem(last=False)
+
+        span = trace.open(name, None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            self._export(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Child of the current span; yields None when no trace is active"""
+        parent = _current_span.get()
+        span = parent.trace.open(name, parent, attributes) if parent is not None else None
+        if span is None:
+            yield None
+            return
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def traced(self, name: Optional[str] = None):
+        """Decorator running a coroutine function in a span (named after it by default)"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def annotate(self, **attributes):
+        """Add attributes to the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def set_error(self, error: str):
+        """Mark the current span as failed without raising through it"""
+        span = _current_span.get()
+        if span is not None:
+            span.error = error
+
+    def get(self, key: str) -> Optional[Dict]:
+        trace = self.traces.get(key)
+        return trace.to_dict() if trace else None
+
+    def _export(self, trace: Trace):
+        if self.export_path is None:
+            return
+        line = json.dumps(trace.to_dict()) + '\n'
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._write, line)
+        except RuntimeError:
+            self._write(line)
+
+    def _write(self, line: str):
+        with self._export_lock:
+            try:
+                self.export_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.export_path, 'a') as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Could not export trace to {self.export_path}: {e}")
+
+
+tracer = Tracer(
+    max_traces=get_settings().TRACE_MAX_TRACES,
+    max_spans=get_settings().TRACE_MAX_SPANS,
+    export_path=Path(get_settings().TRACE_EXPORT_PATH) if get_settings().TRACE_EXPORT_PATH else None
+)
@@ -1,7 +1,13 @@
 import asyncio
+import os
 import re
-from typing import List, Dict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Optional
 from backend.utils.adb_manager import ADBManager
+from backend.config.settings import get_settings
+from backend.utils.metrics import USB_CALL_SECONDS
+from backend.utils.tracing import tracer
 
 class USBManager:
     MOBILE_DEVICE_KEYWORDS = [
@@ -18,6 +24,27 @@ class USBManager:
         'ethernet', 'bluetooth', 'audio', 'webcam', 'camera'
     ]
 
+    # 'sysfs', 'lsusb' or 'auto'; see configure()
+    backend = get_settings().USB_BACKEND
+    sysfs_root = get_settings().USB_SYSFS_ROOT
+
+    @staticmethod
+    @contextmanager
+    def timed(call: str):
+        """Record one enumeration pass or lsusb call in the latency histogram and the current trace"""
+        with USB_CALL_SECONDS.labels(call).time(), tracer.span(f'usb {call}'):
+            yield
+
+    @staticmethod
+    def configure(backend: Optional[str] = None, sysfs_root: Optional[str] = None):
+        """Select the enumeration backend, e.g. to point tests at a fake sysfs tree"""
+        if backend is not None:
+            if backend not in ('auto', 'sysfs', 'lsusb'):
+                raise ValueError(f"Unknown USB backend: {backend}")
+            USBManager.backend = backend
+        if sysfs_root is not None:
+            USBManager.sysfs_root = sysfs_root
+
     @staticmethod
     def is_mobile_device(description: str, vendor_id: str) -> bool:
         description_lower = description.lower()
@@ -39,12 +66,13 @@ class USBManager:
     @staticmethod
     async def get_serial_number(bus: str, device: str) -> str:
         try:
-            result = await asyncio.create_subprocess_exec(
-                'lsusb', '-v', '-s', f"{bus}:{device}",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await result.communicate()
+            with USBManager.timed('lsusb_serial'):
+                result = await asyncio.create_subprocess_exec(
+                    'lsusb', '-v', '-s', f"{bus}:{device}",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                stdout, stderr = await result.communicate()
 
             if result.returncode != 0:
                 return 'N/A'
@@ -62,51 +90,156 @@ class USBManager:
             return 'N/A'
 
     @staticmethod
-    async def get_connected_tablets() -> List[Dict[str, str]]:
+    def _read_sysfs_attr(device_dir: Path, name: str) -> str:
         try:
-            result = await asyncio.create_subprocess_exec(
-                'lsusb',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await result.communicate()
+            return (device_dir / name).read_text().strip()
+        except (OSError, UnicodeDecodeError):
+            return ''
 
-            if result.returncode != 0:
-                print(f"lsusb command failed: {stderr.decode()}")
-                return []
+    @staticmethod
+    def read_sysfs_device(device_dir: Path) -> Optional[Dict[str, str]]:
+        """Read one USB device directory (e.g. /sys/bus/usb/devices/1-1.2)"""
+        vendor_id = USBManager._read_sysfs_attr(device_dir, 'idVendor').lower()
+        busnum = USBManager._read_sysfs_attr(device_dir, 'busnum')
+        devnum = USBManager._read_sysfs_attr(device_dir, 'devnum')
+        if not vendor_id or not busnum.isdigit() or not devnum.isdigit():
+            return None
 
-            devices = []
-            lines = stdout.decode().strip().split('\n')
+        product_id = USBManager._read_sysfs_attr(device_dir, 'idProduct').lower()
+        manufacturer = USBManager._read_sysfs_attr(device_dir, 'manufacturer')
+        product = USBManager._read_sysfs_attr(device_dir, 'product')
+        serial = USBManager._read_sysfs_attr(device_dir, 'serial')
 
-            mobile_devices = []
-            for line in lines:
-                match = re.match(r'Bus (\d+) Device (\d+): ID ([0-9a-f]{4}):([0-9a-f]{4}) (.+)', line)
-                if match:
-                    bus, device, vendor_id, product_id, description = match.groups()
+        return {
+            'bus': f"{int(busnum):03d}",
+            'device': f"{int(devnum):03d}",
+            'vendor_id': vendor_id,
+            'product_id': product_id,
+            'description': ' '.join(p for p in (manufacturer, product) if p) or f"{vendor_id}:{product_id}",
+            'serial': serial or 'N/A'
+        }
 
-                    if USBManager.is_mobile_device(description, vendor_id):
-                        mobile_devices.append((bus, device, vendor_id, product_id, description))
+    @staticmethod
+    def list_sysfs_devices(sysfs_root: str) -> List[Dict[str, str]]:
+        """Enumerate USB devices from sysfs in one pass, without subprocesses"""
+        devices = []
+        for entry in os.scandir(sysfs_root):
+            # Skip interfaces (1-1:1.0) and root hubs (usb1)
+            if ':' in entry.name or entry.name.startswith('usb'):
+                continue
+            device = USBManager.read_sysfs_device(Path(entry.path))
+            if device:
+                devices.append(device)
+        return devices
 
-            adb_devices = await ADBManager.get_connected_devices()
-            adb_serials = {d['id'] for d in adb_devices}
+    @staticmethod
+    async def list_lsusb_devices(selector: Optional[str] = None) -> Optional[List[Dict[str, str]]]:
+        """Enumerate USB devices with lsusb; serials are looked up separately"""
+        args = ['-s', selector] if selector else []
+        with USBManager.timed('enumerate_lsusb'):
+            result = await asyncio.create_subprocess_exec(
+                'lsusb', *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await result.communicate()
 
-            for bus, device, vendor_id, product_id, description in mobile_devices:
-                serial = await USBManager.get_serial_number(bus, device)
-                adb_ready = serial != 'N/A' and serial in adb_serials
+        if result.returncode != 0:
+            print(f"lsusb command failed: {stderr.decode()}")
+            return None
 
-                device_info = {
-                    'id': f"{bus}-{device}",
+        devices = []
+        for line in stdout.decode().strip().split('\n'):
+            match = re.match(r'Bus (\d+) Device (\d+): ID ([0-9a-f]{4}):([0-9a-f]{4}) (.+)', line)
+            if match:
+                bus, device, vendor_id, product_id, description = match.groups()
+                devices.append({
                     'bus': bus,
                     'device': device,
                     'vendor_id': vendor_id,
                     'product_id': product_id,
                     'description': description.strip(),
-                    'serial': serial,
-                    'status': 'connected',
-                    'adb_ready': adb_ready,
-                    'adb_status': 'authorized' if adb_ready else ('unauthorized' if serial != 'N/A' else 'disabled')
-                }
-                devices.append(device_info)
+                    'serial': None
+                })
+        return devices
+
+    @staticmethod
+    def use_sysfs() -> bool:
+        if USBManager.backend == 'sysfs':
+            return True
+        if USBManager.backend == 'lsusb':
+            return False
+        return os.path.isdir(USBManager.sysfs_root)
+
+    @staticmethod
+    async def list_usb_devices() -> Optional[List[Dict[str, str]]]:
+        """Enumerate USB devices with the configured backend, falling back to lsusb"""
+        if USBManager.use_sysfs():
+            try:
+                with USBManager.timed('enumerate_sysfs'):
+                    return await asyncio.to_thread(USBManager.list_sysfs_devices, USBManager.sysfs_root)
+            except OSError as e:
+                print(f"sysfs enumeration failed, falling back to lsusb: {e}")
+        return await USBManager.list_lsusb_devices()
+
+    @staticmethod
+    def adb_fields(serial: str, adb_state: Optional[str]) -> Dict[str, str]:
+        """adb_ready/adb_status/adb_state for a serial given its ADB state"""
+        adb_ready = serial != 'N/A' and adb_state in ('device', 'recovery')
+        return {
+            'adb_ready': adb_ready,
+            'adb_status': 'authorized' if adb_ready else ('unauthorized' if serial != 'N/A' else 'disabled'),
+            'adb_state': adb_state
+        }
+
+    @staticmethod
+    async def get_adb_states() -> Dict[str, str]:
+        """Serial -> ADB state; a lookup when the track-devices stream is up"""
+        if ADBManager.is_tracking():
+            return ADBManager.get_states()
+        adb_devices = await ADBManager.get_connected_devices()
+        return {d['id']: d.get('state', 'device') for d in adb_devices}
+
+    @staticmethod
+    def build_device_info(usb_device: Dict[str, str], adb_states: Dict[str, str]) -> Dict[str, str]:
+        serial = usb_device['serial']
+        bus, device = usb_device['bus'], usb_device['device']
+
+        return {
+            'id': f"{bus}-{device}",
+            'bus': bus,
+            'device': device,
+            'vendor_id': usb_device['vendor_id'],
+            'product_id': usb_device['product_id'],
+            'description': usb_device['description'],
+            'serial': serial,
+            'status': 'connected',
+            **USBManager.adb_fields(serial, adb_states.get(serial))
+        }
+
+    @staticmethod
+    async def get_connected_tablets() -> List[Dict[str, str]]:
+        try:
+            usb_devices = await USBManager.list_usb_devices()
+            if usb_devices is None:
+                return []
+
+            mobile_devices = [
+                d for d in usb_devices
+                if USBManager.is_mobile_device(d['description'], d['vendor_id'])
+            ]
+
+            # lsusb does not report serials; look them up concurrently
+            missing = [d for d in mobile_devices if d['serial'] is None]
+            serials = await asyncio.gather(
+                *(USBManager.get_serial_number(d['bus'], d['device']) for d in missing)
+            )
+            for usb_device, serial in zip(missing, serials):
+                usb_device['serial'] = serial
+
+            adb_states = await USBManager.get_adb_states()
+
+            devices = [USBManager.build_device_info(d, adb_states) for d in mobile_devices]
 
             print(f"Total mobile devices found: {len(devices)}")
             return devices
@@ -117,15 +250,49 @@ class USBManager:
             traceback.print_exc()
             return []
 
+    @staticmethod
+    async def get_tablet(bus: str, device: str, devpath: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """Query a single device, e.g. after a hotplug event; None if it is not a tablet"""
+        try:
+            usb_device = None
+            if USBManager.use_sysfs():
+                if devpath:
+                    device_dir = Path(USBManager.sysfs_root) / os.path.basename(devpath)
+                    usb_device = await asyncio.to_thread(USBManager.read_sysfs_device, device_dir)
+                if usb_device is None:
+                    usb_devices = await asyncio.to_thread(USBManager.list_sysfs_devices, USBManager.sysfs_root)
+                    usb_device = next(
+                        (d for d in usb_devices if int(d['bus']) == int(bus) and int(d['device']) == int(device)),
+                        None
+                    )
+            else:
+                usb_devices = await USBManager.list_lsusb_devices(f"{bus}:{device}")
+                usb_device = usb_devices[0] if usb_devices else None
+
+            if usb_device is None:
+                return None
+            if not USBManager.is_mobile_device(usb_device['description'], usb_device['vendor_id']):
+                return None
+
+            if usb_device['serial'] is None:
+                usb_device['serial'] = await USBManager.get_serial_number(usb_device['bus'], usb_device['device'])
+
+            return USBManager.build_device_info(usb_device, await USBManager.get_adb_states())
+
+        except Exception as e:
+            print(f"Error getting USB device {bus}:{device}: {e}")
+            return None
+
     @staticmethod
     async def get_device_details(bus: str, device: str) -> Dict[str, any]:
         try:
-            result = await asyncio.create_subprocess_exec(
-                'lsusb', '-v', '-s', f"{bus}:{device}",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await result.communicate()
+            with USBManager.timed('lsusb_details'):
+                result = await asyncio.create_subprocess_exec(
+                    'lsusb', '-v', '-s', f"{bus}:{device}",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                stdout, stderr = await result.communicate()
 
             if result.returncode != 0:
                 return {}
@@ -125,13 +125,10 @@ function FlashProgress({ deviceId, status, onClose, onConfirm }) {
           {status.status === 'error' && status.error_detail && (
             <div className="error-details">
               <h4>Error Details</h4>
-              <p className="error-message">{status.error_detail}</p>
-              {status.error_trace && (
-                <details className="error-trace">
-                  <summary>Technical Details (Click to expand)</summary>
-                  <pre>{status.error_trace}</pre>
-                </details>
-              )}
+              <p className="error-message">
+                {status.error_type && <span className="error-type">{status.error_type}: </span>}
+                {status.error_detail}
+              </p>
             </div>
           )}
         </div>
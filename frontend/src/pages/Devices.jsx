@@ -12,25 +12,54 @@ function Devices() {
   const [flashingSerial, setFlashingSerial] = useState(null)
   const [flashStatus, setFlashStatus] = useState(null)
   const [osAvailable, setOsAvailable] = useState(false)
+  const [osStale, setOsStale] = useState(false)
 
   useEffect(() => {
     fetchDevices()
     checkOsAvailability()
-    const interval = setInterval(fetchDevices, 5000)
-    return () => clearInterval(interval)
+    return subscribeWithFallback('devices', (key, data) => {
+      setDevices(data.devices || [])
+      setError(null)
+      setLoading(false)
+    }, fetchDevices, 5000)
   }, [])
 
   useEffect(() => {
-    let statusInterval
-    if (flashingSerial) {
-      statusInterval = setInterval(() => {
-        fetchFlashStatus(flashingSerial)
-      }, 2000)
+    if (!flashingSerial) return undefined
+    return subscribeWithFallback('flash', (key, data) => {
+      if (key === flashingSerial) handleFlashStatus(data)
+    }, () => fetchFlashStatus(flashingSerial), 2000)
+  }, [flashingSerial])
+
+  // Server-sent events, polling only while the stream is unavailable
+  const subscribeWithFallback = (topic, onEvent, poll, pollInterval) => {
+    let interval = null
+    const startPolling = () => {
+      if (!interval) interval = setInterval(poll, pollInterval)
     }
+    const stopPolling = () => {
+      if (interval) clearInterval(interval)
+      interval = null
+    }
+
+    if (typeof EventSource === 'undefined') {
+      startPolling()
+      return stopPolling
+    }
+
+    const events = new EventSource(`/api/events?topics=${topic}`)
+    events.addEventListener(topic, (e) => {
+      const { key, data } = JSON.parse(e.data)
+      onEvent(key, data)
+    })
+    events.onopen = stopPolling
+    events.onerror = startPolling
+
     return () => {
-      if (statusInterval) clearInterval(statusInterval)
+      events.close()
+      stopPolling()
     }
-  }, [flashingSerial])
+  }
 
   const checkOsAvailability = async () => {
     try {
@@ -38,6 +67,7 @@ function Devices() {
       if (response.ok) {
         const data = await response.json()
         setOsAvailable(data.available || false)
+        setOsStale(data.stale === true)
       }
     } catch (err) {
       console.error('Error checking OS availability:', err)
@@ -63,20 +93,24 @@ function Devices() {
       const response = await fetch(`/api/devices/${serial}/flash/status-by-serial`)
       if (!response.ok) return
       const data = await response.json()
-      setFlashStatus(data)
-
-      if (data.status === 'completed' || data.status === 'error') {
-        setTimeout(() => {
-          if (data.status === 'completed') {
-            fetchDevices()
-          }
-        }, 1000)
-      }
+      handleFlashStatus(data)
     } catch (err) {
       console.error('Error fetching flash status:', err)
     }
   }
 
+  const handleFlashStatus = (data) => {
+    setFlashStatus(data)
+
+    if (data.status === 'completed' || data.status === 'error') {
+      setTimeout(() => {
+        if (data.status === 'completed') {
+          fetchDevices()
+        }
+      }, 1000)
+    }
+  }
+
   const handleFlashDevice = async (deviceId) => {
     try {
       const response = await fetch(`/api/devices/${deviceId}/flash/prepare`, {
@@ -152,6 +186,7 @@ function Devices() {
           {osAvailable && (
             <div className="os-available-banner">
               ✓ LineageOS image is available and ready for flashing
+              {osStale && ' (a newer build is available on the server)'}
             </div>
           )}
           {viewMode === 'list' ? (
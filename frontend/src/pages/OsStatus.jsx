@@ -211,6 +211,7 @@ function OsStatus() {
               <tr>
                 <th>Filename</th>
                 <th>Size</th>
+                <th>Devices</th>
                 <th>Status</th>
                 <th>Downloaded</th>
                 <th>Actions</th>
@@ -230,6 +231,9 @@ function OsStatus() {
                       {image.filename}
                     </td>
                     <td>{formatBytes(image.size)}</td>
+                    <td title={image.inspection?.post_build || ''}>
+                      {image.inspection?.devices?.length ? image.inspection.devices.join(', ') : '—'}
+                    </td>
                     <td>
                       {isDownloading && (
                         <span className="status-badge status-downloading">